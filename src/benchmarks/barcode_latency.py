@@ -0,0 +1,97 @@
+'''
+Per call latency of the barcode decoders
+
+Decodes the same webcam sized image again and again with every backend
+of gado.barcode that can be used here, and reports the latency
+distribution of each:
+
+    python -m benchmarks.barcode_latency [--image PATH] [--calls N]
+
+Without --image a blank 640x480 frame is decoded, which is what most
+snapshots look like to the decoder: no barcode on the back of the next
+artifact. The zbarimg backend is timed on a file, the way
+gado.functions.read_barcode always ran it; the others get the buffer,
+through a RegionDecoder when NumPy is installed (unless --whole). The
+time find_regions takes on its own is reported as 'regions'.
+'''
+import os, time, json, tempfile
+from optparse import OptionParser
+import gado.barcode as barcode
+from gado.barcode import BACKENDS, SERVE_COMMAND, ZbarWorker, ZbarImg, RegionDecoder, \
+    DecoderUnavailable, gray_image, write_pgm, find_regions
+from benchmarks.throughput import summarize
+
+def time_calls(call, calls):
+    samples = []
+    for i in range(calls):
+        started = time.time()
+        result = call()
+        samples.append(time.time() - started)
+    return samples, result
+
+def run(image=None, calls=50, worker=None, whole=False):
+    if image:
+        gray, width, height = gray_image(image)
+    else:
+        width, height = 640, 480
+        gray = '\xff' * (width * height)
+    fd, path = tempfile.mkstemp(suffix='.pgm')
+    os.write(fd, write_pgm(gray, width, height))
+    os.close(fd)
+
+    results = dict()
+    regions = barcode.numpy is not None and not whole
+    if regions:
+        samples, found = time_calls(lambda: find_regions(gray, width, height), calls)
+        results['regions'] = dict(summarize(samples), setup=0.0, found=found)
+    try:
+        for backend in BACKENDS:
+            try:
+                started = time.time()
+                decoder = ZbarWorker(worker or SERVE_COMMAND) if backend is ZbarWorker else backend()
+                setup = time.time() - started
+                if backend is ZbarImg:
+                    call = lambda: decoder.decode_file(image or path)
+                else:
+                    if regions:
+                        decoder = RegionDecoder(decoder)
+                    call = lambda: decoder.decode(gray, width, height)
+                samples, found = time_calls(call, calls)
+                decoder.close()
+            except (DecoderUnavailable, OSError), e:
+                results[backend.name] = dict(unavailable=str(e))
+                continue
+            results[backend.name] = dict(summarize(samples), setup=setup, found=found)
+    finally:
+        os.remove(path)
+    return results
+
+def report(results):
+    print '%-8s %6s %9s %9s %9s %9s' % ('decoder', 'calls', 'setup', 'mean', 'p50', 'p95')
+    for name in ['regions'] + [backend.name for backend in BACKENDS]:
+        r = results.get(name)
+        if r is None:
+            continue
+        if 'unavailable' in r:
+            print '%-8s unavailable: %s' % (name, r['unavailable'])
+            continue
+        print '%-8s %6s %8.1fms %8.2fms %8.2fms %8.2fms  %s' % (
+            name, r['count'], r['setup'] * 1000, r['mean'] * 1000,
+            r['p50'] * 1000, r['p95'] * 1000, r['found'])
+
+if __name__ == '__main__':
+    parser = OptionParser(usage='%prog [--image PATH] [--calls N] [--output FILE]')
+    parser.add_option('--image', help='decode this image instead of a blank frame')
+    parser.add_option('--calls', type='int', default=50, help='calls per decoder [%default]')
+    parser.add_option('--worker', help='command of the barcode worker process')
+    parser.add_option('--whole', action='store_true', help='always decode whole frames')
+    parser.add_option('--output', help='save the results as JSON')
+    options, args = parser.parse_args()
+
+    results = run(options.image, options.calls,
+                  options.worker.split() if options.worker else None, options.whole)
+    report(results)
+    if options.output:
+        FH = open(options.output, 'w')
+        json.dump(results, FH, indent=2)
+        FH.close()
@@ -0,0 +1,82 @@
+'''
+Size and round trip time of the messages gado.ipc sends between processes
+
+Sends a mix of the messages the GUI and the GadoSystem exchange (status
+texts, artifact set lists, a job summary) to a child process that sends
+them straight back, once encoded with gado.ipc.encode and once pickled,
+and reports for each the mean bytes per message and the round trip
+latency:
+
+    python -m benchmarks.ipc_roundtrip [--messages N]
+'''
+import time, json, datetime, cPickle
+from multiprocessing import Process, Pipe
+from optparse import OptionParser
+import gado.messages as messages
+from gado.ipc import encode, decode
+from benchmarks.throughput import summarize
+
+def sample_messages():
+    now = datetime.datetime.now()
+    sets = [(i, '%sLetters %s' % ('    ' * (i % 3), i)) for i in range(40)]
+    summary = dict(job=12, artifact_set=3, started=now, finished=now, artifacts=250,
+                   seconds=812.5, artifacts_per_minute=18.4,
+                   stages=dict((stage, dict(count=250, total=100.0, mean=0.4, max=1.2, slept=0.0))
+                               for stage in ('pick', 'place', 'scan', 'save_front', 'drop')))
+    return [(messages.SET_STATUS_TEXT, 'Scanning artifact 12'),
+            (messages.SET_SCANNER_PICTURE, 'C:\\Gado\\images\\1_12_front.tiff'),
+            (messages.ARTIFACT_SET_LIST, None, 7),
+            (messages.RETURN, sets, 7, None),
+            (messages.RETURN, summary, 8, None),
+            (messages.MOVE_LEFT, None, 9),
+            (messages.RETURN, 96, 9, None)]
+
+# Neither an encoded nor a pickled message looks like this
+_QUIT = 'quit'
+
+def _echo(conn):
+    while True:
+        data = conn.recv_bytes()
+        if data == _QUIT:
+            return
+        conn.send_bytes(data)
+
+def run(dumps, loads, messages=2000):
+    conn, child = Pipe()
+    process = Process(target=_echo, args=(child,))
+    process.start()
+    child.close()
+    sample = sample_messages()
+    latencies, sizes = [], []
+    for i in range(messages):
+        msg = sample[i % len(sample)]
+        started = time.time()
+        data = dumps(msg)
+        conn.send_bytes(data)
+        loads(conn.recv_bytes())
+        latencies.append(time.time() - started)
+        sizes.append(len(data))
+    conn.send_bytes(_QUIT)
+    process.join()
+    conn.close()
+    return dict(summarize(latencies), bytes=sum(sizes) / float(len(sizes)))
+
+def report(name, r):
+    print '%-8s %6s msgs  %7.1f bytes  mean %7.3fms  p50 %7.3fms  p99 %7.3fms' % (
+        name, r['count'], r['bytes'], r['mean'] * 1000, r['p50'] * 1000, r['p99'] * 1000)
+
+if __name__ == '__main__':
+    parser = OptionParser(usage='%prog [--messages N] [--output FILE]')
+    parser.add_option('--messages', type='int', default=2000, help='round trips [%default]')
+    parser.add_option('--output', help='save the results as JSON')
+    options, args = parser.parse_args()
+
+    results = dict()
+    for name, dumps, loads in (('ipc', encode, decode),
+                               ('pickle', lambda msg: cPickle.dumps(msg, 2), cPickle.loads)):
+        results[name] = run(dumps, loads, options.messages)
+        report(name, results[name])
+    if options.output:
+        FH = open(options.output, 'w')
+        json.dump(results, FH, indent=2)
+        FH.close()
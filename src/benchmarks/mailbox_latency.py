@@ -0,0 +1,89 @@
+'''
+Message latency of fetch_from_queue under contention
+
+Several listener threads share one queue, each waiting for its own
+message type the way the GUI's listeners and dialogs do, while a producer
+puts messages of every type on it. Run once with a Queue.Queue (which
+fetch_from_queue spins through, putting back what it doesn't want) and
+once with a gado.mailbox.Mailbox, it reports for each:
+
+    latency    seconds from put to the listener having the message
+    cpu        CPU seconds the process used while the messages went through
+    reordered  messages a listener got after a newer one of the same type
+    requeued   messages a listener took and put back, from gado.busmetrics
+
+    python -m benchmarks.mailbox_latency [--listeners N] [--messages N]
+'''
+import os, time, json
+from threading import Thread
+from Queue import Queue
+from optparse import OptionParser
+from gado.functions import fetch_from_queue
+from gado.mailbox import Mailbox
+from gado.busmetrics import bus
+from benchmarks.throughput import summarize
+
+# The last message every listener gets
+_DONE = 'done'
+
+def _cpu():
+    times = os.times()
+    return times[0] + times[1]
+
+def run(queue, listeners=4, messages=2000, interval=0.0005):
+    latencies = []
+    reordered = [0]
+
+    def listen(kind):
+        last = -1
+        while True:
+            msg = fetch_from_queue(queue, kind)
+            received = time.time()
+            if msg[1] == _DONE:
+                return
+            sequence, sent = msg[1]
+            latencies.append(received - sent)
+            if sequence < last:
+                reordered[0] += 1
+            last = sequence
+
+    threads = [Thread(target=listen, args=(kind,)) for kind in range(listeners)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    bus().reset()
+    started, cpu = time.time(), _cpu()
+    for i in range(messages):
+        queue.put((i % listeners, (i, time.time())))
+        time.sleep(interval)
+    for kind in range(listeners):
+        queue.put((kind, _DONE))
+    for thread in threads:
+        thread.join()
+    requeued = sum(stats['requeued'] for stats in bus().snapshot()['queues'].values())
+    return dict(summarize(latencies), cpu=_cpu() - cpu,
+                seconds=time.time() - started, reordered=reordered[0], requeued=requeued)
+
+def report(name, r):
+    print '%-8s %6s msgs  mean %7.3fms  p50 %7.3fms  p99 %8.3fms  max %8.3fms  cpu %5.2fs  reordered %s  requeued %s' % (
+        name, r['count'], r['mean'] * 1000, r['p50'] * 1000, r['p99'] * 1000,
+        r['max'] * 1000, r['cpu'], r['reordered'], r['requeued'])
+
+if __name__ == '__main__':
+    parser = OptionParser(usage='%prog [--listeners N] [--messages N] [--output FILE]')
+    parser.add_option('--listeners', type='int', default=4, help='listener threads [%default]')
+    parser.add_option('--messages', type='int', default=2000, help='messages to send [%default]')
+    parser.add_option('--interval', type='float', default=0.0005,
+                      help='seconds between messages [%default]')
+    parser.add_option('--output', help='save the results as JSON')
+    options, args = parser.parse_args()
+
+    results = dict()
+    for name, queue in (('Queue', Queue()), ('Mailbox', Mailbox())):
+        results[name] = run(queue, options.listeners, options.messages, options.interval)
+        report(name, results[name])
+    if options.output:
+        FH = open(options.output, 'w')
+        json.dump(results, FH, indent=2)
+        FH.close()
@@ -0,0 +1,231 @@
+'''
+End to end throughput of the scan loop on simulated hardware
+
+Drives GadoSystem.start through stacks of artifacts (10, 100 and 1000 by
+default, see gado.simulator) and reports artifacts/minute (timed from the
+first pick up to the last artifact, so connecting and the sanity checks
+don't count against small stacks), the latency
+distribution of every stage (as recorded by gado.metrics), the peak RSS
+and how much the database grew.
+Results are saved as JSON so runs can be compared across commits:
+
+    python -m benchmarks.throughput --output before.json
+    ... change things ...
+    python -m benchmarks.throughput --output after.json
+    python -m benchmarks.throughput --compare before.json after.json
+
+Every stack runs in a process of its own so the peak RSS is that stack's.
+'''
+import os, sys, json, shutil, tempfile, platform, subprocess, datetime
+from optparse import OptionParser
+from gado.metrics import STAGES
+
+DEFAULT_STACKS = '10,100,1000'
+
+try:
+    import resource
+except ImportError:
+    # There is no resource module on Windows, the peak RSS is left out there
+    resource = None
+
+def percentile(ordered, p):
+    '''
+    Nearest rank percentile of an already sorted list
+    '''
+    if not ordered:
+        return None
+    rank = int(round(p / 100.0 * len(ordered) + 0.5)) - 1
+    return ordered[max(0, min(rank, len(ordered) - 1))]
+
+def summarize(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return dict(count=0)
+    return dict(count=len(ordered),
+                mean=sum(ordered) / len(ordered),
+                p50=percentile(ordered, 50),
+                p95=percentile(ordered, 95),
+                p99=percentile(ordered, 99),
+                max=ordered[-1])
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, OS X bytes
+    if sys.platform == 'darwin':
+        rss = rss // 1024
+    return rss
+
+def _db_bytes(gado_sys):
+    path = os.path.join(gado_sys.s['db_directory'], gado_sys.s['db_filename'])
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def run_stack(artifacts, settings):
+    '''
+    Runs one stack in this process and returns its results
+    '''
+    from gado.simulator.session import run_scan
+
+    state = dict()
+    def prepare(gado_sys):
+        state['gado_sys'] = gado_sys
+        state['db_before'] = _db_bytes(gado_sys)
+
+    workdir = tempfile.mkdtemp(prefix='gado-bench-')
+    try:
+        result = run_scan(artifacts, workdir=workdir, prepare=prepare, **settings)
+        gado_sys = state['gado_sys']
+        db_after = _db_bytes(gado_sys)
+        durations = gado_sys.dbi.stage_durations(gado_sys.last_job)
+        summary = gado_sys.dbi.job_summary(gado_sys.last_job)
+        window = gado_sys.dbi.artifact_window(gado_sys.last_job)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    scanned = result['artifacts']
+    seconds = window[1] - window[0] if window else result['seconds']
+    return dict(artifacts=scanned,
+                seconds=seconds,
+                job_seconds=result['seconds'],
+                artifacts_per_minute=60.0 * scanned / seconds,
+                peak_rss_kb=peak_rss_kb(),
+                db_bytes_before=state['db_before'],
+                db_bytes_after=db_after,
+                db_growth_bytes=db_after - state['db_before'],
+                db_bytes_per_artifact=(db_after - state['db_before']) / float(scanned or 1),
+                slept=summary['slept'],
+                slowest_stage=summary['slowest_stage'],
+                pick_success_rate=summary['pick_success_rate'],
+                stages=dict((stage, summarize(samples))
+                            for stage, samples in durations.items()))
+
+def _run_child(artifacts, settings):
+    '''
+    Runs a stack in a fresh interpreter, the scan loop's prints go nowhere
+    '''
+    FH, path = tempfile.mkstemp(suffix='.json', prefix='gado-bench-')
+    os.close(FH)
+    args = [sys.executable, '-m', 'benchmarks.throughput', '--child',
+            '--result', path, '--stacks', str(artifacts),
+            '--settings', json.dumps(settings)]
+    devnull = open(os.devnull, 'w')
+    try:
+        code = subprocess.call(args, stdout=devnull, stderr=devnull,
+                               cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        if code != 0:
+            raise Exception('Benchmark of %s artifacts exited with %s' % (artifacts, code))
+        FH = open(path)
+        result = json.load(FH)
+        FH.close()
+        return result
+    finally:
+        devnull.close()
+        os.remove(path)
+
+def _commit():
+    try:
+        proc = subprocess.Popen(['git', 'rev-parse', '--short', 'HEAD'],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = proc.communicate()
+        return out.strip() or None
+    except OSError:
+        return None
+
+def run(stacks, settings):
+    report = dict(commit=_commit(),
+                  created=datetime.datetime.now().isoformat(),
+                  python=platform.python_version(),
+                  platform=platform.platform(),
+                  settings=settings,
+                  runs=[])
+    for artifacts in stacks:
+        print 'benchmark\t%s artifacts' % artifacts
+        result = _run_child(artifacts, settings)
+        report['runs'].append(result)
+        print_run(result)
+    return report
+
+def _ms(value):
+    return '%9.1f' % (value * 1000.0) if value is not None else '        -'
+
+def print_run(result):
+    print '  %d artifacts in %.1fs (%.1fs with connecting): %.2f artifacts/minute, peak RSS %s kB, db +%s bytes' % (
+        result['artifacts'], result['seconds'], result.get('job_seconds', result['seconds']),
+        result['artifacts_per_minute'], result['peak_rss_kb'], result['db_growth_bytes'])
+    print '  slowest stage: %s, %.1fs spent in time.sleep' % (
+        result.get('slowest_stage'), result.get('slept') or 0.0)
+    print '  %-14s %6s %9s %9s %9s %9s' % ('stage (ms)', 'count', 'p50', 'p95', 'p99', 'max')
+    for stage in STAGES:
+        s = result['stages'].get(stage, dict(count=0))
+        print '  %-14s %6d %s %s %s %s' % (stage, s['count'], _ms(s.get('p50')),
+            _ms(s.get('p95')), _ms(s.get('p99')), _ms(s.get('max')))
+
+def compare(before_path, after_path):
+    FH = open(before_path); before = json.load(FH); FH.close()
+    FH = open(after_path); after = json.load(FH); FH.close()
+    print 'before: %s (%s)  after: %s (%s)' % (before['commit'], before['created'],
+                                              after['commit'], after['created'])
+    keyed = dict((r['artifacts'], r) for r in before['runs'])
+    for new in after['runs']:
+        old = keyed.get(new['artifacts'])
+        if old is None:
+            continue
+        change = 100.0 * (new['artifacts_per_minute'] / old['artifacts_per_minute'] - 1)
+        print '%d artifacts: %.2f -> %.2f artifacts/minute (%+.1f%%)' % (
+            new['artifacts'], old['artifacts_per_minute'], new['artifacts_per_minute'], change)
+        for stage in STAGES:
+            a = old['stages'].get(stage, {}).get('p50')
+            b = new['stages'].get(stage, {}).get('p50')
+            if a is not None and b is not None:
+                print '  %-14s p50 %s -> %s ms' % (stage, _ms(a).strip(), _ms(b).strip())
+
+def _parse_settings(pairs):
+    settings = dict()
+    for pair in pairs:
+        key, _, value = pair.partition('=')
+        try:
+            settings[key] = json.loads(value)
+        except ValueError:
+            settings[key] = value
+    return settings
+
+if __name__ == '__main__':
+    parser = OptionParser(usage='%prog [options] | --compare BEFORE AFTER')
+    parser.add_option('--stacks', default=DEFAULT_STACKS,
+                      help='comma separated stack sizes [%default]')
+    parser.add_option('--time-scale', type='float', default=0.01,
+                      help='sim_time_scale for the simulated hardware [%default]')
+    parser.add_option('--set', action='append', default=[], metavar='KEY=VALUE',
+                      help='override a setting, may be repeated')
+    parser.add_option('--output', help='save the results to this JSON file')
+    parser.add_option('--compare', action='store_true',
+                      help='compare two saved results')
+    # Used between the runner and its child processes
+    parser.add_option('--child', action='store_true', help='')
+    parser.add_option('--result', help='')
+    parser.add_option('--settings', default='{}', help='')
+    options, args = parser.parse_args()
+
+    if options.compare:
+        if len(args) != 2:
+            parser.error('--compare needs two result files')
+        compare(args[0], args[1])
+    elif options.child:
+        result = run_stack(int(options.stacks), json.loads(options.settings))
+        FH = open(options.result, 'w')
+        json.dump(result, FH)
+        FH.close()
+    else:
+        settings = dict(sim_time_scale=options.time_scale)
+        settings.update(_parse_settings(options.set))
+        stacks = [int(n) for n in options.stacks.split(',')]
+        report = run(stacks, settings)
+        if options.output:
+            FH = open(options.output, 'w')
+            json.dump(report, FH, indent=2)
+            FH.close()
+            print 'benchmark\tsaved results to %s' % options.output
@@ -12,14 +12,24 @@ from gado.functions import *
 from gado.gui.ManageSets import ManageSets
 from gado.gui.ConfigurationWindow import ConfigurationWindow
 import gado.messages as messages
+import gado.rpc as rpc
 from threading import Thread
 from Queue import Queue
 from gado.gui.Wizard import Wizard
 from gado.gui.AdvancedSettings import AdvancedSettings
 
 import datetime
+import gado.log
+
+log = gado.log.get('GadoGui')
 
 class GuiListener(Thread):
+    # What it handles, the RETURNs are left for whoever waits on them
+    MESSAGES = (messages.SET_SCANNER_PICTURE, messages.SET_WEBCAM_PICTURE,
+                messages.SET_STATUS_TEXT, messages.ROBOT_CONNECTION_CHANGED,
+                messages.DISPLAY_ERROR, messages.DISPLAY_INFO,
+                messages.GUI_ABANDON_SHIP, messages.GUI_LISTENER_DIE)
+    
     def __init__(self, q, gui_q, gui):
         self.gui_q = gui_q
         self.q = q
@@ -28,14 +38,21 @@ class GuiListener(Thread):
     
     def run(self):
         while True:
-            msg = fetch_from_queue(self.q)
-            print 'GuiListener\tFetched message %s' % str(msg)
+            msg = fetch_from_queue(self.q, self.MESSAGES)
+            log.debug('Fetched message %s', msg)
             if msg[0] == messages.SET_SCANNER_PICTURE:
                 self.gui.changeScannedImage(msg[1])
             elif msg[0] == messages.SET_WEBCAM_PICTURE:
                 self.gui.changeWebcamImage(msg[1])
             elif msg[0] == messages.SET_STATUS_TEXT:
                 self.gui.changeStatusText(msg[1])
+            elif msg[0] == messages.ROBOT_CONNECTION_CHANGED:
+                if msg[1]:
+                    self.gui.changeStatusText('Reconnected to the robot')
+                else:
+                    self.gui.changeStatusText('Lost the connection to the robot')
+                    add_to_queue(self.gui_q, messages.DISPLAY_ERROR,
+                                 'Lost the connection to the robot, check its cable and power.')
             elif msg[0] == messages.DISPLAY_ERROR:
                 add_to_queue(self.gui_q, messages.DISPLAY_ERROR, msg[1])
             elif msg[0] == messages.DISPLAY_INFO:
@@ -46,7 +63,7 @@ class GuiListener(Thread):
             elif msg[0] == messages.GUI_LISTENER_DIE:
                 return
             else:
-                add_to_queue(self.q, msg[0], (msg[1] if len(msg) > 1 else None))
+                requeue(self.q, msg)
 
 class GadoGui(Frame):
     
@@ -79,12 +96,12 @@ class GadoGui(Frame):
         self.pack()
         self.createWidgets()
         
-        msg = fetch_from_queue(self.q_in)
+        msg = fetch_from_queue(self.q_in, (messages.READY, messages.LAUNCH_WIZARD))
         self.tkloop()
         if msg[0] == messages.LAUNCH_WIZARD:
-            print 'GadoGui\tabout to launch the wizard!'
+            log.info('about to launch the wizard!')
             
-            print 'GadoGui\tadding launch wizrd to the gui queue'
+            log.debug('adding launch wizrd to the gui queue')
             add_to_queue(self.q_in, messages.GUI_LISTENER_DIE)
             add_to_queue(self.gui_q, messages.LAUNCH_WIZARD)
             #self.wizard.load()
@@ -139,7 +156,7 @@ class GadoGui(Frame):
         try:
             while True:
                 msg = self.gui_q.get_nowait()
-                print 'GadoGui\tmsg:', msg
+                log.debug('msg: %s', msg)
                 if msg[0] == messages.DISPLAY_ERROR:
                     tkMessageBox.showerror("Error", msg[1])
                 elif msg[0] == messages.DISPLAY_INFO:
@@ -201,12 +218,12 @@ class GadoGui(Frame):
         add_to_queue(self.q_in, messages.GUI_LISTENER_DIE)
         
         queued = datetime.datetime.now()
-        print'GadoGui\tTime to add GUI_LISTENER_DIE to queue: %s' % (queued - start)
+        log.debug('Time to add GUI_LISTENER_DIE to queue: %s', queued - start)
         
         self.manage_sets.show()
         
         showed = datetime.datetime.now()
-        print'GadoGui\tTime to show manage_sets: %s' % (queued - start)
+        log.debug('Time to show manage_sets: %s', queued - start)
     
     def show_configuration_window(self):
         add_to_queue(self.q_in, messages.GUI_LISTENER_DIE)
@@ -290,10 +307,10 @@ class GadoGui(Frame):
     
     def destroy(self):
         #add_to_queue(self.q, messages.SYSTEM_ABANDON_SHIP)
-        print 'GadoGui\tAdded ABANDON SHIP to the queue'
+        log.info('Added ABANDON SHIP to the queue')
         add_to_queue(self.q_out, messages.MAIN_ABANDON_SHIP)
         add_to_queue(self.q_in, messages.GUI_LISTENER_DIE)
-        print 'GadoGui\tCalling root.destroy()'
+        log.debug('Calling root.destroy()')
         sys.exit()
         
     #################################################################################
@@ -305,16 +322,13 @@ class GadoGui(Frame):
         self._populate_set_dropdown()
     
     def _populate_set_dropdown(self):
-        add_to_queue(self.q_out, messages.WEIGHTED_ARTIFACT_SET_LIST)
-        msg = fetch_from_queue(self.q_in, messages.RETURN)
-        self.weighted_sets = msg[1]
+        self.weighted_sets = rpc.client(self.q_out, self.q_in).call(
+            messages.WEIGHTED_ARTIFACT_SET_LIST).result()
         for id, indented_name in self.weighted_sets:
             self.set_dropdown.insert('end', indented_name)
     
     def connectToRobot(self):
-        add_to_queue(self.q_out, messages.ROBOT_CONNECT)
-        msg = fetch_from_queue(self.q_in, messages.RETURN, timeout=30)
-        success = msg[1]
+        success = rpc.client(self.q_out, self.q_in).call(messages.ROBOT_CONNECT).result(timeout=30)
         if success:
             tkMessageBox.showinfo("Connection Status", "Successfully connected to Gado!")
         else:
@@ -323,12 +337,12 @@ class GadoGui(Frame):
     
     def startRobot(self):
         #Function call to start robot's operation
-        print "GadoGui\tStarting robot..."
+        log.info("Starting robot...")
         add_to_queue(self.q_out, messages.START)
         
     def pauseRobot(self):
         #Function call to pause robot's operation
-        print "GadoGui\tPausing robot..."
+        log.info("Pausing robot...")
         add_to_queue(self.q_out, messages.LAST_ARTIFACT)
     
     def resumeRobot(self):
@@ -336,12 +350,12 @@ class GadoGui(Frame):
     
     def stopRobot(self):
         #Function call to stop robot's operation
-        print "Stopping robot..."
+        log.info("Stopping robot...")
         add_to_queue(self.q_out, messages.STOP)
         
     def resetRobot(self):
         #Function call to reset the robot's operations
-        print "Restarting robot..."
+        log.info("Restarting robot...")
         add_to_queue(self.q_out, messages.RESET)
         
     #Image transferring functions
@@ -359,7 +373,7 @@ class GadoGui(Frame):
             self.frontImageLabel.grid(row=3, column=0, sticky=N+S+E+W, padx=10, pady=5, columnspan=2)
             
         except:
-            print "Error updating scanner image in gui thread..."
+            log.warning("Error updating scanner image in gui thread...")
         
     def changeWebcamImage(self, imagePath):
         try:
@@ -372,4 +386,4 @@ class GadoGui(Frame):
             self.backImageLabel.photo = self.backImage
             self.backImageLabel.grid(row=3, column=2, sticky=N+S+E+W, padx=10, pady=5, columnspan=2)
         except:
-            print "Error updating webcam image in gui thread..."
\ No newline at end of file
+            log.warning("Error updating webcam image in gui thread...")
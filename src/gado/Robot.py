@@ -1,4 +1,19 @@
-import serial, platform, time, sys, json
+import platform, time, sys, json
+from contextlib import contextmanager
+try:
+    import serial
+except ImportError:
+    # Only needed to talk to real hardware; see gado.simulator
+    serial = None
+from threading import Lock
+import gado.metrics as metrics
+from gado.telemetry import TelemetryBuffer, SerialReader
+from gado.motion import MotionModel
+from gado.protocol import LegacyProtocol, FramedProtocol, negotiate
+from gado.heartbeat import Heartbeat
+import gado.log
+
+log = gado.log.get('Robot')
 
 #Constants
 MOVE_ARM = 'a'
@@ -22,10 +37,45 @@ ACTUATOR_UPPER_BOUNDS = 255
 ARM_LOWER_BOUNDS = 0
 ARM_UPPER_BOUNDS = 190 # can we increase this?
 
+# Read timeout of the serial line once the SerialReader owns it, this is how
+# often the reader wakes up to ask for telemetry when nothing comes in
+READER_TIMEOUT = 0.05
+
+LIFT_TIMEOUT = 10 # seconds for a lower and lift routine
+SETTLE_TIMEOUT = 5 # seconds for the actuator to come to rest
+SETTLE_TIME = 0.2 # seconds the actuator has to stay put to be at rest
+BATCH_TIMEOUT = 10 # seconds on top of the arm's move for a routine to finish
+ARM_TOLERANCE = 1 # degrees from the target at which the arm has arrived
+SEAL_TIMEOUT = 0.3 # seconds after a pick up for the pump current to show a sealed cup
+
+class _Lifted():
+    '''
+    Telemetry predicate for the end of a lower and lift routine
+
+    True for a sample with the cup above clear that came after one below it,
+    or that has a sequence number past fresh (it answers a request sent
+    after the routine)
+    '''
+    def __init__(self, clear, fresh):
+        self.clear = clear
+        self.fresh = fresh
+        self.lowered = False
+
+    def __call__(self, d):
+        if d.actuator_pos_s <= self.clear:
+            self.lowered = True
+            return False
+        return self.lowered or d.sequence > self.fresh
+
 class Robot(object):
     def __init__(self, arm_home_value=0, arm_in_value=0, arm_out_value=0,
                  actuator_home_value=30, baudrate=115200, actuator_up_value=20,
-                 actuator_clear_value=200, gado_port=None, **kargs):
+                 actuator_clear_value=200, gado_port=None,
+                 arm_degrees_per_s=180.0/5.0, arm_time_overhead=0.5,
+                 telemetry_buffer_size=256, telemetry_idle_interval=1.0,
+                 serial_protocol='auto', heartbeat_timeout=3.0,
+                 trajectory_planner=0, actuator_strokes_per_s=120.0,
+                 telemetry_log=None, pump_sealed_current=0, pick_retries=2, **kargs):
         
         #Grab settings
         self.arm_home_value = int(arm_home_value) if arm_home_value else 0
@@ -36,12 +86,60 @@ class Robot(object):
         self.actuator_clear_value = int(actuator_clear_value) if actuator_clear_value else 200
         self.actuator_up_value = int(actuator_up_value) if actuator_up_value else 20
         
+        #Arm timing, refit from telemetry as the arm moves
+        self.motion = MotionModel(float(arm_degrees_per_s) if arm_degrees_per_s else 180.0/5.0,
+                                  float(arm_time_overhead) if arm_time_overhead else 0.0)
+        
         self.baudrate = baudrate
         self.serialConnection = None
         
+        #Latest telemetry, kept up to date by the SerialReader once connected
+        self.telemetry = TelemetryBuffer(int(telemetry_buffer_size or 256))
+        self.telemetry_idle_interval = float(telemetry_idle_interval or 1.0)
+        self.reader = None
+        #File every sample is appended to, see gado.recorder
+        self.telemetry_log = telemetry_log or None
+        
+        #Whether the robot is still there, see gado.heartbeat
+        self.heartbeat = None
+        self.heartbeat_timeout = float(heartbeat_timeout or 3.0)
+        if self.telemetry_idle_interval >= self.heartbeat_timeout:
+            #The robot would count as lost between two idle requests
+            log.warning('telemetry_idle_interval %ss is not below heartbeat_timeout %ss, using %ss',
+                        self.telemetry_idle_interval, self.heartbeat_timeout,
+                        self.heartbeat_timeout / 2)
+            self.telemetry_idle_interval = self.heartbeat_timeout / 2
+        self.connection_listeners = []
+        
+        #Commands come from the scan loop and the reader (telemetry requests)
+        self._write_lock = Lock()
+        #The sequence number the answer to the latest telemetry request will
+        #get, the firmware answers them in order
+        self._requested_sequence = self.telemetry.sequence
+        #'auto' asks the firmware whether it takes frames, see gado.protocol
+        self.serial_protocol = serial_protocol or 'auto'
+        self.protocol = LegacyProtocol(self._write)
+        
+        #An artifact on the cup closes it off and the pump draws more current
+        self.pump_sealed_current = int(pump_sealed_current or 0)
+        self.pick_retries = int(pick_retries or 0)
+        self.pick_stats = dict(attempts=0, picked=0)
+        
         self.current_arm_value = int(arm_home_value) if arm_home_value else 0
         self.current_actuator_value = int(actuator_up_value) if actuator_up_value else 20
         
+        #Overlapping arm and actuator moves, see gado.planner
+        self.planner = None
+        if int(trajectory_planner or 0):
+            #Imported here, gado.planner needs the constants above
+            from gado.planner import TrajectoryPlanner
+            self.planner = TrajectoryPlanner(self.motion, arm_in_value=self.arm_in_value,
+                arm_home_value=self.arm_home_value, arm_out_value=self.arm_out_value,
+                actuator_up_value=self.actuator_up_value,
+                actuator_home_value=self.actuator_home_value,
+                actuator_clear_value=self.actuator_clear_value,
+                actuator_strokes_per_s=actuator_strokes_per_s)
+        
         #if gado_port is not None:
         #    self.gado_port = gado_port
         #    self.connect(gado_port)
@@ -59,14 +157,22 @@ class Robot(object):
             self.actuator_up_value = kwargs['actuator_up_value']
             self.actuator_clear_value = kwargs.get('actuator_clear_value')
             self.baudrate = kwargs['baudrate']
+            self.pump_sealed_current = int(kwargs.get('pump_sealed_current', self.pump_sealed_current) or 0)
+            self.pick_retries = int(kwargs.get('pick_retries', self.pick_retries) or 0)
+            if self.planner is not None:
+                self.planner.update(**kwargs)
         except:
-            print "Robot\tError when trying to update robot settings... (Make sure all settings were passed)\n Error: %s" % sys.exc_info()[0]
+            log.warning("Error when trying to update robot settings... (Make sure all settings were passed)\n Error: %s", sys.exc_info()[0])
         
     def returnGadoInfo(self):
+        if self._reading():
+            #The reader is the only one reading the line, ask it for a fresh sample
+            sample = self.telemetry.wait_for(lambda d: True, timeout=1)
+            return sample.raw if sample else ""
         if self.serialConnection.isOpen():
             self.clearSerialBuffers()
             self.serialConnection.write(RETURN_CURRENT_SETTINGS)
-            time.sleep(0.1)
+            metrics.sleep(0.1)
             response = self.serialConnection.read(1000)
             return response
         else:
@@ -81,59 +187,138 @@ class Robot(object):
         if self.connected():
             return True
         
-        try:
-            #Open a serial connection to this serial port
-            self.serialConnection = serial.Serial(port, self.baudrate, timeout=1)
-        except:
-            #raise
-            print "Robot\tERROR CONNECTING TO SERIAL PORT: %s. Error: %s" % (port, sys.exc_info()[0])
+        #Imported here, gado.discovery needs the constants above
+        from gado.discovery import probe
+        connection = probe(port, self.baudrate)
+        if connection is None:
+            log.warning("no handshake from a robot on %s", port)
             return False
-        
-        #Delay for 2 seconds because pyserial can't immediately communicate
-        time.sleep(1)
-        
-        if self.serialConnection.isOpen():
-            print "Robot\tInside robot connect"
-            #Initiate the handshake with the (potential) robot
-            self.serialConnection.flush()
-            self.serialConnection.flushInput()
-            self.serialConnection.flushOutput()
-            self.serialConnection.write(HANDSHAKE)
-            
-            #give it a second to respond
-            time.sleep(0.1)
-            
-            #Read back response (if any) and check to see if it matches the expected value
-            response = self.serialConnection.read(100)
-            
-            print "Robot\tresponse: \"%s\"" % response
-            
-            if response.find(HANDSHAKE_VALUE) >= 0:
-                self._moveArm(self.arm_home_value)
-                return True
-        return False
+        self.attach(connection)
+        return True
+    
+    def attach(self, connection):
+        '''
+        Takes over a serial connection the robot has answered the handshake on
+        (see gado.discovery.probe)
+        '''
+        self._stopReader()
+        if self.serialConnection is not None and self.serialConnection is not connection:
+            self.serialConnection.close()
+        self.serialConnection = connection
+        self._requested_sequence = self.telemetry.sequence
+        self._startReader()
+        self._negotiateProtocol()
+        self._moveArm(self.arm_home_value)
     
     def disconnect(self):
-        if self.serialConnection.isOpen():
+        self._stopReader()
+        if self.serialConnection is not None and self.serialConnection.isOpen():
             self.serialConnection.close()
     
+    def _startReader(self):
+        '''
+        Hands the reading side of the serial line to a SerialReader
+        '''
+        self._stopReader()
+        self.serialConnection.timeout = READER_TIMEOUT
+        self.reader = SerialReader(self.serialConnection, self.telemetry,
+                                   self._requestTelemetry,
+                                   idle_interval=self.telemetry_idle_interval)
+        self.reader.on_frame = lambda frame: self.protocol.handle(frame)
+        if self.telemetry_log:
+            #Imported here, gado.recorder is only needed when recording
+            from gado.recorder import TelemetryRecorder
+            try:
+                self.telemetry.recorder = TelemetryRecorder(self.telemetry_log)
+            except IOError, e:
+                log.warning('not recording telemetry to %s: %s', self.telemetry_log, e)
+        self.reader.start()
+        self.heartbeat = Heartbeat(self.reader, self.connection_listeners,
+                                   timeout=self.heartbeat_timeout)
+        self.heartbeat.start()
+    
+    def add_connection_listener(self, listener):
+        '''
+        listener is called with False when the robot goes away and with
+        True when it comes back
+        '''
+        self.connection_listeners.append(listener)
+    
+    def _negotiateProtocol(self):
+        if self.serial_protocol == 'framed':
+            self.protocol = FramedProtocol(self._write)
+        elif self.serial_protocol == 'legacy':
+            self.protocol = LegacyProtocol(self._write)
+        else:
+            self.protocol = negotiate(self._write, self.reader)
+        log.info('using the %s protocol', 'framed' if self.protocol.framed else 'legacy')
+    
+    def _stopReader(self):
+        if self.heartbeat is not None:
+            self.heartbeat.stop()
+            self.heartbeat.join(1)
+            self.heartbeat = None
+        if self.reader is not None:
+            self.reader.stop()
+            self.reader.join(1)
+            self.reader = None
+        if self.telemetry.recorder is not None:
+            self.telemetry.recorder.close()
+            self.telemetry.recorder = None
+    
+    def _reading(self):
+        return self.reader is not None and self.reader.running()
+    
+    def _requestTelemetry(self):
+        with self._write_lock:
+            self.serialConnection.write(RETURN_CURRENT_SETTINGS)
+            self._requested_sequence += 1
+    
+    def _write(self, data):
+        with self._write_lock:
+            self.serialConnection.write(data)
+    
+    def _send(self, *commands):
+        '''
+        Sends commands without waiting for them to finish
+        '''
+        self.protocol.send(commands)
+    
+    def _runBatch(self, commands, timeout):
+        '''
+        Sends commands in one frame and waits for the firmware to finish them
+        Returns False without sending anything if the firmware can't do that
+        '''
+        if not self.protocol.framed:
+            return False
+        started = time.time()
+        with self._routine(timeout):
+            self.protocol.send(commands, wait=True, timeout=timeout)
+        log.debug('batch %s done after %.2fs', ';'.join(commands), time.time() - started)
+        return True
+    
+    @contextmanager
+    def _routine(self, timeout):
+        '''
+        Runs the block as a routine the firmware may be silent for, up to
+        timeout seconds, without the heartbeat taking the robot for lost
+        '''
+        heartbeat = self.heartbeat
+        if heartbeat is not None:
+            heartbeat.quiet_until(time.time() + timeout)
+        try:
+            yield
+        finally:
+            if heartbeat is not None:
+                heartbeat.quiet_until(None)
+    
     def connected(self):
         '''
         Checks to see if the robot is connected
+        
+        Answered by the heartbeat, without a round trip to the robot
         '''
-        if self.serialConnection and self.serialConnection.isOpen():
-            #self.serialConnection.
-            self.serialConnection.write(HANDSHAKE)
-            
-            #Read back response from (tentative) robot
-            response = self.serialConnection.read(200)
-            print "Robot\tGot serial response: %s, with port %s and baud %s" % (response, self.serialConnection.port, self.serialConnection.baudrate)
-            
-            if response.find(HANDSHAKE_VALUE) >= 0:
-                return True
-            
-        #self.serialConnection = False
-        return False
+        return self.heartbeat is not None and self.heartbeat.alive
     
     def move_actuator(self, up):
         if up: # retracting the actuator moves it up
@@ -150,26 +335,48 @@ class Robot(object):
         return self._moveArm(n)
     
     def _drop(self):
-        self.serialConnection.write('%s' % DROP_ON_OUT_PILE)
+        self._send('%s' % DROP_ON_OUT_PILE)
         self.clearSerialBuffers()
     
     def _sleeptime(self, new_arm_location):
-        rotation = abs(new_arm_location - self.current_arm_value)
-        sleep_time = rotation * self.degrees_per_s
-        return sleep_time
+        return self.motion.predict(new_arm_location - self.current_arm_value)
     
-    def _move_arm_and_sleep(self, degree):
-        sleep_time = self._sleeptime(degree)
-        self._moveArm(degree)
-        time.sleep(sleep_time)
+    def _move_arm_and_wait(self, degree):
+        '''
+        Moves the arm and returns once it reports being there
+        
+        Without telemetry this falls back to sleeping for the predicted time.
+        If the arm doesn't arrive within the motion model's timeout we carry
+        on, like the blind sleep always did.
+        '''
+        rotation = abs(degree - self.current_arm_value)
+        started = time.time()
+        degree = self._moveArm(degree)
+        if not rotation:
+            return
+        if not self._reading():
+            metrics.sleep(self.motion.predict(rotation))
+            return
+        
+        timeout = self.motion.timeout(rotation)
+        arrived = self.telemetry.wait_for(lambda d: abs(d.arm_pos - degree) <= ARM_TOLERANCE,
+                                          timeout=timeout, after=started)
+        if arrived is None:
+            log.warning('arm did not report reaching %s within %.1fs', degree, timeout)
+            return
+        self.motion.observe(rotation, arrived.received - started)
     
-    #Move the robot's arm to the specified degree (between 0-180)
-    def _moveArm(self, degree):
+    def _armCommand(self, degree):
         if degree < ACTUATOR_LOWER_BOUNDS:
             degree = ACTUATOR_LOWER_BOUNDS
         elif degree > ACTUATOR_UPPER_BOUNDS:
             degree = ACTUATOR_UPPER_BOUNDS
-        self.serialConnection.write("%s%s" % (degree, MOVE_ARM))
+        return degree, "%s%s" % (degree, MOVE_ARM)
+    
+    #Move the robot's arm to the specified degree (between 0-180)
+    def _moveArm(self, degree):
+        degree, command = self._armCommand(degree)
+        self._send(command)
         self.current_arm_value = degree
         #Flush the serial line so we don't get any overflows in the event
         #that many commands are trying to be sent at once
@@ -183,13 +390,17 @@ class Robot(object):
         except:
             return None
     
-    #Move the robot's actuator to the specified stroke
-    def _moveActuator(self, stroke):
+    def _actuatorCommand(self, stroke):
         if stroke < ACTUATOR_LOWER_BOUNDS:
             stroke = ACTUATOR_LOWER_BOUNDS
         elif stroke > ACTUATOR_UPPER_BOUNDS:
             stroke = ACTUATOR_UPPER_BOUNDS
-        self.serialConnection.write("%s%s" % (stroke, MOVE_ACTUATOR))
+        return stroke, "%s%s" % (stroke, MOVE_ACTUATOR)
+    
+    #Move the robot's actuator to the specified stroke
+    def _moveActuator(self, stroke):
+        stroke, command = self._actuatorCommand(stroke)
+        self._send(command)
         self.current_actuator_value = int(stroke)
         #Flush the serial line so we don't get any overflows in the event
         #that many commands are trying to be sent at once
@@ -197,16 +408,23 @@ class Robot(object):
         return stroke
         
         
+    def _vacuumCommand(self, value):
+        return "%s%s" % (255 if value else 0, MOVE_VACUUM)
+    
     #Turn on the vacuum to the power level: value
     def _vacuumOn(self, value):
-        self.serialConnection.write("%s%s" % (255 if value else 0, MOVE_VACUUM))
+        self._send(self._vacuumCommand(value))
     
     #Clear all buffers on the serial line
     def clearSerialBuffers(self):        
         if self.serialConnection.isOpen():
-            self.serialConnection.flushInput()
-            self.serialConnection.flushOutput()
+            #Wait for the commands already written to go out, discarding the
+            #output buffer here used to drop the command that was just sent
             self.serialConnection.flush()
+            #Once the reader runs everything that comes in is telemetry it
+            #parses, there is nothing stale to throw away
+            if not self._reading():
+                self.serialConnection.flushInput()
     
     #Reset the robot to the home position
     def reset(self):
@@ -216,72 +434,195 @@ class Robot(object):
         
     def lift(self):
         self._vacuumOn(True)
-        print 'Robot\tlifting!'
-        self.serialConnection.write("%s" % LOWER_AND_LIFT)
+        log.debug('lifting!')
+        started = time.time()
+        self._send("%s" % LOWER_AND_LIFT)
         self.clearSerialBuffers()
-        for i in range(50):
-            print 'Robot\titeration %s' % i
-            resp = self.returnGadoInfo()
-            try:
-                print 'Robot\tresp: %s' % resp
-                current_height = json.loads(resp)['actuator_pos_s']
-                if current_height > self.actuator_clear_value:
-                    return
-            except:
-                pass
-            time.sleep(0.1)
+        
+        #The routine lowers the cup and lifts it back above the clear value.
+        #The cup rests above it too, so a sample above it only counts once
+        #one below it came in, or if it answers a 'd' sent after the 'l': the
+        #firmware answers that once the routine is done, even one that is
+        #silent while it runs
+        fresh = self._requested_sequence
+        lifted = _Lifted(self.actuator_clear_value, fresh)
+        with self._routine(LIFT_TIMEOUT):
+            sample = self.telemetry.wait_for(lifted, timeout=LIFT_TIMEOUT, after=started)
+        if sample is not None:
+            log.debug('lifted after %.2fs (lowered seen: %s): %s', time.time() - started,
+                      lifted.lowered, sample.raw)
+            return
         raise Exception('An error has occurred while lifting an image')
     
+    def _waitUntilSettled(self, started, timeout=SETTLE_TIMEOUT):
+        '''
+        Waits for the actuator sensor to stay put for SETTLE_TIME
+        Returns False if it is still moving after timeout seconds
+        '''
+        state = dict(position=None, since=started)
+        def settled(d):
+            if d.actuator_pos_s != state['position']:
+                state['position'] = d.actuator_pos_s
+                state['since'] = d.received
+            return d.received - state['since'] >= SETTLE_TIME
+        return self.telemetry.wait_for(settled, timeout=timeout, after=started) is not None
+    
+    def cup_sealed(self):
+        '''
+        Whether the pump current says there is an artifact on the cup
+        
+        None if it can't tell (no telemetry or no threshold)
+        '''
+        if not self._reading() or not self.pump_sealed_current:
+            return None
+        threshold = self.pump_sealed_current
+        sample = self.telemetry.wait_for(lambda d: d.pump_level and d.pump_current >= threshold,
+                                         timeout=SEAL_TIMEOUT)
+        return sample is not None
+    
+    def _sealed(self):
+        return self.cup_sealed() is not False
+    
+    def pick_success_rate(self):
+        attempts = self.pick_stats['attempts']
+        return float(self.pick_stats['picked']) / attempts if attempts else None
+    
+    def _planning(self):
+        #Moves only run at the same time inside a frame, with bare commands
+        #the waits between them cost more than the overlap saves
+        return self.planner is not None and self._reading() and self.protocol.framed
+    
+    def _runPlan(self, plan):
+        '''
+        Runs a plan from gado.planner as one batch
+        '''
+        from gado.planner import ARM, ACTUATOR, TOUCH
+        started = time.time()
+        before = self.telemetry.sequence_before()
+        timeout = 2 * plan.seconds + BATCH_TIMEOUT
+        with self._routine(timeout):
+            self.protocol.send(plan.batch(), wait=True, timeout=timeout)
+        
+        for move in [m for p in plan.phases for m in p.moves]:
+            if move.axis == ARM:
+                self.current_arm_value = move.target
+            elif move.axis == ACTUATOR:
+                self.current_actuator_value = move.target
+            elif move.axis == TOUCH:
+                #The lowest the cup got is where that tray is
+                samples = [d for d in self.telemetry.snapshot() if d.sequence > before]
+                if samples:
+                    self.planner.observe_floor(move.tray, ACTUATOR_UPPER_BOUNDS -
+                                               min(d.actuator_pos_s for d in samples))
+        log.debug('%s done after %.2fs (%.2fs predicted)', plan.name, time.time() - started, plan.seconds)
+    
+    def _batchTimeout(self, degree):
+        return self.motion.timeout(degree - self.current_arm_value) + BATCH_TIMEOUT
+    
     #Move the actuator until the click sensor is engaged, then turn on the vacuum and raise
     #the actuator. The bulk of this code is going to be executed from the arduino's firmware
     def pickUpObject(self):
-        print "Robot\tmoving arm to in pile"
-        self._move_arm_and_sleep(self.arm_in_value)
-        print 'Robot\tturning on vacuum'
+        '''
+        Picks up the top artifact of the in pile
+        
+        If the cup comes up empty it goes down again right there, up to
+        pick_retries times, instead of carrying nothing to the scanner
+        '''
+        for attempt in range(self.pick_retries + 1):
+            self._pickUp()
+            picked = self._sealed()
+            self.pick_stats['attempts'] += 1
+            if picked:
+                self.pick_stats['picked'] += 1
+                return True
+            log.warning('nothing on the cup after pick up %s of %s', attempt + 1, self.pick_retries + 1)
+        raise Exception('No artifact on the cup after %s tries' % (self.pick_retries + 1))
+    
+    def _pickUp(self):
+        if self._planning():
+            self._runPlan(self.planner.pick_up(self.current_arm_value, self.current_actuator_value))
+            return True
+        
+        if self._runBatch([self._armCommand(self.arm_in_value)[1],
+                           self._vacuumCommand(True),
+                           LOWER_AND_LIFT], self._batchTimeout(self.arm_in_value)):
+            self.current_arm_value = self.arm_in_value
+            return True
+        
+        log.debug("moving arm to in pile")
+        self._move_arm_and_wait(self.arm_in_value)
+        log.debug('turning on vacuum')
         self.lift()
-        print 'Robot\thopefully successfully picked up!'
+        log.debug('hopefully successfully picked up!')
         return True
     
     def scanObject(self):
-        print 'Robot\tmoving to home value'
-        self._move_arm_and_sleep(self.arm_home_value)
+        if self._planning():
+            self._runPlan(self.planner.place())
+            return True
+        
+        if self._runBatch([self._armCommand(self.arm_home_value)[1],
+                           self._actuatorCommand(self.actuator_home_value)[1],
+                           self._vacuumCommand(False)], self._batchTimeout(self.arm_home_value)):
+            self.current_arm_value = self.arm_home_value
+            self.current_actuator_value = self.actuator_home_value
+            return True
         
-        print 'Robot\tdropping actuator'
+        log.debug('moving to home value')
+        self._move_arm_and_wait(self.arm_home_value)
+        
+        log.debug('dropping actuator')
+        started = time.time()
         self._moveActuator(self.actuator_home_value)
-        max_time = 5 # wait 5 seconds max for it to drop
-        last_height = 0
-        for i in range(int(max_time / 0.1)):
-            resp = self.returnGadoInfo()
-            try:
-                current_height = json.loads(resp)['actuator_pos_s']
-                if current_height == last_height:
-                    return
-                last_height = current_height
-            except:
-                pass
-            time.sleep(0.1)
-        print 'Robot\tdone dropping on scanner??'
-        
-        print 'Robot\tturning off the pump'
+        if not self._waitUntilSettled(started):
+            log.debug('done dropping on scanner??')
+        
+        log.debug('turning off the pump')
         self._vacuumOn(False)
         return True
         
     def moveToOut(self):
-        print 'Robot\tlifting actuator up'
+        if self._planning():
+            self._runPlan(self.planner.drop())
+            return True
+        
+        if self._runBatch([self._vacuumCommand(True),
+                           LOWER_AND_LIFT,
+                           self._armCommand(self.arm_out_value)[1],
+                           self._vacuumCommand(False)], self._batchTimeout(self.arm_out_value)):
+            self.current_arm_value = self.arm_out_value
+            return True
+        
+        log.debug('lifting actuator up')
         #self._vacuumOn(True)
         #self._moveActuator(self.actuator_up_value)
         #time.sleep(5)
         self.lift()
-        print 'Robot\tmoving to out pile'
-        self._move_arm_and_sleep(self.arm_out_value)
+        log.debug('moving to out pile')
+        self._move_arm_and_wait(self.arm_out_value)
         
         # Drop that artifact
         self._vacuumOn(0)
         return True
     
+    def discard(self):
+        '''
+        Carries what is on the cup straight to the out pile, for sheets
+        that aren't scanned (the separator sheets of gado.jobs)
+        '''
+        if self._runBatch([self._armCommand(self.arm_out_value)[1],
+                           self._vacuumCommand(False)], self._batchTimeout(self.arm_out_value)):
+            self.current_arm_value = self.arm_out_value
+            return True
+        
+        log.debug('moving to out pile')
+        self._move_arm_and_wait(self.arm_out_value)
+        self._vacuumOn(0)
+        return True
+    
     #Pause the robot in its current step
     def pause(self):
-        print "Robot\tI'm paused inside the Robot object"
+        log.info("I'm paused inside the Robot object")
         pass
     
     #Stop the robot process and reset
@@ -4,6 +4,7 @@ Created on Dec 3, 2010
 @author: Tom Smith
 '''
 import json as j
+import time
 
 class RobotData(object):
     '''
@@ -16,6 +17,11 @@ class RobotData(object):
     light_value = None
     last_level = None
     pump_current = None
+    # When the sample came in and the JSON it came from
+    received = None
+    raw = None
+    # Order it came in, set by TelemetryBuffer
+    sequence = 0
 
     def __init__(self):
         '''
@@ -24,6 +30,8 @@ class RobotData(object):
         
     def processJSON(self, json):
         in_data = j.loads(json)
+        self.received = time.time()
+        self.raw = json
         self.arm_pos = in_data['arm_pos']
         self.actuator_pos_d = in_data['actuator_pos_d']
         self.actuator_pos_s = in_data['actuator_pos_s']
@@ -1,6 +1,16 @@
 from __future__ import division
-import win32com.client
-import os, sys, pythoncom
+import os, sys
+from threading import current_thread
+from gado.devices import registry
+try:
+    import win32com.client
+    import pythoncom
+except ImportError:
+    # WIA is Windows only; see gado.simulator for a stand-in scanner
+    win32com = pythoncom = None
+import gado.log
+
+log = gado.log.get('Scanner')
 
 #Constants
 
@@ -23,11 +33,12 @@ class Scanner():
         
         pythoncom.CoInitialize()
         
-        #Init all of the scanner objects
-        self.deviceManager = win32com.client.Dispatch(DEVICE_MANAGER)
+        #Init all of the scanner objects, the devices come from gado.devices
         self.wiaObject = win32com.client.Dispatch(COMMON_DIALOG)
         
         self.device = None
+        # The thread self.device was opened on, see _device()
+        self._thread = None
         self.scanDpi = DEFAULT_DPI
         self.scannerName = None
         
@@ -36,7 +47,7 @@ class Scanner():
             self.scanDpi = kwargs['scanner_dpi']
             self.scannerName = kwargs['scanner_name']
         except:
-            print "Scanner\tError while instantiating scanner with passed settings...\nScanner\tError: %s" % (sys.exc_info()[0])
+            log.warning("Error while instantiating scanner with passed settings... Error: %s", sys.exc_info()[0])
        
     #Take the last image scanned on the scanner and transfer it to the local computer
     #Save it as imageName in the specified dir (specify the file format as well, eg. png, jpg, bmp)
@@ -50,9 +61,14 @@ class Scanner():
         if self.scanDpi is None:
             self.setDPI(DEFAULT_DPI)
             
+        device = self._device()
+        if device is None:
+            log.warning("No scanner to transfer from on %s", current_thread().name)
+            return False
+            
         try:
             #Transfer the raw image data from the scanner to the local computer
-            image = self.device.Items[self.device.Items.count].Transfer(WIA_IMG_FORMAT_PNG)
+            image = device.Items[device.Items.count].Transfer(WIA_IMG_FORMAT_PNG)
             
             #Chdir to specified dir (if exists) and save the file as the passed name
             #If file already exists, it will be overwritten
@@ -61,35 +77,39 @@ class Scanner():
                 
             return True
         except:
-            print "Scanner\tError while transferring image from scanner to computer...\nScanner\tError: %s\n%s" % (sys.exc_info()[0], sys.exc_info()[1])
+            log.error("Error while transferring image from scanner to computer... Error: %s %s", sys.exc_info()[0], sys.exc_info()[1])
+            #It may have been unplugged, connected() looks for it again
+            registry().forget_scanner(device)
+            if device is self.device:
+                self.device = None
     
         return False
     
+    #WIA handles belong to the thread that opened them, any other thread
+    #connects through a registry of its own
+    def _device(self):
+        if self.device is None or current_thread() is self._thread:
+            return self.device
+        return registry().scanner(self.scannerName)
+    
     #Using the scannerName property in gado.conf, try and connect to the scanner
     #If this property does not exist in the conf file or if the scanner is not
     #present on the local machine return False. Otherwise, return True
     def connectToScanner(self):
         
-        if self.deviceManager is not None:
-            #Iterate through the deviceManager to find our particular scanner (or not)
-            for dev in self.deviceManager.DeviceInfos:
-                
-                #Look through each device to see if it's correct
-                for prop in dev.Properties:
-                    
-                    if prop.Name == "Name" and prop.Value == self.scannerName:
-                        #Found our scanner, let's connect to it
-                        self.device = dev.Connect()
-                        
-                        self.setDPI(self.scanDpi)
-                        
-                        return True
-        else:
-            print "Scanner\tNo device manager?!"
-        return False
+        #The scanners are only enumerated once, see gado.devices
+        device = registry().scanner(self.scannerName)
+        if device is None:
+            return False
+        self.device = device
+        self._thread = current_thread()
+        self.setDPI(self.scanDpi)
+        return True
     
+    #Connected to the scanner from gado.conf (or the only one there is),
+    #without asking anybody. The wizard uses connectToScannerGui
     def connected(self):
-        return self.connectToScannerGui()
+        return self.device is not None or self.connectToScanner()
     
     #Use Windows Image Aquisition's API to automatically pick the scanner to use
     #If there are multiple scanners available then a GUI pops up allowing the user to select one
@@ -99,12 +119,13 @@ class Scanner():
         
         try:
             self.device = self.wiaObject.ShowSelectDevice()
-            print "Scanner\tHAVE DEVICE: %s" % (self.device)
+            self._thread = current_thread()
+            log.info("HAVE DEVICE: %s", self.device)
             self.setDPI(self.scanDpi)
             
             return True
         
         except:
-            print "Scanner\tFailed to select a device, you should make sure everything is connected...\nScanner\tError: %s" % (sys.exc_info()[0])
+            log.warning("Failed to select a device, you should make sure everything is connected... Error: %s", sys.exc_info()[0])
             
             return False
\ No newline at end of file
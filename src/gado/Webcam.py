@@ -1,51 +1,248 @@
-from VideoCapture import Device
+import sys, time, atexit, Queue
+from threading import Thread, Condition, Event, Lock, current_thread
+from gado.devices import registry
+import gado.log
+
+log = gado.log.get('Webcam')
+
+# Frames in a row whose brightness may differ by no more than
+# SETTLE_TOLERANCE grey levels before the exposure counts as settled
+SETTLE_FRAMES = 3
+SETTLE_TOLERANCE = 2.0
+# Seconds to wait for that before taking the latest frame anyway
+SETTLE_TIMEOUT = 2.0
+# Every how many bytes of a frame the brightness is sampled
+BRIGHTNESS_STRIDE = 97
+
+class Frame():
+    '''
+    One frame of the stream, as VideoCapture hands it over: BGR rows from
+    the bottom up
+    '''
+    def __init__(self, data, width, height, brightness):
+        self.data = data
+        self.width = width
+        self.height = height
+        self.brightness = brightness
+        self.captured = time.time()
+        # Set once savePicture has written it out
+        self.path = None
+
+    def image(self):
+        try:
+            from PIL import Image
+        except ImportError:
+            import Image
+        return Image.frombuffer('RGB', (self.width, self.height), self.data, 'raw', 'BGR', 0, -1)
+
+    def gray(self):
+        '''
+        (Y800 buffer, width, height), see gado.barcode
+        '''
+        image = self.image().convert('L')
+        gray = image.tobytes() if hasattr(image, 'tobytes') else image.tostring()
+        return gray, self.width, self.height
+
+    def save(self, path):
+        self.image().save(path)
+        self.path = path
+
+class CaptureThread(Thread):
+    '''
+    The one thread that touches the webcams
+
+    VideoCapture's devices belong to the COM apartment, the thread, that
+    opened them. Every Webcam hands the calls that need a device to this
+    thread with call(), which opens them through its own registry (see
+    gado.devices), so the LogicThread and the wizard's requests all end up
+    using them from here.
+
+    Between calls it keeps the device given to capture() streaming and
+    holds on to its latest two frames. Reading raw buffers costs no
+    encoding and no disk, so savePicture only has to wait for frames taken
+    after it was called to stop changing in brightness, and write that one
+    frame out.
+    '''
+    def __init__(self):
+        Thread.__init__(self, name='webcam-capture')
+        self.daemon = True
+        self.device = None
+        self.running = True
+        self.frames = 0
+        # The latest frame and the one before it
+        self.latest = None
+        self.previous = None
+        self._condition = Condition()
+        # (function, args, done, outcome) waiting to run on this thread
+        self._calls = Queue.Queue()
+
+    def call(self, function, *args):
+        '''
+        Runs function on this thread and returns what it returns (or raises
+        what it raises)
+        '''
+        if current_thread() is self:
+            return function(*args)
+        done = Event()
+        outcome = []
+        self._calls.put((function, args, done, outcome))
+        done.wait()
+        result, exc_info = outcome[0]
+        if exc_info is not None:
+            raise exc_info[0], exc_info[1], exc_info[2]
+        return result
+
+    def capture(self, device):
+        '''
+        Keeps device streaming, None to stop
+        '''
+        def switch():
+            with self._condition:
+                self.device = device
+                self.latest = self.previous = None
+        self.call(switch)
+
+    def run(self):
+        while self.running:
+            #Calls first, then a frame when there is a device to read
+            try:
+                call = self._calls.get(timeout=0.1) if self.device is None \
+                    else self._calls.get_nowait()
+            except Queue.Empty:
+                call = None
+            if call is not None:
+                function, args, done, outcome = call
+                try:
+                    outcome.append((function(*args), None))
+                except:
+                    outcome.append((None, sys.exc_info()))
+                done.set()
+                continue
+            if self.device is not None:
+                self._capture()
+
+    def _capture(self):
+        try:
+            data, width, height = self.device.getBuffer()
+        except Exception, e:
+            log.warning('capture failed: %s', e)
+            time.sleep(0.1)
+            return
+        samples = bytearray(data[::BRIGHTNESS_STRIDE])
+        frame = Frame(data, width, height, sum(samples) / float(len(samples) or 1))
+        with self._condition:
+            self.previous, self.latest = self.latest, frame
+            self.frames += 1
+            self._condition.notify_all()
+
+    def stop(self):
+        self.running = False
+        self.join(1)
+
+    def settled_frame(self, after, timeout=SETTLE_TIMEOUT):
+        '''
+        The first frame captured after after that ends SETTLE_FRAMES frames
+        of steady brightness, or the latest one once timeout is up. None if
+        no frame was captured after after by then.
+        '''
+        deadline = time.time() + timeout
+        seen = 0
+        brightness = []
+        with self._condition:
+            while True:
+                if self.frames != seen and self.latest is not None and self.latest.captured > after:
+                    seen = self.frames
+                    brightness = (brightness + [self.latest.brightness])[-SETTLE_FRAMES:]
+                    if len(brightness) == SETTLE_FRAMES and \
+                            max(brightness) - min(brightness) <= SETTLE_TOLERANCE:
+                        return self.latest
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    if self.latest is None or self.latest.captured <= after:
+                        log.warning('no frame captured within %ss', timeout)
+                        return None
+                    log.warning('exposure did not settle within %ss', timeout)
+                    return self.latest
+                self._condition.wait(remaining)
+
+_thread = None
+_thread_lock = Lock()
+
+def capture_thread():
+    '''
+    The CaptureThread of this process, started on first use
+    '''
+    global _thread
+    with _thread_lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = CaptureThread()
+            _thread.start()
+            atexit.register(_thread.stop)
+        return _thread
 
 class Webcam():
-    def __init__(self, webcam_name=None, webcam_id=None, **kargs):
+    def __init__(self, webcam_name=None, webcam_id=None, webcam_stream=1, **kargs):
+        # The open Device, only ever used on the CaptureThread
         self.device = None
-        print 'Webcam\t__init__ called with webcam_name=%s and webcam_id=%s' % (webcam_name, webcam_id)
+        self.streaming = bool(int(webcam_stream))
+        # The frame savePicture wrote out last, for the barcode check
+        self.last_frame = None
+        self.thread = capture_thread()
+        log.debug('__init__ called with webcam_name=%s and webcam_id=%s', webcam_name, webcam_id)
         if webcam_name is not None:
             self.connect(device_name=webcam_name)
         elif webcam_id is not None:
             self.connect(device_number=webcam_id)
-    
+
     def options(self, device_name=None, device_number=None):
-        # I doubt people will have more than 5 webcams plugged in
-        print 'Webcam\toptions() called'
-        opts = []
-        for i in range(2):
-            try:
-                print 'Webcam\toptions - attempting to connect to %s' % i
-                d = Device(devnum=i)
-                if device_name is not None and device_name == d.getDisplayName():
-                    del self.device
-                    self.device = d
-                elif device_number is not None and device_number == i:
-                    del self.device
-                    self.device = d
-                opts.append((i, d.getDisplayName()))
-                del d
-            except:
-                pass
-        print 'Webcam\toptions() returning %s' % opts
+        # The webcams are only opened once, see gado.devices
+        opts = self.thread.call(lambda: registry().webcams())
+        if device_name is not None or device_number is not None:
+            self._use(device_name, device_number)
+        log.debug('options() returning %s', opts)
         return opts
-    
+
     def connect(self, device_name=None, device_number=None):
-        if device_name is not None:
-            self.options(device_name=device_name)
-        elif device_number is not None:
-            self.options(device_number=device_number)
-        else:
-            self.device = Device()
-    
+        self._use(device_name, device_number)
+
+    def _use(self, name=None, number=None):
+        device = self.thread.call(lambda: registry().webcam(name=name, number=number))
+        if device is not None and device is not self.device:
+            self.device = device
+            if self.streaming:
+                self.thread.capture(device)
+
+    def refresh(self):
+        '''
+        Enumerates the webcams again, see DeviceRegistry.refresh
+        '''
+        self.thread.call(lambda: registry().refresh())
+
     def disconnect(self):
-        del self.device
-        self.device = None 
-    
+        if self.device is not None and self.thread.device is self.device:
+            self.thread.capture(None)
+        self.device = None
+
     def savePicture(self, path, iterations=15):
-        for i in range(iterations):
-            self.device.saveSnapshot(path)
+        if self.streaming and self.device is not None and self.thread.device is self.device:
+            #One frame, once the exposure has settled
+            frame = self.thread.settled_frame(time.time())
+            if frame is not None:
+                frame.save(path)
+                self.last_frame = frame
+                return
+        self.last_frame = None
+        self.thread.call(self._snapshot, self.device, path, iterations)
+
+    def _snapshot(self, device, path, iterations):
+        # On the CaptureThread
+        try:
+            for i in range(iterations):
+                device.saveSnapshot(path)
+        except:
+            #Unplugged, look for it again next time
+            registry().forget_webcam(device)
+            raise
 
     def connected(self):
         return (self.device != None)
-    
\ No newline at end of file
@@ -0,0 +1,264 @@
+'''
+Driving the robot from an EventLoop instead of a thread
+
+Robot's methods block the calling thread until the arm and the actuator
+are done, which is the GadoSystem thread that should also be minding the
+message queue. AsyncRobot does the same moves without blocking: it takes
+the serial line of a connected Robot over from its SerialReader, reads
+it when select() says there is something to read and answers each
+telemetry wait with a Future (on Windows, where select() only takes
+sockets, it polls the line every POLL_INTERVAL instead). Its operations
+return Futures too:
+
+    loop = EventLoop()
+    arm = AsyncRobot(robot, loop)
+    loop.run_until_complete(arm.pick_up())
+
+pick_up, place_on_scanner, drop_on_out_pile and reset do what
+pickUpObject, scanObject, moveToOut and reset do with bare commands,
+waiting on the same telemetry conditions (see Robot.lift and
+Robot._move_arm_and_wait). The firmware's frames aren't used, each step
+is confirmed by telemetry instead.
+
+close() hands the serial line back to the Robot.
+'''
+import time
+from gado.Robot import LOWER_AND_LIFT, ARM_TOLERANCE, _Lifted, \
+    LIFT_TIMEOUT, SETTLE_TIMEOUT, SETTLE_TIME
+from gado.telemetry import TelemetryParser, ANSWER_TIMEOUT
+from gado.eventloop import EventLoop, Future, Return, SELECTS_FILES
+import gado.log
+
+log = gado.log.get('AsyncRobot')
+
+# Seconds between reads of a connection select() can't watch
+POLL_INTERVAL = 0.01
+# Seconds between telemetry requests while something waits on them
+BUSY_INTERVAL = 0.01
+
+class TelemetryTimeout(Exception):
+    pass
+
+class _Wait():
+    def __init__(self, predicate, after, future):
+        self.predicate = predicate
+        # Sequence number of the last sample checked
+        self.after = after
+        self.future = future
+
+class AsyncRobot():
+    def __init__(self, robot, loop=None):
+        self.robot = robot
+        self.loop = loop or EventLoop()
+        self.telemetry = robot.telemetry
+        self.connection = robot.serialConnection
+        self.last_seen = None
+
+        self._waits = []
+        self._requested = 0
+        self._closed = False
+
+        #The SerialReader and this would read the same line
+        robot._stopReader()
+        self.connection.timeout = 0
+        self.parser = TelemetryParser(self.telemetry)
+        self._fd = None
+        if SELECTS_FILES:
+            try:
+                self._fd = self.connection.fileno()
+            except (AttributeError, NotImplementedError):
+                pass
+        if self._fd is not None:
+            self.loop.add_reader(self._fd, self._read)
+        else:
+            self._poll()
+        self._request_timer = self.loop.call_later(0, self._maybe_request)
+
+    def close(self):
+        '''
+        Stops reading and gives the serial line back to the Robot
+        '''
+        self._closed = True
+        if self._fd is not None:
+            self.loop.remove_reader(self._fd)
+        self.loop.cancel_timer(self._request_timer)
+        for wait in self._waits:
+            wait.future.cancel()
+        self._waits = []
+        self.robot._startReader()
+
+    def connected(self):
+        return self.last_seen is not None and \
+            time.time() - self.last_seen < self.robot.heartbeat_timeout
+
+    #################################################################################
+    #####                           SERIAL LINE                                 #####
+    #################################################################################
+
+    def _read(self):
+        data = self.connection.read(self.connection.inWaiting() or 1)
+        if not data:
+            return
+        self.last_seen = time.time()
+        self.parser.feed(data)
+        self._check()
+
+    def _poll(self):
+        if self._closed:
+            return
+        self._read()
+        self.loop.call_later(POLL_INTERVAL, self._poll)
+
+    def _maybe_request(self):
+        '''
+        Asks for telemetry back to back while something waits on it, every
+        telemetry_idle_interval seconds otherwise
+        '''
+        now = time.time()
+        if self._waits:
+            latest = self.telemetry.latest()
+            answered = latest is not None and latest.received >= self._requested
+            if answered or now - self._requested > ANSWER_TIMEOUT:
+                self._request()
+            delay = BUSY_INTERVAL
+        else:
+            if now - self._requested > self.robot.telemetry_idle_interval:
+                self._request()
+            delay = self.robot.telemetry_idle_interval
+        self._request_timer = self.loop.call_later(delay, self._maybe_request)
+
+    def _request(self):
+        self._requested = time.time()
+        self.robot._requestTelemetry()
+
+    def _send(self, command):
+        self.robot._write(command)
+
+    #################################################################################
+    #####                           TELEMETRY                                   #####
+    #################################################################################
+
+    def wait_for(self, predicate, timeout, after=None):
+        '''
+        A Future of the first sample that came in after after (a sample or a
+        time, default: now, see TelemetryBuffer.sequence_before) and
+        satisfies predicate, failing with TelemetryTimeout
+        '''
+        future = Future()
+        wait = _Wait(predicate, self.telemetry.sequence_before(after), future)
+        self._waits.append(wait)
+        def expire():
+            if wait in self._waits:
+                self._waits.remove(wait)
+                future.set_exception(TelemetryTimeout('No telemetry matched within %.1fs' % timeout))
+        self.loop.call_later(timeout, expire)
+        if len(self._waits) == 1:
+            #Start asking right away instead of at the next idle request
+            self.loop.cancel_timer(self._request_timer)
+            self._request_timer = self.loop.call_later(0, self._maybe_request)
+        return future
+
+    def _check(self):
+        if not self._waits:
+            return
+        samples = self.telemetry.snapshot()
+        for wait in list(self._waits):
+            for sample in samples:
+                if sample.sequence > wait.after:
+                    wait.after = sample.sequence
+                    if wait.predicate(sample):
+                        self._waits.remove(wait)
+                        wait.future.set_result(sample)
+                        break
+
+    #################################################################################
+    #####                           STEPS                                       #####
+    #################################################################################
+
+    def _move_arm(self, degree):
+        robot = self.robot
+        rotation = abs(degree - robot.current_arm_value)
+        started = time.time()
+        degree, command = robot._armCommand(degree)
+        self._send(command)
+        robot.current_arm_value = degree
+        if not rotation:
+            return
+        timeout = robot.motion.timeout(rotation)
+        try:
+            arrived = yield self.wait_for(lambda d: abs(d.arm_pos - degree) <= ARM_TOLERANCE,
+                                          timeout, started)
+        except TelemetryTimeout:
+            log.warning('arm did not report reaching %s within %.1fs', degree, timeout)
+            return
+        robot.motion.observe(rotation, arrived.received - started)
+
+    def _lift(self):
+        started = time.time()
+        self._send(self.robot._vacuumCommand(True))
+        self._send(LOWER_AND_LIFT)
+        #See Robot.lift
+        lifted = _Lifted(self.robot.actuator_clear_value, self.robot._requested_sequence)
+        try:
+            yield self.wait_for(lifted, LIFT_TIMEOUT, started)
+        except TelemetryTimeout:
+            raise Exception('An error has occurred while lifting an image')
+
+    def _settle(self, started):
+        state = dict(position=None, since=started)
+        def settled(d):
+            if d.actuator_pos_s != state['position']:
+                state['position'] = d.actuator_pos_s
+                state['since'] = d.received
+            return d.received - state['since'] >= SETTLE_TIME
+        try:
+            yield self.wait_for(settled, SETTLE_TIMEOUT, started)
+        except TelemetryTimeout:
+            log.warning('actuator still moving after %ss', SETTLE_TIMEOUT)
+
+    def _pick_up(self):
+        yield self.loop.spawn(self._move_arm(self.robot.arm_in_value))
+        yield self.loop.spawn(self._lift())
+        raise Return(True)
+
+    def _place_on_scanner(self):
+        robot = self.robot
+        yield self.loop.spawn(self._move_arm(robot.arm_home_value))
+        started = time.time()
+        stroke, command = robot._actuatorCommand(robot.actuator_home_value)
+        self._send(command)
+        robot.current_actuator_value = int(stroke)
+        yield self.loop.spawn(self._settle(started))
+        self._send(robot._vacuumCommand(False))
+        raise Return(True)
+
+    def _drop_on_out_pile(self):
+        yield self.loop.spawn(self._lift())
+        yield self.loop.spawn(self._move_arm(self.robot.arm_out_value))
+        self._send(self.robot._vacuumCommand(False))
+        raise Return(True)
+
+    def _reset(self):
+        robot = self.robot
+        stroke, command = robot._actuatorCommand(robot.actuator_up_value)
+        self._send(command)
+        robot.current_actuator_value = int(stroke)
+        self._send(robot._vacuumCommand(False))
+        yield self.loop.spawn(self._move_arm(robot.arm_home_value))
+        raise Return(True)
+
+    #################################################################################
+    #####                           OPERATIONS                                  #####
+    #################################################################################
+
+    def pick_up(self):
+        return self.loop.spawn(self._pick_up())
+
+    def place_on_scanner(self):
+        return self.loop.spawn(self._place_on_scanner())
+
+    def drop_on_out_pile(self):
+        return self.loop.spawn(self._drop_on_out_pile())
+
+    def reset(self):
+        return self.loop.spawn(self._reset())
@@ -0,0 +1,494 @@
+'''
+Decoding barcodes without starting zbarimg for every artifact
+
+gado.functions.read_barcode used to run lib\zbar\zbarimg.exe through the
+shell on every webcam snapshot: a process start, ImageMagick reading the
+JPEG back off the disk and the stderr plumbing, each cycle. A Decoder
+takes the image as an 8 bit grayscale (Y800) buffer instead:
+
+    decoder = get_decoder(**settings)
+    decoder.decode(gray, width, height)     # ['project gado']
+    decoder.read(path)                      # 'project gado', like read_barcode
+
+The backends, in the order 'auto' tries them (barcode_decoder setting):
+    library  - libzbar through ctypes, in this process
+    worker   - one long lived process that is handed the buffers over a
+               pipe, for when libzbar can't be loaded here (a 32 bit DLL
+               in a 64 bit Python) or shouldn't take the LogicThread down
+               with it. Only used when the barcode_worker setting gives
+               its command, a Python that can load libzbar running
+               'python -m gado.barcode --serve' (SERVE_COMMAND does that
+               with this interpreter, which is no use under py2exe)
+    zbarimg  - the old subprocess per image
+
+Files are turned into buffers with PIL, binary PGM files are read without
+it.
+
+A barcode only covers a small part of a webcam frame. With NumPy
+installed (and barcode_roi on) the decoder is wrapped in a RegionDecoder,
+which looks for the few regions with the most edges on a downscaled copy
+of the frame (see find_regions) and decodes those first, at full
+resolution. A frame is still decoded whole when no region holds a
+barcode, so a barcode that didn't make it among the regions (on a text
+heavy artifact back) isn't missed: the regions make the frames with a
+barcode, the ones that end a stack or switch its set, quick to decode.
+
+    python -m benchmarks.barcode_latency
+
+compares the per call latency of the backends.
+'''
+import os, sys, struct, tempfile, subprocess, ctypes, ctypes.util
+from threading import Lock, Thread
+try:
+    import numpy
+except ImportError:
+    # Without it frames are decoded whole, see RegionDecoder
+    numpy = None
+import gado.log
+
+log = gado.log.get('barcode')
+
+# zbar_image_set_format wants a fourcc
+Y800 = struct.unpack('<I', 'Y800')[0]
+ZBAR_CFG_ENABLE = 0
+
+# Worker requests are (width, height, length) and the pixels, replies the
+# length and the decoded lines
+REQUEST = struct.Struct('<III')
+REPLY = struct.Struct('<I')
+
+# Seconds the barcode worker gets to say it is ready
+HANDSHAKE_TIMEOUT = 10.0
+# This module as a barcode worker, run by this interpreter
+SERVE_COMMAND = [sys.executable, '-m', 'gado.barcode', '--serve']
+
+# Mean edge strength (grey levels per pixel) below which nothing counts
+# as part of a barcode, see find_regions
+MIN_EDGE_ENERGY = 40.0
+
+class DecoderUnavailable(Exception):
+    pass
+
+def read_pgm(data):
+    '''
+    (gray, width, height) of a binary PGM file's contents
+    '''
+    fields = []
+    position = 2
+    while len(fields) < 3:
+        while data[position].isspace():
+            position += 1
+        if data[position] == '#':
+            position = data.index('\n', position)
+            continue
+        end = position
+        while not data[end].isspace():
+            end += 1
+        fields.append(int(data[position:end]))
+        position = end
+    width, height, maxval = fields
+    if maxval > 255:
+        raise ValueError('Only 8 bit PGM files can be read')
+    position += 1
+    return data[position:position + width * height], width, height
+
+def write_pgm(gray, width, height):
+    return 'P5\n%s %s\n255\n' % (width, height) + gray
+
+def gray_image(path=None, data=None):
+    '''
+    (gray, width, height) of an image file, given its path or its contents
+    '''
+    if data is None:
+        FH = open(path, 'rb')
+        data = FH.read()
+        FH.close()
+    if data[:2] == 'P5':
+        return read_pgm(data)
+    try:
+        from PIL import Image
+    except ImportError:
+        import Image
+    from StringIO import StringIO
+    image = Image.open(StringIO(data)).convert('L')
+    width, height = image.size
+    gray = image.tobytes() if hasattr(image, 'tobytes') else image.tostring()
+    return gray, width, height
+
+class Decoder():
+    name = None
+
+    def decode(self, gray, width, height):
+        '''
+        Returns the data of every barcode in a Y800 buffer
+        '''
+        raise NotImplementedError()
+
+    def decode_file(self, path):
+        return self.decode(*gray_image(path))
+
+    def read(self, path):
+        '''
+        Same contract as gado.functions.read_barcode
+        '''
+        return '\n'.join(self.decode_file(path))
+
+    def close(self):
+        pass
+
+class ZbarLibrary(Decoder):
+    '''
+    libzbar through ctypes, one image scanner kept for every call
+    '''
+    name = 'library'
+
+    def __init__(self, path=None):
+        path = path or self._find()
+        if not path:
+            raise DecoderUnavailable('libzbar was not found')
+        try:
+            self.lib = lib = ctypes.CDLL(path)
+        except OSError, e:
+            raise DecoderUnavailable('libzbar could not be loaded: %s' % e)
+        lib.zbar_image_scanner_create.restype = ctypes.c_void_p
+        lib.zbar_image_scanner_set_config.argtypes = [ctypes.c_void_p, ctypes.c_int,
+                                                      ctypes.c_int, ctypes.c_int]
+        lib.zbar_image_scanner_destroy.argtypes = [ctypes.c_void_p]
+        lib.zbar_image_create.restype = ctypes.c_void_p
+        lib.zbar_image_destroy.argtypes = [ctypes.c_void_p]
+        lib.zbar_image_set_format.argtypes = [ctypes.c_void_p, ctypes.c_ulong]
+        lib.zbar_image_set_size.argtypes = [ctypes.c_void_p, ctypes.c_uint, ctypes.c_uint]
+        lib.zbar_image_set_data.argtypes = [ctypes.c_void_p, ctypes.c_char_p,
+                                            ctypes.c_ulong, ctypes.c_void_p]
+        lib.zbar_scan_image.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+        lib.zbar_image_first_symbol.restype = ctypes.c_void_p
+        lib.zbar_image_first_symbol.argtypes = [ctypes.c_void_p]
+        lib.zbar_symbol_next.restype = ctypes.c_void_p
+        lib.zbar_symbol_next.argtypes = [ctypes.c_void_p]
+        lib.zbar_symbol_get_data.restype = ctypes.c_char_p
+        lib.zbar_symbol_get_data.argtypes = [ctypes.c_void_p]
+
+        self._lock = Lock()
+        self.scanner = lib.zbar_image_scanner_create()
+        lib.zbar_image_scanner_set_config(self.scanner, 0, ZBAR_CFG_ENABLE, 1)
+
+    def _find(self):
+        bundled = os.path.join('lib', 'zbar', 'libzbar-0.dll')
+        if os.name == 'nt' and os.path.exists(bundled):
+            return os.path.abspath(bundled)
+        return ctypes.util.find_library('zbar')
+
+    def decode(self, gray, width, height):
+        lib = self.lib
+        with self._lock:
+            image = lib.zbar_image_create()
+            try:
+                lib.zbar_image_set_format(image, Y800)
+                lib.zbar_image_set_size(image, width, height)
+                # gray stays referenced until the image is destroyed
+                lib.zbar_image_set_data(image, gray, len(gray), None)
+                if lib.zbar_scan_image(self.scanner, image) <= 0:
+                    return []
+                found = []
+                symbol = lib.zbar_image_first_symbol(image)
+                while symbol:
+                    found.append(lib.zbar_symbol_get_data(symbol))
+                    symbol = lib.zbar_symbol_next(symbol)
+                return found
+            finally:
+                lib.zbar_image_destroy(image)
+
+    def close(self):
+        with self._lock:
+            if self.scanner:
+                self.lib.zbar_image_scanner_destroy(self.scanner)
+                self.scanner = None
+
+class ZbarWorker(Decoder):
+    '''
+    A long lived decoding process, started again if it dies
+    '''
+    name = 'worker'
+
+    def __init__(self, command, handshake_timeout=HANDSHAKE_TIMEOUT):
+        self.command = command
+        self.handshake_timeout = handshake_timeout
+        self.process = None
+        self._lock = Lock()
+        self._start()
+
+    def _start(self):
+        try:
+            self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE,
+                                            stdout=subprocess.PIPE)
+        except OSError, e:
+            raise DecoderUnavailable('The barcode worker could not be started: %s' % e)
+        #Pipes can't be waited on with a timeout on Windows, a thread reads
+        #the answer instead
+        answer = []
+        reader = Thread(target=lambda: answer.append(self.process.stdout.readline()),
+                        name='barcode-handshake')
+        reader.daemon = True
+        reader.start()
+        reader.join(self.handshake_timeout)
+        if reader.is_alive():
+            self._kill()
+            raise DecoderUnavailable('The barcode worker did not answer within %ss' %
+                                     self.handshake_timeout)
+        status = answer[0].strip()
+        if status != 'ready':
+            self.close()
+            raise DecoderUnavailable('The barcode worker failed: %s' % (status or 'no answer'))
+
+    def _kill(self):
+        try:
+            self.process.kill()
+        except OSError:
+            pass
+        self.process = None
+
+    def decode(self, gray, width, height):
+        with self._lock:
+            for attempt in (1, 2):
+                if self.process is None or self.process.poll() is not None:
+                    log.info('starting the barcode worker')
+                    self._start()
+                try:
+                    self.process.stdin.write(REQUEST.pack(width, height, len(gray)) + gray)
+                    self.process.stdin.flush()
+                    length = REPLY.unpack(self._read(REPLY.size))[0]
+                    text = self._read(length)
+                    return text.split('\n') if text else []
+                except (IOError, EOFError), e:
+                    log.warning('the barcode worker died: %s', e)
+                    self.close()
+            raise DecoderUnavailable('The barcode worker keeps dying')
+
+    def _read(self, size):
+        data = self.process.stdout.read(size)
+        if len(data) < size:
+            raise EOFError('short read from the barcode worker')
+        return data
+
+    def close(self):
+        if self.process is not None:
+            try:
+                self.process.stdin.close()
+                self.process.wait()
+            except (IOError, OSError):
+                pass
+            self.process = None
+
+class ZbarImg(Decoder):
+    '''
+    zbarimg for every image, what read_barcode always did
+    '''
+    name = 'zbarimg'
+
+    def __init__(self, command=None):
+        if command is None:
+            command = os.path.join('lib', 'zbar', 'zbarimg.exe') if os.name == 'nt' else 'zbarimg'
+        self.command = command
+
+    def decode_file(self, path):
+        # stderr is piped rather than inherited, which py2exe's stand-in
+        # for sys.stderr can't be
+        try:
+            proc = subprocess.Popen([self.command, '-q', path],
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError, e:
+            raise DecoderUnavailable('%s could not be run: %s' % (self.command, e))
+        output, errors = proc.communicate()
+        #zbarimg puts the symbology in front, QR-Code:project gado
+        return [line.split(':', 1)[-1] for line in output.splitlines()]
+
+    def decode(self, gray, width, height):
+        fd, path = tempfile.mkstemp(suffix='.pgm')
+        try:
+            os.write(fd, write_pgm(gray, width, height))
+            os.close(fd)
+            return self.decode_file(path)
+        finally:
+            os.remove(path)
+
+def _window_sum(a, size):
+    '''
+    The sum of every size x size window of a, centered on each element
+    '''
+    pad = size // 2
+    padded = numpy.zeros((a.shape[0] + size, a.shape[1] + size))
+    padded[pad + 1:pad + 1 + a.shape[0], pad + 1:pad + 1 + a.shape[1]] = a
+    integral = padded.cumsum(axis=0).cumsum(axis=1)
+    return (integral[size:, size:] - integral[:-size, size:]
+            - integral[size:, :-size] + integral[:-size, :-size])
+
+def _runs(indices):
+    '''
+    (first, last) of every run of consecutive indices
+    '''
+    if not len(indices):
+        return []
+    breaks = numpy.flatnonzero(numpy.diff(indices) > 1)
+    starts = indices[numpy.r_[0, breaks + 1]]
+    ends = indices[numpy.r_[breaks, len(indices) - 1]]
+    return zip(starts, ends)
+
+def find_regions(gray, width, height, scale=4, max_regions=4, closing=5, margin=8,
+                 max_width=640):
+    '''
+    Regions of a Y800 frame that may hold a barcode, as (x0, y0, x1, y1) at
+    full resolution, the largest first
+
+    A frame wider than max_width is first shrunk to about that width by
+    taking every step-th pixel (averaging would wash the bars out). The
+    gradient energy is summed up into a copy shrunk further by scale and
+    thresholded well above its mean, and a morphological closing joins the
+    bars of a barcode (or the modules of a QR code) into one blob. The
+    bounding boxes of the blobs come from the row and column projections
+    of the mask.
+    '''
+    image = numpy.frombuffer(gray, numpy.uint8, width * height).reshape(height, width)
+    step = max(1, width // max_width)
+    image = image[::step, ::step]
+    h, w = image.shape[0] // scale, image.shape[1] // scale
+    image = image[:h * scale, :w * scale].astype(numpy.int16)
+    scale_up = scale * step
+
+    # Bars are only a few pixels wide, so the edges are found before the
+    # energy is summed up per scale x scale cell
+    edges = numpy.zeros(image.shape, numpy.int16)
+    edges[:, 1:] += numpy.abs(image[:, 1:] - image[:, :-1])
+    edges[1:, :] += numpy.abs(image[1:, :] - image[:-1, :])
+    energy = edges.reshape(h, scale, w, scale).sum(axis=3).sum(axis=1) / float(scale * scale)
+    mask = energy > max(energy.mean() + 2 * energy.std(), MIN_EDGE_ENERGY)
+    if not mask.any():
+        return []
+
+    # Closing: dilate, then erode what the dilation added at the edges
+    window = closing * closing
+    mask = _window_sum(mask, closing) > 0
+    mask = _window_sum(mask, closing) >= window
+
+    regions = []
+    for r0, r1 in _runs(numpy.flatnonzero(mask.any(axis=1))):
+        band = mask[r0:r1 + 1]
+        for c0, c1 in _runs(numpy.flatnonzero(band.any(axis=0))):
+            if r1 - r0 < 2 or c1 - c0 < 2:
+                continue
+            area = band[:, c0:c1 + 1].sum()
+            regions.append((area, (max(0, c0 * scale_up - margin),
+                                   max(0, r0 * scale_up - margin),
+                                   min(width, (c1 + 2) * scale_up + margin),
+                                   min(height, (r1 + 2) * scale_up + margin))))
+    regions.sort(reverse=True)
+    return [region for area, region in regions[:max_regions]]
+
+class RegionDecoder(Decoder):
+    '''
+    Decodes the regions find_regions picks first, the whole frame when
+    none of them holds a barcode
+    '''
+    def __init__(self, decoder, scale=4, max_regions=4):
+        self.decoder = decoder
+        self.name = decoder.name
+        self.scale = scale
+        self.max_regions = max_regions
+        # How many frames were decoded by region and how many whole
+        self.regions = 0
+        self.whole = 0
+
+    def decode(self, gray, width, height):
+        regions = find_regions(gray, width, height, self.scale, self.max_regions)
+        image = numpy.frombuffer(gray, numpy.uint8, width * height).reshape(height, width)
+        for x0, y0, x1, y1 in regions:
+            crop = numpy.ascontiguousarray(image[y0:y1, x0:x1])
+            found = self.decoder.decode(crop.tostring(), x1 - x0, y1 - y0)
+            if found:
+                self.regions += 1
+                return found
+        #Missing the barcode at the end of the stack costs far more than
+        #decoding the frame whole
+        self.whole += 1
+        return self.decoder.decode(gray, width, height)
+
+    def decode_file(self, path):
+        try:
+            image = gray_image(path)
+        except ImportError:
+            # No PIL to read it with, zbarimg reads it itself
+            return self.decoder.decode_file(path)
+        return self.decode(*image)
+
+    def close(self):
+        self.decoder.close()
+
+BACKENDS = [ZbarLibrary, ZbarWorker, ZbarImg]
+
+def get_decoder(barcode_decoder='auto', barcode_worker=None, barcode_roi=1, **kwargs):
+    '''
+    The Decoder the barcode_decoder setting asks for, 'auto' for the
+    first of BACKENDS that can be used, decoding by region with
+    barcode_roi on and NumPy installed
+    '''
+    decoder = _backend(barcode_decoder, barcode_worker)
+    if int(barcode_roi) and numpy is not None:
+        return RegionDecoder(decoder)
+    return decoder
+
+def _backend(barcode_decoder, barcode_worker):
+    names = [backend.name for backend in BACKENDS]
+    if barcode_decoder != 'auto':
+        if barcode_decoder not in names:
+            raise ValueError('Unknown barcode decoder %r' % barcode_decoder)
+        names = [barcode_decoder]
+    for backend in BACKENDS:
+        if backend.name not in names:
+            continue
+        if backend is ZbarWorker and not barcode_worker and barcode_decoder == 'auto':
+            #Only started when it is set up, see above
+            continue
+        try:
+            if backend is ZbarWorker:
+                if not barcode_worker:
+                    raise DecoderUnavailable('no barcode_worker command is set')
+                if isinstance(barcode_worker, basestring):
+                    barcode_worker = barcode_worker.split()
+                return ZbarWorker(barcode_worker)
+            return backend()
+        except DecoderUnavailable, e:
+            log.warning('%s decoder unavailable: %s', backend.name, e)
+    # zbarimg is only found missing once the first image is read
+    return ZbarImg()
+
+def serve(backend=ZbarLibrary.name):
+    '''
+    The worker end of ZbarWorker, on stdin and stdout
+    '''
+    stdin, stdout = sys.stdin, sys.stdout
+    #Nothing but replies may end up on stdout
+    sys.stdout = sys.stderr
+    gado.log.configure(log_file='')
+    backends = dict((b.name, b) for b in BACKENDS if b is not ZbarWorker)
+    try:
+        decoder = backends[backend]()
+    except (KeyError, DecoderUnavailable), e:
+        stdout.write('error %s\n' % e)
+        stdout.flush()
+        return 1
+    stdout.write('ready\n')
+    stdout.flush()
+    while True:
+        header = stdin.read(REQUEST.size)
+        if len(header) < REQUEST.size:
+            return 0
+        width, height, length = REQUEST.unpack(header)
+        text = '\n'.join(decoder.decode(stdin.read(length), width, height))
+        stdout.write(REPLY.pack(len(text)) + text)
+        stdout.flush()
+
+if __name__ == '__main__':
+    if '--serve' in sys.argv:
+        args = [a for a in sys.argv[1:] if a != '--serve']
+        sys.exit(serve(*args[:1]))
+    for path in sys.argv[1:]:
+        print '%s: %s' % (path, get_decoder().decode_file(path))
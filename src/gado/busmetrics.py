@@ -0,0 +1,205 @@
+'''
+What the message queues are doing
+
+Every Mailbox reports to the BusMetrics of the process, bus():
+
+    latency    seconds from put to fetch, per queue and message type
+    depth      messages waiting on each queue, now and at the most
+    requeues   messages taken off a queue and put back (functions.requeue),
+               per queue and message type
+
+snapshot() returns all of that as a dict, which is what the BUS_METRICS
+request answers, during a scan job too.
+
+With start_trace() it also keeps a Chrome trace-event log: every message
+as an async event from put to fetch, the queue depths as counters,
+requeues as instants, and the scan loop's stages (see gado.metrics) as
+complete events on the thread that ran them. write_trace() saves it as
+JSON for chrome://tracing or https://ui.perfetto.dev. GadoSystem traces
+each scan job when 'bus_trace' is set to a path in the settings.
+'''
+import os, time, json
+from collections import deque
+from threading import Lock, current_thread
+import gado.messages as messages
+import gado.log
+
+log = gado.log.get('busmetrics')
+
+# Latencies kept per queue and message type for the percentiles
+LATENCY_SAMPLES = 1000
+# Trace events kept before the oldest are dropped
+MAX_TRACE_EVENTS = 500000
+
+# message number -> name, for the snapshot and the trace
+NAMES = dict((value, name) for name, value in vars(messages).items()
+             if name.isupper() and isinstance(value, (int, float)))
+
+def message_name(message):
+    return NAMES.get(message, str(message))
+
+def _percentile(ordered, percent):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100.0))]
+
+class BusMetrics():
+    def __init__(self):
+        self._lock = Lock()
+        # queue -> dict(depth, max_depth, put, taken, requeued)
+        self._queues = dict()
+        # (queue, message) -> dict(count, total, max, requeued) and the
+        # latest latencies
+        self._messages = dict()
+        self._latencies = dict()
+        self._trace = None
+        self._tids = dict()
+
+    def _queue(self, queue):
+        stats = self._queues.get(queue)
+        if stats is None:
+            stats = self._queues[queue] = dict(depth=0, max_depth=0, put=0, taken=0, requeued=0)
+        return stats
+
+    def _message(self, queue, message):
+        key = (queue, message)
+        stats = self._messages.get(key)
+        if stats is None:
+            stats = self._messages[key] = dict(count=0, total=0.0, max=0.0, requeued=0)
+            self._latencies[key] = deque(maxlen=LATENCY_SAMPLES)
+        return stats
+
+    def put(self, queue, message, depth):
+        '''
+        A message went on queue, which now holds depth of them
+        '''
+        with self._lock:
+            stats = self._queue(queue)
+            stats['put'] += 1
+            stats['depth'] = depth
+            stats['max_depth'] = max(stats['max_depth'], depth)
+            if self._trace is not None:
+                self._counter(queue, depth)
+
+    def taken(self, queue, message, sequence, put_time, depth):
+        '''
+        The message put on queue at put_time was fetched
+        '''
+        now = time.time()
+        latency = now - put_time
+        with self._lock:
+            queue_stats = self._queue(queue)
+            queue_stats['taken'] += 1
+            queue_stats['depth'] = depth
+            stats = self._message(queue, message)
+            stats['count'] += 1
+            stats['total'] += latency
+            stats['max'] = max(stats['max'], latency)
+            self._latencies[(queue, message)].append(latency)
+            if self._trace is not None:
+                name = message_name(message)
+                for phase, ts in (('b', put_time), ('e', now)):
+                    self._event(dict(name=name, cat=queue, ph=phase, id=sequence, ts=ts * 1e6))
+                self._counter(queue, depth)
+
+    def requeued(self, queue, message):
+        '''
+        A message taken off queue was put back on it
+        '''
+        with self._lock:
+            self._queue(queue)['requeued'] += 1
+            self._message(queue, message)['requeued'] += 1
+            if self._trace is not None:
+                self._event(dict(name='requeue %s' % message_name(message), ph='i', s='t',
+                                 ts=time.time() * 1e6, tid=self._tid(queue)))
+
+    def stage(self, name, started, seconds, artifact=None):
+        '''
+        A stage of the scan loop ran on this thread, only traced
+        '''
+        if self._trace is None:
+            return
+        with self._lock:
+            self._event(dict(name=name, cat='stage', ph='X', ts=started * 1e6, dur=seconds * 1e6,
+                             tid=self._tid(current_thread().name), args=dict(artifact=artifact)))
+
+    def snapshot(self):
+        '''
+        dict(queues={queue: stats}, messages={'queue MESSAGE': stats}), the
+        latencies in seconds
+        '''
+        with self._lock:
+            queues = dict((queue, dict(stats)) for queue, stats in self._queues.items())
+            result = dict()
+            for (queue, message), stats in self._messages.items():
+                stats = dict(stats)
+                ordered = sorted(self._latencies[(queue, message)])
+                if stats['count']:
+                    stats['mean'] = stats['total'] / stats['count']
+                if ordered:
+                    stats['p50'] = _percentile(ordered, 50)
+                    stats['p99'] = _percentile(ordered, 99)
+                result['%s %s' % (queue, message_name(message))] = stats
+        return dict(queues=queues, messages=result)
+
+    def reset(self):
+        with self._lock:
+            self._queues = dict()
+            self._messages = dict()
+            self._latencies = dict()
+
+    #################################################################################
+    #####                           TRACING                                     #####
+    #################################################################################
+
+    def start_trace(self):
+        with self._lock:
+            self._trace = deque(maxlen=MAX_TRACE_EVENTS)
+            self._tids = dict()
+
+    def tracing(self):
+        return self._trace is not None
+
+    def write_trace(self, path):
+        '''
+        Saves the events since start_trace() to path and stops tracing
+        '''
+        with self._lock:
+            events, self._trace = self._trace, None
+            tids, self._tids = self._tids, dict()
+        if events is None:
+            return
+        pid = os.getpid()
+        events = list(events)
+        for name, tid in tids.items():
+            events.append(dict(name='thread_name', ph='M', tid=tid, args=dict(name=name)))
+        for event in events:
+            event['pid'] = pid
+            event.setdefault('tid', 0)
+        FH = open(path, 'w')
+        json.dump(dict(traceEvents=events, displayTimeUnit='ms'), FH)
+        FH.close()
+        log.info('wrote %s trace events to %s', len(events), path)
+
+    def _tid(self, name):
+        if name not in self._tids:
+            self._tids[name] = len(self._tids) + 1
+        return self._tids[name]
+
+    def _counter(self, queue, depth):
+        self._event(dict(name='%s depth' % queue, ph='C', ts=time.time() * 1e6,
+                         args=dict(depth=depth)))
+
+    def _event(self, event):
+        self._trace.append(event)
+
+_bus = None
+_bus_lock = Lock()
+
+def bus():
+    '''
+    The BusMetrics of this process
+    '''
+    global _bus
+    with _bus_lock:
+        if _bus is None:
+            _bus = BusMetrics()
+        return _bus
@@ -1,5 +1,5 @@
 from lib.dal import DAL, Field
-import os
+import os, datetime
 
 class DBFactory():
     '''
@@ -51,6 +51,25 @@ class DBFactory():
             Field('front', 'boolean'), # is this a picture of the front?
             Field('name', 'string'))
         
+        # A scan job is one run of the scan loop over an in pile
+        db.define_table('scan_jobs',
+            Field('artifact_set', db.artifact_sets),
+            Field('started', 'datetime'),
+            Field('finished', 'datetime'),
+            Field('artifacts', 'integer'),
+            Field('pick_attempts', 'integer'), # lower and lifts at the in pile
+            Field('picks', 'integer')) # those that came up with an artifact
+        
+        # How long one stage of the scan loop took (see gado.metrics)
+        # seconds is the wall clock time, slept the part spent sleeping
+        db.define_table('stage_metrics',
+            Field('job', db.scan_jobs),
+            Field('artifact', 'integer'),
+            Field('stage', 'string'),
+            Field('started', 'double'),
+            Field('seconds', 'double'),
+            Field('slept', 'double'))
+        
         return db
 
 class DBInterface():
@@ -153,6 +172,26 @@ class DBInterface():
         self.db.commit()
         return i
         
+    def find_or_add_artifact_set(self, reference):
+        '''
+        Returns the id of the artifact set a separator sheet refers to
+        
+        reference is either the id of a set or a path of set names like
+        'Letters/1950s', the sets of which are added if they don't exist
+        '''
+        db = self.db
+        reference = str(reference).strip()
+        if reference.isdigit():
+            row = db(db.artifact_sets.id == int(reference)).select().first()
+            if row:
+                return row['id']
+        parent = None
+        for name in [n.strip() for n in reference.split('/') if n.strip()]:
+            row = db((db.artifact_sets.name == name) &
+                     (db.artifact_sets.parent == parent)).select().first()
+            parent = row['id'] if row else self.add_artifact_set(name, parent)
+        return parent
+    
     def delete_artifact_set(self, id):
         self.db(self.db.artifact_sets.id == id).delete()
         self.db.commit()
@@ -193,7 +232,7 @@ class DBInterface():
     
     def _set_incrementer(self, artifact_set):
         db = self.db
-        m = db.artifacts.artifact_set.max()
+        m = db.artifacts.set_incrementer.max()
         row = db(db.artifacts.artifact_set == artifact_set).select(m)
         if not row:
             return 1
@@ -217,4 +256,114 @@ class DBInterface():
         i = db.images.insert(artifact=artifact, path=path, front=front, name=name)
     
     def commit(self):
-        self.db.commit()
\ No newline at end of file
+        self.db.commit()
+    
+    def start_job(self, artifact_set):
+        i = self.db.scan_jobs.insert(artifact_set=artifact_set,
+                                     started=datetime.datetime.now(),
+                                     artifacts=0)
+        self.db.commit()
+        return i
+    
+    def finish_job(self, job, artifacts, pick_attempts=None, picks=None):
+        self.db(self.db.scan_jobs.id == job).update(finished=datetime.datetime.now(),
+                                                    artifacts=artifacts,
+                                                    pick_attempts=pick_attempts,
+                                                    picks=picks)
+        self.db.commit()
+    
+    def add_stage_metrics(self, job, samples):
+        '''
+        Stores samples, dictionaries with the stage, artifact, started,
+        seconds and slept of one stage each
+        '''
+        for sample in samples:
+            self.db.stage_metrics.insert(job=job, **sample)
+        self.db.commit()
+    
+    def recent_jobs(self, limit=10):
+        '''
+        Returns the ids of the latest scan jobs, newest first
+        '''
+        db = self.db
+        rows = db(db.scan_jobs.id > 0).select(db.scan_jobs.id,
+                                               orderby=~db.scan_jobs.id,
+                                               limitby=(0, limit))
+        return [row['id'] for row in rows]
+    
+    def stage_durations(self, job):
+        '''
+        Returns {stage: [seconds, ...]} for a job, in the order they ran
+        '''
+        db = self.db
+        rows = db(db.stage_metrics.job == job).select(db.stage_metrics.stage,
+                                                      db.stage_metrics.seconds,
+                                                      orderby=db.stage_metrics.started)
+        durations = dict()
+        for row in rows:
+            durations.setdefault(row['stage'], []).append(row['seconds'])
+        return durations
+    
+    def artifact_window(self, job):
+        '''
+        Returns (started, finished) of the artifacts of a job: from the first
+        pick up to the end of the last stage run for an artifact, None
+        without any
+        '''
+        db = self.db
+        rows = db((db.stage_metrics.job == job) &
+                  (db.stage_metrics.artifact != None)).select(db.stage_metrics.stage,
+                                                               db.stage_metrics.started,
+                                                               db.stage_metrics.seconds)
+        picks = [row['started'] for row in rows if row['stage'] == 'pick_up']
+        if not picks:
+            return None
+        return min(picks), max(row['started'] + row['seconds'] for row in rows)
+    
+    def job_summary(self, job):
+        '''
+        Returns a dictionary describing a scan job
+        
+        dictionary elements:
+            job, artifact_set, started, finished, artifacts, seconds,
+            artifacts_per_minute, slept, slowest_stage, stages,
+            pick_attempts, picks, pick_success_rate
+        
+        stages maps every stage to a dictionary of its count, total, mean,
+        max and slept seconds. slowest_stage is the stage with the most
+        time in total, slept the time spent in time.sleep over all stages.
+        pick_success_rate is picks / pick_attempts (None without attempts).
+        '''
+        db = self.db
+        row = db(db.scan_jobs.id == job).select().first()
+        if not row:
+            return None
+        
+        stages = dict()
+        for m in db(db.stage_metrics.job == job).select():
+            s = stages.setdefault(m['stage'], dict(count=0, total=0.0, max=0.0, slept=0.0))
+            s['count'] += 1
+            s['total'] += m['seconds']
+            s['max'] = max(s['max'], m['seconds'])
+            s['slept'] += m['slept'] or 0.0
+        for s in stages.values():
+            s['mean'] = s['total'] / s['count']
+        
+        finished = row['finished'] or datetime.datetime.now()
+        seconds = (finished - row['started']).total_seconds()
+        artifacts = row['artifacts'] or 0
+        slowest = max(stages, key=lambda k: stages[k]['total']) if stages else None
+        attempts = row['pick_attempts'] or 0
+        return dict(job=job,
+                    artifact_set=row['artifact_set'],
+                    started=row['started'],
+                    finished=row['finished'],
+                    artifacts=artifacts,
+                    seconds=seconds,
+                    artifacts_per_minute=(60.0 * artifacts / seconds) if seconds else 0.0,
+                    slept=sum(s['slept'] for s in stages.values()),
+                    slowest_stage=slowest,
+                    stages=stages,
+                    pick_attempts=attempts,
+                    picks=row['picks'] or 0,
+                    pick_success_rate=float(row['picks'] or 0) / attempts if attempts else None)
@@ -1,5 +1,8 @@
 from functions import gadodir
 import os
+import gado.log
+
+log = gado.log.get('default_settings')
 
 def default_settings():
     settings = dict()
@@ -22,6 +25,9 @@ def default_settings():
     settings['wizard_run']          = 0
     settings['temp_scanned_image']  = '%s/%s' % (gadodir(), 'scanned')
     settings['temp_webcam_image']   = '%s/%s' % (gadodir(), 'webcam')
+    settings['scan_journal']        = '%s/%s' % (gadodir(), 'scan_journal') # see gado.journal
+    settings['journal_sync_interval'] = 1.0 # seconds of journal a power cut may lose
+    settings['job_queue']           = '%s/%s' % (gadodir(), 'job_queue') # see gado.jobs
     
     settings['baudrate']            = 115200
     settings['arm_home_value']      = 0
@@ -34,6 +40,30 @@ def default_settings():
     
     settings['arm_time_overhead']   = 0.5
     settings['arm_degrees_per_s']   = 180.0/5.0
+    settings['telemetry_buffer_size'] = 256 # robot telemetry samples kept, see gado.telemetry
+    settings['telemetry_idle_interval'] = 1.0 # seconds between telemetry requests when nobody waits
+    settings['telemetry_log']       = None # file to record telemetry to, see gado.recorder
+    settings['serial_protocol']     = 'auto' # or 'framed'/'legacy', see gado.protocol
+    settings['heartbeat_timeout']   = 3.0 # seconds of silence before the robot counts as lost
+    settings['trajectory_planner']  = 0 # 1 overlaps arm and actuator moves, see gado.planner
+    settings['actuator_strokes_per_s'] = 120.0
+    settings['pump_sealed_current'] = 0 # pump current above which an artifact is on the cup, 0 (not measured yet) skips the check
+    settings['pick_retries']        = 2 # pick ups tried again when the cup comes up empty
+    
+    settings['webcam_stream']       = 1 # 1 keeps the webcam streaming, see gado.Webcam
+    settings['barcode_decoder']     = 'auto' # or 'library'/'worker'/'zbarimg', see gado.barcode
+    settings['barcode_worker']      = None # command of the barcode worker process, none is started without it
+    settings['barcode_roi']         = 1 # 1 decodes only the likely regions, see gado.barcode
+    
+    settings['simulated']           = 0 # 1 swaps the hardware for gado.simulator
+    settings['logic_process']       = 0 # 1 runs the GadoSystem in a child process, see gado.ipc
+    settings['bus_trace']           = None # trace file of every scan job, %s is the job, see gado.busmetrics
+    settings['log_level']           = 'info' # debug, info, warning or error, see gado.log
+    settings['log_levels']          = {} # levels of single modules, like {'Robot': 'debug'}
+    settings['log_file']            = None # None for gado.log in the Gado directory, '' for none
+    settings['log_max_bytes']       = 5 * 1024 * 1024 # size at which the log file is rotated
+    settings['log_backups']         = 3 # rotated log files kept
+    settings['log_console']         = 1 # 0 to only log to the file
     
     return settings
 
@@ -43,7 +73,7 @@ def dbpath():
     try:
         os.makedirs(p)
     except:
-        print 'functions\tUnable to create the databases path'
+        log.error('Unable to create the databases path')
     return p
 
 def imagespath():
@@ -52,5 +82,5 @@ def imagespath():
     try:
         os.makedirs(p)
     except:
-        print 'functions\tUnable to create the images path'
+        log.error('Unable to create the images path')
     return p
@@ -0,0 +1,204 @@
+'''
+One list of the webcams and scanners plugged in, kept between calls
+
+Webcam.options() used to open every VideoCapture Device just to read its
+name, and Scanner.connected() popped up WIA's device picker, every time
+they were called: from _sanity_checks on the LogicThread before each job
+and from the wizard. The DeviceRegistry enumerates each kind of device
+once, keeps the display names and the handles it opened, and only looks
+again when:
+
+    - refresh() is called (the REFRESH_DEVICES message)
+    - WIA reports a device being plugged in or pulled out
+    - a cached handle turns out to be dead (forget())
+
+WIA and VideoCapture handles are COM objects that belong to the
+apartment, the thread, that opened them, so each thread gets a registry()
+of its own. Webcams are only used from Webcam's CaptureThread, the
+scanner from the thread that connected to it (see Scanner.scanImage):
+
+
+    registry().webcams()             # [(0, 'Logitech ...')]
+    registry().webcam(name=...)      # an open VideoCapture Device
+    registry().scanners()            # [(device id, 'EPSON ...')]
+    registry().scanner(name=...)     # a connected WIA device
+'''
+from threading import RLock, local
+try:
+    import win32com.client
+    import pythoncom
+except ImportError:
+    # WIA is Windows only
+    win32com = pythoncom = None
+try:
+    from VideoCapture import Device
+except ImportError:
+    Device = None
+import gado.log
+
+log = gado.log.get('devices')
+
+DEVICE_MANAGER = "WIA.DeviceManager"
+WIA_EVENT_DEVICE_CONNECTED = "{A28BBADE-64B6-11D2-A231-00C04FA31809}"
+WIA_EVENT_DEVICE_DISCONNECTED = "{143E4E83-6497-11D2-A231-00C04FA31809}"
+# VideoCapture has no way of counting the webcams, this many are tried
+MAX_WEBCAMS = 2
+
+class _WiaEvents():
+    '''
+    Marks its registry stale when WIA sees a device come or go
+    '''
+    registry = None
+
+    def OnEvent(self, event_id, device_id, item_id):
+        log.info('WIA event %s for %s, enumerating again', event_id, device_id)
+        if self.registry is not None:
+            self.registry.stale = True
+
+class DeviceRegistry():
+    def __init__(self):
+        self._lock = RLock()
+        self._webcams = None
+        self._webcam_handles = dict()
+        self._scanners = None
+        self._scanner_handles = dict()
+        self.stale = False
+        self.enumerations = 0
+        self.manager = None
+        self._events = None
+        if pythoncom is not None:
+            # Every thread with COM handles needs its own apartment
+            pythoncom.CoInitialize()
+
+    def _device_manager(self):
+        if self.manager is None and win32com is not None:
+            self.manager = win32com.client.Dispatch(DEVICE_MANAGER)
+            try:
+                self._events = win32com.client.WithEvents(self.manager, _WiaEvents)
+                self._events.registry = self
+                for event in (WIA_EVENT_DEVICE_CONNECTED, WIA_EVENT_DEVICE_DISCONNECTED):
+                    self.manager.RegisterEvent(event, '*')
+            except Exception, e:
+                log.warning('no WIA device events, refresh by hand: %s', e)
+        return self.manager
+
+    def _check_stale(self):
+        if pythoncom is not None and self._events is not None:
+            # Lets the WIA events through on this thread
+            pythoncom.PumpWaitingMessages()
+        if self.stale:
+            self.refresh()
+
+    def refresh(self):
+        '''
+        Forgets what was enumerated, the next call looks again
+        '''
+        with self._lock:
+            self.stale = False
+            self._webcams = None
+            self._scanners = None
+            self._webcam_handles = dict()
+            self._scanner_handles = dict()
+
+    #################################################################################
+    #####                           WEBCAMS                                     #####
+    #################################################################################
+
+    def webcams(self):
+        '''
+        (device number, display name) of every webcam
+        '''
+        with self._lock:
+            self._check_stale()
+            if self._webcams is None:
+                self._webcams = []
+                self.enumerations += 1
+                for i in range(MAX_WEBCAMS):
+                    try:
+                        log.debug('opening webcam %s', i)
+                        device = self._webcam_handles.get(i) or Device(devnum=i)
+                        self._webcam_handles[i] = device
+                        self._webcams.append((i, device.getDisplayName()))
+                    except:
+                        pass
+                log.info('webcams: %s', self._webcams)
+            return list(self._webcams)
+
+    def webcam(self, name=None, number=None):
+        '''
+        The open Device of the webcam called name (or numbered number, or
+        the first one), None if there is no such webcam
+        '''
+        with self._lock:
+            for i, display_name in self.webcams():
+                if (name is None and number is None) or name == display_name or number == i:
+                    return self._webcam_handles[i]
+            return None
+
+    def forget_webcam(self, device):
+        '''
+        device stopped working, enumerate again next time
+        '''
+        with self._lock:
+            for i, handle in self._webcam_handles.items():
+                if handle is device:
+                    del self._webcam_handles[i]
+            self._webcams = None
+
+    #################################################################################
+    #####                           SCANNERS                                    #####
+    #################################################################################
+
+    def scanners(self):
+        '''
+        (WIA device id, name) of every scanner, without connecting to any
+        '''
+        with self._lock:
+            self._check_stale()
+            if self._scanners is None:
+                self._scanners = []
+                manager = self._device_manager()
+                if manager is None:
+                    return []
+                self.enumerations += 1
+                for info in manager.DeviceInfos:
+                    name = None
+                    for prop in info.Properties:
+                        if prop.Name == "Name":
+                            name = prop.Value
+                    self._scanners.append((info.DeviceID, name))
+                log.info('scanners: %s', self._scanners)
+            return list(self._scanners)
+
+    def scanner(self, name=None):
+        '''
+        The connected WIA device of the scanner called name (or the only
+        one there is), None if there is no such scanner
+        '''
+        with self._lock:
+            scanners = self.scanners()
+            for device_id, scanner_name in scanners:
+                if name == scanner_name or (name is None and len(scanners) == 1):
+                    if device_id not in self._scanner_handles:
+                        for info in self.manager.DeviceInfos:
+                            if info.DeviceID == device_id:
+                                self._scanner_handles[device_id] = info.Connect()
+                    return self._scanner_handles.get(device_id)
+            return None
+
+    def forget_scanner(self, device):
+        with self._lock:
+            for device_id, handle in self._scanner_handles.items():
+                if handle is device:
+                    del self._scanner_handles[device_id]
+            self._scanners = None
+
+_registries = local()
+
+def registry():
+    '''
+    The DeviceRegistry of the calling thread
+    '''
+    if getattr(_registries, 'registry', None) is None:
+        _registries.registry = DeviceRegistry()
+    return _registries.registry
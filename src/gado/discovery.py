@@ -0,0 +1,172 @@
+'''
+Finding the serial port the robot is on
+
+Trying every port in turn, each with its own open, settle and read
+timeouts, takes tens of seconds on a machine with a lot of COM or tty
+devices. discover() probes every candidate port at once and connects the
+robot on the first one that answers the handshake. The port that worked
+last time (gado_port) gets a head start, the others are only opened if
+it hasn't answered by then.
+
+Candidate ports come from the Win32 registry on Windows and from
+/dev/ttyUSB* and /dev/ttyACM* (the Arduino's USB serial) elsewhere.
+'''
+import glob, itertools, sys, time
+from threading import Thread, Event, Lock
+try:
+    import _winreg
+except ImportError:
+    _winreg = None
+try:
+    import serial
+except ImportError:
+    serial = None
+from gado.Robot import HANDSHAKE, HANDSHAKE_VALUE
+import gado.log
+
+log = gado.log.get('discovery')
+
+# An Arduino resets when its port is opened, this is how long the board
+# gets to come back and answer the handshake
+PROBE_TIMEOUT = 3.0
+# How often the handshake is repeated while waiting for an answer
+HANDSHAKE_INTERVAL = 0.2
+# Seconds the cached port has to itself
+CACHED_HEAD_START = 1.0
+
+POSIX_PATTERNS = ['/dev/ttyUSB*', '/dev/ttyACM*',
+                  '/dev/tty.usbmodem*', '/dev/tty.usbserial*']
+
+def enumerate_serial_ports():
+    """
+    Uses the Win32 registry to return an
+    iterator of serial (COM) ports
+    existing on this computer.
+    """
+    if _winreg is None:
+        return
+    path = 'HARDWARE\\DEVICEMAP\\SERIALCOMM'
+    try:
+        key = _winreg.OpenKey(_winreg.HKEY_LOCAL_MACHINE, path)
+    except WindowsError:
+        return
+
+    for i in itertools.count():
+        try:
+            val = _winreg.EnumValue(key, i)
+            yield str(val[1])
+        except EnvironmentError:
+            break
+
+def candidate_ports():
+    '''
+    Every port the robot could be on
+    '''
+    if sys.platform.startswith('win'):
+        ports = list(enumerate_serial_ports())
+    else:
+        ports = []
+        for pattern in POSIX_PATTERNS:
+            ports.extend(sorted(glob.glob(pattern)))
+    return ports
+
+def probe(port, baudrate=115200, timeout=PROBE_TIMEOUT, cancelled=None):
+    '''
+    Opens port and sends the handshake until the robot answers
+
+    Returns the open serial connection if it did, otherwise None. Gives
+    up after timeout seconds or once the cancelled Event is set.
+    '''
+    try:
+        connection = serial.Serial(port, baudrate, timeout=0.05)
+    except Exception:
+        return None
+
+    deadline = time.time() + timeout
+    response = ''
+    try:
+        connection.flushInput()
+        while time.time() < deadline:
+            if cancelled is not None and cancelled.is_set():
+                break
+            connection.write(HANDSHAKE)
+            asked = time.time()
+            while time.time() - asked < HANDSHAKE_INTERVAL:
+                response += connection.read(connection.inWaiting() or 1)
+                if HANDSHAKE_VALUE in response:
+                    return connection
+            # Don't keep a whole boot message around
+            response = response[-len(HANDSHAKE_VALUE):]
+    except Exception:
+        pass
+    connection.close()
+    return None
+
+def probe_all(ports, baudrate=115200, timeout=PROBE_TIMEOUT, delays=None):
+    '''
+    Probes all ports at the same time
+
+    delays maps ports to the seconds to wait before probing them.
+    Returns (port, connection) of the first one that answers, or
+    (None, None). Connections to the other ports are closed.
+    '''
+    found = Event()
+    lock = Lock()
+    result = dict(port=None, connection=None)
+    delays = delays or dict()
+
+    def run(port):
+        if found.wait(delays.get(port, 0)):
+            return
+        connection = probe(port, baudrate, timeout, cancelled=found)
+        if connection is None:
+            return
+        with lock:
+            if result['connection'] is None:
+                result.update(port=port, connection=connection)
+                found.set()
+                return
+        # Somebody else got there first
+        connection.close()
+
+    threads = [Thread(target=run, args=(port,), name='probe-%s' % port)
+               for port in ports]
+    for t in threads:
+        t.daemon = True
+        t.start()
+    for t in threads:
+        t.join(timeout + max(delays.values() + [0]) + 1)
+    return result['port'], result['connection']
+
+def discover(robot, cached_port=None, ports=None):
+    '''
+    Connects robot to the first port it answers on, cached_port first
+
+    Returns (port, seconds it took), port is None if the robot wasn't found.
+    A robot that is already connected keeps its port, which isn't probed
+    again: a COM port can't be opened twice and a second handle on a tty
+    would take bytes from the robot's SerialReader.
+    '''
+    started = time.time()
+    if robot.connected():
+        port = getattr(robot.serialConnection, 'port', None) or cached_port
+        log.info('robot already connected on %s, not probing', port)
+        return port, 0.0
+    if ports is None:
+        ports = candidate_ports()
+
+    delays = dict()
+    if cached_port:
+        delays = dict((p, CACHED_HEAD_START) for p in ports if p != cached_port)
+        ports = [cached_port] + [p for p in ports if p != cached_port]
+    log.info('probing %s ports: %s', len(ports), ', '.join(ports))
+    port, connection = probe_all(ports, robot.baudrate, delays=delays)
+
+    seconds = time.time() - started
+    if port is None:
+        log.warning('no robot found after %.2fs', seconds)
+        return None, seconds
+    robot.attach(connection)
+    seconds = time.time() - started
+    log.info('connected to the robot on %s in %.2fs', port, seconds)
+    return port, seconds
@@ -0,0 +1,296 @@
+'''
+A small single threaded event loop
+
+Everything the scan loop does with a device blocks a thread until the
+device is done. EventLoop lets one thread wait on several of them instead:
+file descriptors are watched with select(), timers kept in a heap, and
+operations return a Future that is done once the device is.
+
+Coroutines are generators that yield Futures (or lists of them, which are
+waited on together) and get the results back; raise Return(value) to
+finish with a value:
+
+    def scan_one(arm, scanner, loop):
+        yield arm.pick_up()
+        yield arm.place_on_scanner()
+        image, _ = yield [loop.call_blocking(scanner.scanImage, 150, path),
+                          loop.sleep(0.5)]
+        yield arm.drop_on_out_pile()
+        raise Return(image)
+
+    loop.run_until_complete(loop.spawn(scan_one(arm, scanner, loop)))
+
+Libraries that can only block (the scanner and webcam drivers) are run
+with call_blocking, which runs them on a thread of their own and resolves
+the Future on the loop's thread.
+
+Other threads wake the loop up through a connected pair of sockets, as
+select() only takes sockets on Windows. For the same reason add_reader
+only takes sockets there (SELECTS_FILES is False); anything else, like
+the serial port, is polled on a timer (see AsyncRobot).
+'''
+import sys, time, heapq, select, socket, errno
+from collections import deque
+from threading import Thread, Lock, Event
+
+# Whether select() takes file descriptors other than sockets
+SELECTS_FILES = sys.platform != 'win32'
+
+def _socketpair():
+    '''
+    Two connected sockets, socket.socketpair() where there is one
+    '''
+    if hasattr(socket, 'socketpair'):
+        return socket.socketpair()
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+        writer = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        writer.connect(listener.getsockname())
+        reader, address = listener.accept()
+    finally:
+        listener.close()
+    return reader, writer
+
+class CancelledError(Exception):
+    pass
+
+class Return(Exception):
+    '''
+    Raised by a coroutine to finish with value
+    '''
+    def __init__(self, value=None):
+        Exception.__init__(self, value)
+        self.value = value
+
+class Future():
+    '''
+    The result of an operation that hasn't finished yet
+    '''
+    def __init__(self):
+        self._done = Event()
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+
+    def done(self):
+        return self._done.is_set()
+
+    def set_result(self, result):
+        if self.done():
+            return
+        self._result = result
+        self._finish()
+
+    def set_exception(self, exception, traceback=None):
+        if self.done():
+            return
+        self._exc_info = (type(exception), exception, traceback)
+        self._finish()
+
+    def cancel(self):
+        self.set_exception(CancelledError())
+
+    def _finish(self):
+        self._done.set()
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+    def add_done_callback(self, callback):
+        if self.done():
+            callback(self)
+        else:
+            self._callbacks.append(callback)
+
+    def exception(self):
+        return self._exc_info[1] if self._exc_info else None
+
+    def result(self, timeout=None):
+        '''
+        The result, raising what the operation raised
+
+        Blocks for up to timeout seconds, so only call it with a timeout
+        from outside the loop's thread.
+        '''
+        if not self._done.wait(timeout):
+            raise Exception('The operation has not finished')
+        if self._exc_info:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+def gather(futures):
+    '''
+    A Future of the results of all futures, in order
+    '''
+    gathered = Future()
+    futures = list(futures)
+    results = [None] * len(futures)
+    remaining = [len(futures)]
+    if not futures:
+        gathered.set_result(results)
+
+    def collect(i, future):
+        if future.exception() is not None:
+            gathered.set_exception(future.exception(), future._exc_info[2])
+            return
+        results[i] = future._result
+        remaining[0] -= 1
+        if not remaining[0]:
+            gathered.set_result(results)
+
+    for i, future in enumerate(futures):
+        future.add_done_callback(lambda f, i=i: collect(i, f))
+    return gathered
+
+class EventLoop():
+    def __init__(self):
+        self._ready = deque()
+        self._timers = []
+        self._sequence = 0
+        self._readers = dict()
+        self._lock = Lock()
+        # Written to by other threads to wake select() up
+        self._wakeup_read, self._wakeup_write = _socketpair()
+        self._wakeup_read.setblocking(False)
+        self._wakeup_write.setblocking(False)
+
+    def call_soon(self, callback, *args):
+        self._ready.append((callback, args))
+
+    def call_soon_threadsafe(self, callback, *args):
+        with self._lock:
+            self._ready.append((callback, args))
+        try:
+            self._wakeup_write.send('x')
+        except socket.error, e:
+            #A full buffer will wake the loop up just the same
+            if e.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+
+    def call_later(self, delay, callback, *args):
+        '''
+        Returns a handle for cancel_timer
+        '''
+        self._sequence += 1
+        timer = [time.time() + delay, self._sequence, callback, args]
+        heapq.heappush(self._timers, timer)
+        return timer
+
+    def cancel_timer(self, timer):
+        timer[2] = None
+
+    def add_reader(self, fd, callback):
+        '''
+        Calls callback whenever fd (a file descriptor) can be read, only
+        sockets unless SELECTS_FILES
+        '''
+        self._readers[fd] = callback
+
+    def remove_reader(self, fd):
+        self._readers.pop(fd, None)
+
+    def sleep(self, seconds, result=None):
+        future = Future()
+        self.call_later(seconds, future.set_result, result)
+        return future
+
+    def call_blocking(self, function, *args, **kwargs):
+        '''
+        Runs function on a thread of its own, returns a Future of its result
+        '''
+        future = Future()
+        def run():
+            try:
+                result = function(*args, **kwargs)
+            except:
+                exc_info = sys.exc_info()
+                self.call_soon_threadsafe(future.set_exception, exc_info[1], exc_info[2])
+            else:
+                self.call_soon_threadsafe(future.set_result, result)
+        thread = Thread(target=run, name='blocking-%s' % getattr(function, '__name__', 'call'))
+        thread.daemon = True
+        thread.start()
+        return future
+
+    def spawn(self, coroutine):
+        '''
+        Starts running a coroutine, returns a Future of its Return value
+        '''
+        future = Future()
+        self.call_soon(self._step, coroutine, future, None, None)
+        return future
+
+    def _step(self, coroutine, future, value, exc_info):
+        try:
+            if exc_info:
+                yielded = coroutine.throw(*exc_info)
+            else:
+                yielded = coroutine.send(value)
+        except StopIteration:
+            future.set_result(None)
+            return
+        except Return, r:
+            future.set_result(r.value)
+            return
+        except:
+            exc_info = sys.exc_info()
+            future.set_exception(exc_info[1], exc_info[2])
+            return
+
+        if isinstance(yielded, list):
+            yielded = gather(yielded)
+        if yielded is None:
+            self.call_soon(self._step, coroutine, future, None, None)
+        else:
+            yielded.add_done_callback(lambda f: self.call_soon(
+                self._step, coroutine, future, f._result, f._exc_info))
+
+    def run_until_complete(self, future):
+        '''
+        Runs the loop until future is done and returns its result
+        '''
+        if not isinstance(future, Future):
+            future = self.spawn(future)
+        while not future.done():
+            self.run_once()
+        return future.result()
+
+    def run_once(self, max_wait=1.0):
+        timeout = 0 if self._ready else max_wait
+        while self._timers and self._timers[0][2] is None:
+            heapq.heappop(self._timers)
+        if self._timers and not self._ready:
+            timeout = max(0, min(timeout, self._timers[0][0] - time.time()))
+
+        fds = list(self._readers) + [self._wakeup_read]
+        readable, _, _ = select.select(fds, [], [], timeout)
+        for fd in readable:
+            if fd is self._wakeup_read:
+                self._drain_wakeup()
+            elif fd in self._readers:
+                self._readers[fd]()
+
+        now = time.time()
+        while self._timers and self._timers[0][0] <= now:
+            when, sequence, callback, args = heapq.heappop(self._timers)
+            if callback is not None:
+                self._ready.append((callback, args))
+
+        with self._lock:
+            ready, self._ready = self._ready, deque()
+        for callback, args in ready:
+            callback(*args)
+
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup_read.recv(4096):
+                pass
+        except socket.error, e:
+            if e.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+
+    def close(self):
+        self._wakeup_read.close()
+        self._wakeup_write.close()
@@ -1,20 +1,50 @@
-import json, os, datetime, time, sys
-from subprocess import Popen, PIPE
+import json, os, datetime, time, sys, Queue
 from gado.db import DBInterface
+from gado.barcode import ZbarImg
+from gado.busmetrics import bus
+import gado.log
+
+log = gado.log.get('functions')
 
 def fetch_from_queue(q, message=None, timeout=None):
+    '''
+    Takes the next message (of type message, or of one of the types if it
+    is a tuple) off q, returns None if none came within timeout seconds
+    
+    q is a gado.mailbox.Mailbox, or a Queue, which is spun through
+    '''
+    if hasattr(q, 'receive'):
+        return q.receive(message, timeout)
+    deadline = None if timeout is None else time.time() + timeout
     while True:
-        msg = q.get()
-        if (message and msg[0] == message) or (not message):
+        try:
+            msg = q.get(timeout=None if deadline is None else max(0, deadline - time.time()))
+        except Queue.Empty:
+            return None
+        if not message or msg[0] == message or \
+                (isinstance(message, tuple) and msg[0] in message):
             return msg
         else:
-            q.put(msg)
+            requeue(q, msg)
+            if deadline is not None and time.time() >= deadline:
+                return None
 
 def add_to_queue(q, message, arguments=None):
-    print 'functions\tadding to queue:', message, arguments
+    log.debug('adding to queue: %s %s', message, arguments)
     q.put((message, arguments))
 
+def requeue(q, msg):
+    '''
+    Puts msg, taken off q, back on it for somebody else
+    '''
+    bus().requeued(getattr(q, 'name', 'queue'), msg[0])
+    q.put(msg)
+
 def gadodir():
+    # Lets the simulator and benchmarks keep their settings and databases
+    # away from the real ones
+    if os.environ.get('GADO_HOME'):
+        return os.environ['GADO_HOME']
     n = os.name
     if n == 'nt':
         return os.path.join(os.environ['APPDATA'], 'Gado')
@@ -127,14 +157,14 @@ def _image_paths(dbi, artifact_id, artifact_set, incrementer, image_path='',
     if image_front_delim == '/':
         path = '%s/%s/' % (image_path, image_front_delim.join(p_names))
         try: os.makedirs(path)
-        except: print 'functions\tpath already exists: "%s"' % path
+        except: log.debug('path already exists: "%s"', path)
         front_path = '%s%s%s%s.%s' % (path, image_front_prefix, fn,
                                       image_front_postfix,
                                       image_front_filetype)
     else:
         path = '%s/' % (image_path)
         try: os.makedirs(path)
-        except: print 'functions\tpath already exists: "%s"' % path
+        except: log.debug('path already exists: "%s"', path)
         join = image_front_delim.join(p_names)
         front_path = '%s%s%s%s%s.%s' % (path, image_front_prefix, join,
                                         fn, image_front_postfix,
@@ -148,14 +178,14 @@ def _image_paths(dbi, artifact_id, artifact_set, incrementer, image_path='',
     if image_back_delim == '/':
         path = '%s/%s/' % (image_path, image_back_delim.join(p_names))
         try: os.makedirs(path)
-        except: print 'functions\tpath already exists: "%s"' % path
+        except: log.debug('path already exists: "%s"', path)
         back_path = '%s%s%s%s.%s' % (path, image_back_prefix, fn,
                                       image_back_postfix,
                                       image_back_filetype)
     else:
         path = '%s/' % (image_path)
         try: os.makedirs(path)
-        except: print 'functions\tpath already exists: "%s"' % path
+        except: log.debug('path already exists: "%s"', path)
         join = image_back_delim.join(p_names)
         back_path = '%s%s%s%s%s.%s' % (path, image_back_prefix, join,
                                         fn, image_back_postfix,
@@ -165,22 +195,32 @@ def _image_paths(dbi, artifact_id, artifact_set, incrementer, image_path='',
     return (front_path, back_path)
 
 
+# A separator sheet in the in pile that switches the artifact set
+# carries a barcode of this prefix and the set's id or path, e.g.
+# 'gado set:Letters/1950s' (see DBInterface.find_or_add_artifact_set)
+SET_BARCODE_PREFIX = 'gado set:'
+
+def set_barcode(text):
+    '''
+    The set reference of a separator sheet's barcode text, or None
+    '''
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith(SET_BARCODE_PREFIX):
+            return line[len(SET_BARCODE_PREFIX):].strip()
+    return None
+
+def read_barcode(image_path):
+    '''
+    Returns the text of the barcodes within image_path, one per line, or ''
+    
+    This runs zbarimg every time, GadoSystem uses a gado.barcode decoder
+    '''
+    output = ZbarImg().read(image_path)
+    log.debug('read_barcode received: %s', output)
+    return output
+
 def check_for_barcode(image_path, code='project gado'):
-    args = ['lib\zbar\zbarimg.exe', '-q', image_path]
-    cmd = ' '.join(args)
-    print "CMD: %s" % (cmd)
-    #Test code to make this runnable with py2exe
-    if hasattr(sys.stderr, 'fileno'):
-        procStdErr = sys.stderr
-    elif hasattr(sys.stderr, '_file') and hasattr(sys.stderr._file, 'fileno'):
-        proceStdErr = sys.stderr._file
-    else:
-        procStdErrPath = 'nul'
-        procStdErr = file(procStdErrPath, 'a')
-    
-    proc = Popen(cmd, stdout=PIPE, stderr=procStdErr, shell=True)
-    output, errors = proc.communicate()
-    output = str(output)
-    print 'functions\tcheck_for_barcode received: %s' % output
-    print "barcode was %sfound" % ('' if output.find(code) >= 0 else 'not ')
+    output = read_barcode(image_path)
+    log.debug("barcode was %sfound", '' if output.find(code) >= 0 else 'not ')
     return (len(output) > 0) and (output.find(code) >= 0)
\ No newline at end of file
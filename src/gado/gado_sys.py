@@ -3,25 +3,34 @@ import thread
 import subprocess
 import re
 import platform
-import _winreg
-import itertools
 from threading import Thread
-import serial
 from gado.functions import *
 import time, os
-from gado.pytesser import *
 from gado.Webcam import *
 import Queue
 from gado.gui.ProgressBar import *
-from gado.GadoGui import GadoGui
 from gado.Scanner import Scanner
 from gado.Webcam import Webcam
 import gado.messages as messages
 from gado.db import DBFactory, DBInterface
+from gado.discovery import discover
+from gado.metrics import StageMetrics
+import gado.metrics as metrics
+from gado.journal import ScanJournal
+import gado.journal as journal
+from gado.jobs import JobQueue
+from gado.barcode import get_decoder
+from gado.devices import registry
+from gado.busmetrics import bus
+import gado.jobs as jobs
+import gado.rpc as rpc
 from shutil import move
+import gado.log
 from default_settings import default_settings
 import datetime
 
+log = gado.log.get('gado_sys')
+
 class AutoConnectThread(Thread):
     def __init__(self, gado_sys, progressBar):
         self.gado_sys = gado_sys
@@ -33,7 +42,7 @@ class AutoConnectThread(Thread):
         self.connected = self.gado_sys.connect()
         
         #Stop the progress bar window
-        print "calling stop"
+        log.debug("calling stop")
         self.progressBar.stop(self.connected)
 
 class GadoSystem():
@@ -57,9 +66,27 @@ class GadoSystem():
         
         self.db = DBFactory(**self.s).get_db()
         self.dbi = DBInterface(self.db)
+        #What mainloop does with each message
+        self.handlers = self._handlers()
         
         self.selected_set = None
         self.started = False
+        self.metrics = StageMetrics()
+        self.last_job = None
+        self.connect_seconds = None
+        self.last_artifact = False
+        
+        #The in piles waiting to be scanned, see gado.jobs
+        self.jobs = JobQueue(self.s.get('job_queue') or
+                             os.path.join(gadodir(), 'job_queue'))
+        
+        #Where the artifacts of a crashed scan job were, see gado.journal
+        self.journal = ScanJournal(self.s.get('scan_journal') or
+                                   os.path.join(gadodir(), 'scan_journal'),
+                                   float(self.s.get('journal_sync_interval', 1.0)))
+        if recovered and self.journal.interrupted() is not None:
+            add_to_queue(self.q_out, messages.DISPLAY_INFO,
+                'A scan job was interrupted. Press start to finish the artifacts that were on their way through the robot and carry on.')
     
     def load_settings(self):
         s = import_settings()
@@ -68,168 +95,166 @@ class GadoSystem():
                     s['image_front_filetype'].strip('.'))
             s['webcam_image'] = '%s.%s' % (s['temp_webcam_image'],
                     s['image_back_filetype'].strip('.'))
-        
+            gado.log.configure(**s)
+
         self.s = s
     
     def load(self):
         self.load_settings()
         
-        self.scanner = Scanner(**self.s)
-        self.robot = Robot(**self.s)
-        self.camera = Webcam(**self.s)
+        if int(self.s.get('simulated', 0)):
+            # No hardware needed, see gado.simulator
+            import gado.simulator as simulator
+            self.robot, self.scanner, self.camera = simulator.devices(**self.s)
+            self.barcode_decoder = None
+            self.barcode_reader = self.camera.read_barcode
+        else:
+            self.scanner = Scanner(**self.s)
+            self.robot = Robot(**self.s)
+            self.camera = Webcam(**self.s)
+            self.barcode_decoder = get_decoder(**self.s)
+            self.barcode_reader = self.barcode_decoder.read
+        self.robot.add_connection_listener(self._robot_connection_changed)
+    
+    def _robot_connection_changed(self, alive):
+        # Called on the heartbeat's thread
+        add_to_queue(self.q_out, messages.ROBOT_CONNECTION_CHANGED, alive)
+    
+    def _handlers(self):
+        '''
+        The method mainloop calls for each message, with the message's
+        argument. What it returns goes back in the RETURN of a request sent
+        with gado.rpc.
+        '''
+        return {
+            messages.ADD_ARTIFACT_SET_LIST: lambda argument: self.dbi.add_artifact_set(**argument),
+            messages.ARTIFACT_SET_LIST: lambda argument: self.dbi.artifact_set_list(),
+            messages.DELETE_ARTIFACT_SET_LIST: self.dbi.delete_artifact_set,
+            messages.WEIGHTED_ARTIFACT_SET_LIST: self._weighted_artifact_set_list,
+            messages.JOB_SUMMARY: self._job_summary,
+            messages.BUS_METRICS: lambda argument: bus().snapshot(),
+            messages.DROP: lambda argument: self.robot.dropActuator(),
+            messages.LIFT: lambda argument: self.robot.lift(),
+            messages.MOVE_DOWN: lambda argument: self.robot.move_actuator(up=False),
+            messages.MOVE_UP: lambda argument: self.robot.move_actuator(up=True),
+            messages.MOVE_LEFT: lambda argument: self.robot.move_arm(clockwise=False),
+            messages.MOVE_RIGHT: lambda argument: self.robot.move_arm(clockwise=True),
+            messages.RELOAD_SETTINGS: self._reload_settings,
+            messages.RESET: lambda argument: self.robot.reset(),
+            messages.ROBOT_CONNECT: self._robot_connect,
+            messages.SCANNER_CONNECT: self._scanner_connect,
+            messages.SCANNER_LISTING: lambda argument: [name for device_id, name in registry().scanners()],
+            messages.REFRESH_DEVICES: self._refresh_devices,
+            messages.SCANNER_PICTURE: self._scanner_picture,
+            messages.SET_SELECTED_ARTIFACT_SET: self._set_selected_artifact_set,
+            messages.START: lambda argument: self.start(),
+            messages.WEBCAM_LISTING: self._webcam_listing,
+            messages.WEBCAM_CONNECT: self._webcam_connect,
+            messages.WEBCAM_PICTURE: self._webcam_picture,
+            # These commands are only relevant if the robot is already running.
+            messages.STOP: lambda argument: None,
+            messages.LAST_ARTIFACT: lambda argument: None,
+            messages.GIVE_ME_A_ROBOT: lambda argument: self.robot,
+            messages.ENQUEUE_JOB: self._enqueue_job,
+            messages.REORDER_JOB: lambda argument: self.jobs.reorder(*argument),
+            messages.CANCEL_JOB: lambda argument: self.jobs.cancel(argument),
+            messages.JOB_QUEUE: lambda argument: self.jobs.describe(),
+            messages.CLEAR_FINISHED_JOBS: lambda argument: self.jobs.clear_finished(),
+        }
     
     def mainloop(self):
-        dbi = self.dbi
-        q = self.q_out
-        robot = self.robot
-        
         #add_to_queue(q, messages.READY)
         
+        #Only what is handled here, anything else is left for whoever waits for it
+        handled = tuple(self.handlers) + (messages.MAIN_ABANDON_SHIP,)
         while True:
-            expecting_return = False
+            msg = fetch_from_queue(self.q_in, handled)
+            log.debug('fetched message from queue %s', msg)
+            if msg[0] == messages.MAIN_ABANDON_SHIP:
+                add_to_queue(self.q_out, messages.GUI_LISTENER_DIE)
+                add_to_queue(self.q_in, messages.MAIN_ABANDON_SHIP)
+                return
+            handler = self.handlers[msg[0]]
             try:
-                msg = fetch_from_queue(self.q_in)
-                if msg:
-                    print "gado_sys\t" + str(datetime.datetime.now()), "fetched message from queue", msg
-                if msg[0] == messages.ADD_ARTIFACT_SET_LIST:
-                    expecting_return = False
-                    i = dbi.add_artifact_set(**msg[1])
-                    #add_to_queue(q, messages.RETURN, i)
-                
-                elif msg[0] == messages.ARTIFACT_SET_LIST:
-                    expecting_return = True
-                    i = dbi.artifact_set_list()
-                    add_to_queue(q, messages.RETURN, i)
-                
-                elif msg[0] == messages.DELETE_ARTIFACT_SET_LIST:
-                    expecting_return = False
-                    dbi.delete_artifact_set(msg[1])
-                
-                elif msg[0] == messages.DROP:
-                    expecting_return = False
-                    success = robot.dropActuator()
-                    add_to_queue(q, messages.RETURN, success)
-                
-                elif msg[0] == messages.LIFT:
-                    expecting_return = False
-                    robot.lift()
-                    
-                elif msg[0] == messages.MOVE_DOWN:
-                    expecting_return = True
-                    stroke = self.robot.move_actuator(up = False)
-                    add_to_queue(q, messages.RETURN, stroke)
-                    
-                elif msg[0] == messages.MOVE_UP:
-                    expecting_return = True
-                    stroke = self.robot.move_actuator(up = True)
-                    add_to_queue(q, messages.RETURN, stroke)
-                    
-                elif msg[0] == messages.MOVE_LEFT:
-                    expecting_return = True
-                    degree = self.robot.move_arm(clockwise=False)
-                    add_to_queue(q, messages.RETURN, degree)
-                
-                elif msg[0] == messages.MOVE_RIGHT:
-                    expecting_return = True
-                    degree = self.robot.move_arm(clockwise=True)
-                    add_to_queue(q, messages.RETURN, degree)
-                
-                elif msg[0] == messages.RELOAD_SETTINGS:
-                    expecting_return = False
-                    settings = import_settings()
-                    self.s = settings
-                    self.robot.updateSettings(**settings)
-                    del self.camera
-                    self.camera = Webcam(**settings)
-                    del self.scanner
-                    self.scanner = Scanner(**settings)
-                    self._load_settings(**settings)
-                
-                elif msg[0] == messages.RESET:
-                    expecting_return = False
-                    self.robot.reset()
-                
-                elif msg[0] == messages.ROBOT_CONNECT:
-                    expecting_return = True
-                    success = self.connect()
-                    add_to_queue(q, messages.RETURN, robot.connected())
-                
-                elif msg[0] == messages.SCANNER_CONNECT:
-                    expecting_return = True
-                    try: del self.scanner
-                    except: pass
-                    self.scanner = Scanner(**import_settings())
-                    add_to_queue(q, messages.RETURN, self.scanner.connected())
-                
-                elif msg[0] == messages.SCANNER_PICTURE:
-                    expecting_return = True
-                    self.scanner.scanImage(DEFAULT_SCANNED_IMAGE)
-                    add_to_queue(q, messages.RETURN, DEFAULT_SCANNED_IMAGE)
-
-                elif msg[0] == messages.SET_SELECTED_ARTIFACT_SET:
-                    expecting_return = True
-                    self.selected_set = msg[1]
-
-                elif msg[0] == messages.START:
-                    expecting_return = False
-                    self.start()
-                
-                elif msg[0] == messages.WEBCAM_LISTING:
-                    print 'gado_sys\tWEBCAM_LISTING'
-                    expecting_return = True
-                    #self.camera = Webcam()
-                    opts = self.camera.options()
-                    print 'gado_sys\tWEBCAM_LISTING - %s' % opts
-                    add_to_queue(q, messages.WEBCAM_LISTING, opts)
-                
-                elif msg[0] == messages.WEBCAM_CONNECT:
-                    print 'gado_sys\tWEBCAM_CONNECT switch made it'
-                    expecting_return = True
-                    if self.camera:
-                        print 'gado_sys\tCamera already exists'
-                        if self.camera.connected():
-                            print 'gado_sys\tAlready connected to the webcam'
-                            add_to_queue(q, messages.RETURN, self.camera.connected())
-                            return
-                        else: self.camera.disconnect()
-                    self.camera = Webcam(**self.s)
-                    print 'gado_sys\tself.camera.connected() %s' % self.camera.connected()
-                    add_to_queue(q, messages.RETURN, self.camera.connected())
-
-                elif msg[0] == messages.WEBCAM_PICTURE:
-                    expecting_return = True
-                    self.camera.savePicture(self.s['temp_webcam_image'])
-                    add_to_queue(q, messages.RETURN, self.s['temp_webcam_image'])
-                    
-                elif msg[0] == messages.WEIGHTED_ARTIFACT_SET_LIST:
-                    expecting_return = True
-                    li = self.dbi.weighted_artifact_set_list()
-                    print 'gado_sys\t'+str(datetime.datetime.now()), 'weighted_artifact_set_list', li
-                    add_to_queue(q, messages.RETURN, arguments=li)
-                elif msg[0] == messages.MAIN_ABANDON_SHIP:
-                    add_to_queue(q, messages.GUI_LISTENER_DIE)
-                    add_to_queue(self.q_in, messages.MAIN_ABANDON_SHIP)
-                    return
-                elif msg[0] == messages.STOP or msg[0] == messages.LAST_ARTIFACT or msg[0] == messages.RESET:
-                    # These commands are only relevant if the robot is already running.
-                    expecting_return = False
-                    pass
-                elif msg[0] == messages.GIVE_ME_A_ROBOT:
-                    add_to_queue(q, messages.RETURN, self.robot)
-                else:
-                    # add it back to the in queue, was somebody else waiting for that message?
-                    add_to_queue(self.q_in, msg[0], (msg[1] if len(msg) > 1 else None))
-            except:
-                print "EXCEPTION GENERATED"
+                result = handler(msg[1] if len(msg) > 1 else None)
+            except Exception, e:
+                log.error("EXCEPTION GENERATED handling %s", msg)
+                rpc.reply(self.q_out, msg, error=str(e) or e.__class__.__name__)
                 raise
-                if expecting_return:
-                    add_to_queue(q, messages.RETURN)
+            rpc.reply(self.q_out, msg, result)
+    
+    def _weighted_artifact_set_list(self, argument):
+        li = self.dbi.weighted_artifact_set_list()
+        log.debug('weighted_artifact_set_list %s', li)
+        return li
+    
+    def _job_summary(self, job):
+        if job is None:
+            jobs = self.dbi.recent_jobs(1)
+            job = jobs[0] if jobs else None
+        return self.dbi.job_summary(job) if job is not None else None
+    
+    def _reload_settings(self, argument):
+        self.load_settings()
+        self.robot.updateSettings(**self.s)
+        self.camera.disconnect()
+        self.camera = Webcam(**self.s)
+        del self.scanner
+        self.scanner = Scanner(**self.s)
+    
+    def _robot_connect(self, argument):
+        self.connect()
+        return self.robot.connected()
+    
+    def _scanner_connect(self, argument):
+        try: del self.scanner
+        except: pass
+        self.scanner = Scanner(**import_settings())
+        #The device picker only comes up if gado.conf's scanner isn't there
+        return self.scanner.connected() or self.scanner.connectToScannerGui()
+    
+    def _refresh_devices(self, argument):
+        #The webcams are opened on the camera's own thread, see gado.devices
+        self.camera.refresh()
+        registry().refresh()
+        return dict(webcams=self.camera.options(),
+                    scanners=[name for device_id, name in registry().scanners()])
+    
+    def _scanner_picture(self, argument):
+        self.scanner.scanImage(self.s['scanned_image'])
+        return self.s['scanned_image']
+    
+    def _set_selected_artifact_set(self, set_id):
+        self.selected_set = set_id
+    
+    def _webcam_listing(self, argument):
+        log.info('WEBCAM_LISTING')
+        #self.camera = Webcam()
+        opts = self.camera.options()
+        log.info('WEBCAM_LISTING - %s', opts)
+        return opts
+    
+    def _webcam_connect(self, argument):
+        log.debug('WEBCAM_CONNECT switch made it')
+        if self.camera:
+            log.debug('Camera already exists')
+            if self.camera.connected():
+                log.info('Already connected to the webcam')
+                return True
+            else: self.camera.disconnect()
+        self.camera = Webcam(**self.s)
+        log.debug('self.camera.connected() %s', self.camera.connected())
+        return self.camera.connected()
+    
+    def _webcam_picture(self, argument):
+        self.camera.savePicture(self.s['temp_webcam_image'])
+        return self.s['temp_webcam_image']
     
     def set_seletcted_set(self, set_id):
         self.selected_set = None
     
-    def _sanity_checks(self):
-        print 'gado_sys\tin sanity checks'
+    def _sanity_checks(self, interrupted=None):
+        log.debug('in sanity checks')
         if self.started:
             add_to_queue(self.q_out, messages.DISPLAY_ERROR,
                 'The scanning process has already started')
@@ -239,34 +264,38 @@ class GadoSystem():
         self.started = id(_a)
         
         if not self.selected_set:
-            print 'gado_sys\tfailed sanity check on selected_set'
+            log.warning('failed sanity check on selected_set')
             add_to_queue(self.q_out, messages.DISPLAY_ERROR,
                 'Please select an artifact set from the dropdown.')
             self.started = False
             return False
         
         if not self.robot.connected():
-            print 'gado_sys\tfailed sanity check on robot.connected()'
+            log.warning('failed sanity check on robot.connected()')
             #tkMessageBox.showerror("Initialization Error",
             #    "Lost connection to the robot, please try restarting.")
             self.connect()
             if not self.robot.connected():
-                print "gado_sys\tCOMPLETELY FAILED ON robot.connected()"
+                log.warning("COMPLETELY FAILED ON robot.connected()")
                 add_to_queue(self.q_out, messages.DISPLAY_ERROR,
                     'Unable to connect to the robot. Try pressing the reset button and then unplugging it and replugging it.')
                 self.started = False
                 return False
         
         add_to_queue(self.q_out, messages.SET_STATUS_TEXT, 'Connected to the Gado')
-        self.robot.reset()
+        #Resetting turns the pump off, dropping an artifact left on the cup
+        if interrupted is not None and self._holding(interrupted):
+            log.info('not resetting the robot, it holds an artifact')
+        else:
+            self.robot.reset()
         
         if not self.scanner.connected():
-            print 'gado_sys\tfailed sanity check on scanner.connected(), retrying'
+            log.warning('failed sanity check on scanner.connected(), retrying')
             try: del self.scanner
             except: pass
             self.scanner = Scanner(**import_settings())
             if not self.scanner.connected():
-                print 'gado_sys\tfailed sanity check on scanner.connected()'
+                log.warning('failed sanity check on scanner.connected()')
                 #tkMessageBox.showerror("Initialization Error",
                 #    "Lost connection to the scanner, please try restarting.")
                 self.started = False
@@ -276,7 +305,7 @@ class GadoSystem():
         add_to_queue(self.q_out, messages.SET_STATUS_TEXT, 'Connected to the scanner')
         
         if not self.camera.connected():
-            print 'gado_sys\tfailed sanity check on camera.connected()'
+            log.warning('failed sanity check on camera.connected()')
             add_to_queue(self.q_out, messages.DISPLAY_ERROR,
                 'Unable to connect to the webcam. Try unplugging it and replugging it. You may need to restart this application or run the setup wizard again.')
             self.started = False
@@ -284,7 +313,7 @@ class GadoSystem():
         add_to_queue(self.q_out, messages.SET_STATUS_TEXT, 'Connected to the webcam')
         
         self.robot._moveActuator(self.robot.actuator_up_value)
-        time.sleep(2)
+        metrics.sleep(2)
         
         if self.started != id(_a):
             add_to_queue(self.q_out, messages.DISPLAY_ERROR, 'An unknown error has occurred. Try restarting this application')
@@ -317,6 +346,8 @@ class GadoSystem():
             add_to_queue(self.q_out, messages.SET_STATUS_TEXT, 'Robot reset')
             raise Exception('RESET CALLED')
         elif msg[0] == messages.LAST_ARTIFACT:
+            #Don't carry on with the queued jobs either
+            self.last_artifact = True
             return False
         elif msg[0] == messages.START:
             add_to_queue(self.q_out, messages.DISPLAY_INFO, 'The robot is already running. If it is not, then please restart this application.')
@@ -324,92 +355,266 @@ class GadoSystem():
             self.robot.stop()
             add_to_queue(self.q_in, msg[0])
             raise Exception('Application Terminating')
+        elif msg[0] in messages.WHILE_SCANNING:
+            #The queue can be changed, and the sets looked at, while a job runs
+            rpc.reply(self.q_out, msg, self.handlers[msg[0]](msg[1] if len(msg) > 1 else None))
+        elif rpc.request_id(msg) is not None:
+            rpc.reply(self.q_out, msg, error='The robot is scanning')
         else:
             add_to_queue(self.q_out, msg[0], (msg[1] if len(msg) > 1 else None))
         return True
     
+    def _enqueue_job(self, argument):
+        return self.jobs.enqueue(argument['artifact_set'], **dict(
+            (str(k), v) for k, v in (argument.get('settings') or {}).items()))
+    
     def start(self):
         '''
         Starts the scanning process for the current in pile
+        
+        With jobs queued (see gado.jobs) it takes them one after the other,
+        moving on to the next one at each separator sheet
         '''
+        self.last_artifact = False
+        interrupted = self.journal.interrupted()
+        job = self.jobs.running()
+        if interrupted is not None:
+            log.info('resuming job %s of artifact set %s', interrupted.job, interrupted.artifact_set)
+            self.selected_set = interrupted.artifact_set
+            if job is not None and job.db_job != interrupted.job:
+                job = None
+        else:
+            if job is not None:
+                #Nothing in the journal to carry on from
+                log.warning('job %s was interrupted before it started, giving up on it', job.id)
+                self.jobs.finish(job, failed=True)
+            job = self.jobs.next()
+        if job is not None:
+            self._apply_job(job)
+        
         #Come back and make the sanity checks real
-        if not self._sanity_checks():
+        if not self._sanity_checks(interrupted):
+            if job is not None and interrupted is None:
+                self.jobs.requeue(job)
             return False
         
+        scanned = self._scan_job(interrupted, job)
+        if job is None:
+            return scanned
+        while not self.last_artifact:
+            job = self.jobs.next()
+            if job is None:
+                break
+            self._next_job(job)
+            scanned += self._scan_job(None, job)
+        #Back to gado.conf
+        self._apply_settings(dict())
+        return scanned
+    
+    def _apply_job(self, job):
+        '''
+        Switches to the artifact set and the settings of job
+        '''
+        self.selected_set = job.artifact_set
+        self._apply_settings(job.settings)
+    
+    def _apply_settings(self, overrides):
+        self.load_settings()
+        self.s.update(overrides)
+        self.robot.updateSettings(**self.s)
+        if 'scanner_dpi' in self.s:
+            self.scanner.scanDpi = int(self.s['scanner_dpi'])
+    
+    def _next_job(self, job):
+        '''
+        Carries the separator sheet between two piles to the out pile and
+        sets up job, the one for the pile under it
+        '''
+        log.info('separator sheet, moving on to job %s of artifact set %s', job.id, job.artifact_set)
+        add_to_queue(self.q_out, messages.SET_STATUS_TEXT, 'Starting the next job')
+        try:
+            self._discard_separator()
+        except:
+            self.jobs.requeue(job)
+            raise
+        self._apply_job(job)
+        self.started = True
+    
+    def _scan_job(self, interrupted, job=None):
+        '''
+        Scans the in pile up to the next barcode as one scan job, returns
+        how many artifacts were scanned
+        '''
+        if interrupted is not None:
+            self.last_job = interrupted.job
+        else:
+            self.last_job = self.dbi.start_job(self.selected_set)
+            self.journal.begin_job(self.last_job, self.selected_set)
+            if job is not None:
+                self.jobs.started(job, self.last_job)
+        self.metrics.start_job(self.last_job)
+        #The messages and stages of the job on a timeline, see gado.busmetrics
+        trace = self.s.get('bus_trace')
+        if trace:
+            bus().start_trace()
+        picks_before = dict(self.robot.pick_stats)
+        scanned = 0
+        try:
+            if interrupted is not None:
+                #The artifacts that were on their way, one at a time
+                scanned = interrupted.scanned() + self._resume(interrupted)
+            scanned += self._start_serial()
+            self.journal.finish_job(self.last_job)
+        finally:
+            self.metrics.end_job(self.dbi)
+            if trace:
+                bus().write_trace(trace.replace('%s', str(self.last_job)))
+            picks = self.robot.pick_stats
+            self.dbi.finish_job(self.last_job, scanned,
+                                picks['attempts'] - picks_before['attempts'],
+                                picks['picked'] - picks_before['picked'])
+        #A job that stopped half way stays running, START resumes it
+        if job is not None:
+            self.jobs.finish(job, self.dbi.job_summary(self.last_job))
+        return scanned
+    
+    def _start_serial(self):
         #The actual looping should be happening here, instead of in Robot.py
         #Robot.py should just run the loop once and all conditions/vars will be stored here
         #self.robotThread = RobotThread(self.robot)
-        print "gado_sys\tchecking for messages"
+        log.debug("checking for messages")
         self._checkMessages()
-        print 'gado_sys\tattempting to save picture'
+        log.debug('attempting to save picture')
         
-        # Sometimes it gets left behind, get rid of it
-        t_webcam_image = '%s.%s' % (self.s['temp_webcam_image'],
-                self.s['image_back_filetype'].strip('.'))
-        
-        t_scanner_image = '%s.%s' % (self.s['temp_scanned_image'],
-                self.s['image_front_filetype'].strip('.'))
+        t_webcam_image = self.s['webcam_image']
+        stage = self.metrics.stage
+        scanned = 0
         
-        try: os.remove(t_webcam_image)
-        except: pass
-        self.camera.savePicture(t_webcam_image)
+        self._capture_webcam(t_webcam_image)
         self._checkMessages()
-        print "gado_sys\tattempting to check for barcode"
-        completed = check_for_barcode(t_webcam_image, '')
+        log.debug("attempting to check for barcode")
+        completed = self._check_barcode(t_webcam_image)
         
         while not completed:
             # New Artifact!
-            print "gado_sys\tattempting to add an artifact"
+            log.debug("attempting to add an artifact")
             completed = self._checkMessages() & completed
-            artifact_info = new_artifact(self.dbi, self.selected_set)
-            
-            front_fn = artifact_info['front_path']
-            back_fn = artifact_info['back_path']
+            with stage(metrics.DB_INSERT):
+                artifact_info = new_artifact(self.dbi, self.selected_set)
+            self.journal.record(artifact_info, journal.NEW)
             
-            print 'gado_sys\trenaming webcam image to %s' % back_fn
-            move(t_webcam_image, back_fn)
-            add_to_queue(self.q_out, messages.SET_WEBCAM_PICTURE, back_fn)
+            completed = self._finish_artifact(artifact_info, journal.NEW, completed)
+            scanned += 1
+            self.metrics.flush(self.dbi)
             
-            print "gado_sys\tattempting to go pick up an object"
+            self._capture_webcam(t_webcam_image)
+            completed = self._check_barcode(t_webcam_image)
+        self.started = False
+        log.info("Done with robot loop")
+        return scanned
+    
+    def _holding(self, interrupted):
+        '''
+        Whether an artifact of an interrupted job is still on the cup
+        '''
+        if journal.PICKED in [a['step'] for a in interrupted.unfinished()]:
+            return True
+        #It may have been dropped or picked up when the job died
+        return bool(self.robot.cup_sealed())
+    
+    def _resume(self, interrupted):
+        '''
+        Takes the artifacts a crashed job left on their way through the
+        robot to the out pile, returns how many
+        '''
+        resumed = 0
+        for artifact in interrupted.unfinished():
+            log.info('resuming artifact %s after %s', artifact['artifact_id'], artifact['step'])
+            self._finish_artifact(artifact, artifact['step'])
+            resumed += 1
+        self.metrics.flush(self.dbi)
+        return resumed
+    
+    def _finish_artifact(self, artifact_info, done, completed=True):
+        '''
+        Runs an artifact through the steps of the scan loop after done (see
+        gado.journal), journaling each one
+        
+        Returns completed, cleared if LAST_ARTIFACT came in on the way
+        '''
+        steps = [(journal.BACK_SAVED, self._save_back),
+                 (journal.PICKED, self._pick_up),
+                 (journal.PLACED, self._place),
+                 (journal.SCANNED, self._scan),
+                 (journal.FRONT_SAVED, self._save_front),
+                 (journal.DROPPED, self._drop)]
+        for step, run in steps:
+            if journal.STEPS.index(step) <= journal.STEPS.index(done):
+                continue
             completed = self._checkMessages() & completed
+            run(artifact_info)
+            self.journal.record(artifact_info, step)
+        return completed
+    
+    def _save_back(self, artifact_info):
+        t_webcam_image = self.s['webcam_image']
+        back_fn = artifact_info['back_path']
+        if not os.path.exists(t_webcam_image) and not os.path.exists(back_fn):
+            #Resuming, the artifact is still on top of the in pile
+            self._capture_webcam(t_webcam_image)
+        log.debug('renaming webcam image to %s', back_fn)
+        if os.path.exists(t_webcam_image):
+            with self.metrics.stage(metrics.FILE_MOVE, artifact_info['artifact_id']):
+                move(t_webcam_image, back_fn)
+        add_to_queue(self.q_out, messages.SET_WEBCAM_PICTURE, back_fn)
+    
+    def _pick_up(self, artifact_info):
+        log.debug("attempting to go pick up an object")
+        with self.metrics.stage(metrics.PICK_UP, artifact_info['artifact_id']):
             self.robot.pickUpObject()
-            
-            print "gado_sys\tattempting to move object to scanner"
-            completed = self._checkMessages() & completed
+    
+    def _place(self, artifact_info):
+        log.debug("attempting to move object to scanner")
+        with self.metrics.stage(metrics.PLACE, artifact_info['artifact_id']):
             self.robot.scanObject()
-            
-            print "gado_sys\tattempting to scan"
-            completed = self._checkMessages() & completed
-            
-            # Sometimes it gets left behind :(
-            try: os.remove(t_scanner_image)
-            except: pass
-            self.scanner.scanImage(t_scanner_image)
-            
-            print 'gado_sys\trenaming scanned images to %s' % front_fn
-            move(t_scanner_image, front_fn)
-            add_to_queue(self.q_out, messages.SET_SCANNER_PICTURE, front_fn)
-            
-            completed = self._checkMessages() & completed
+    
+    def _scan(self, artifact_info):
+        log.debug("attempting to scan")
+        self._scan_image(self.s['scanned_image'], artifact_info['artifact_id'])
+    
+    def _save_front(self, artifact_info):
+        t_scanner_image = self.s['scanned_image']
+        front_fn = artifact_info['front_path']
+        if not os.path.exists(t_scanner_image) and not os.path.exists(front_fn):
+            #Resuming, the artifact is still on the scanner
+            self._scan(artifact_info)
+        log.debug('renaming scanned images to %s', front_fn)
+        if os.path.exists(t_scanner_image):
+            with self.metrics.stage(metrics.FILE_MOVE, artifact_info['artifact_id']):
+                move(t_scanner_image, front_fn)
+        add_to_queue(self.q_out, messages.SET_SCANNER_PICTURE, front_fn)
+    
+    def _drop(self, artifact_info):
+        with self.metrics.stage(metrics.DROP, artifact_info['artifact_id']):
             self.robot.moveToOut()
-            self.camera.savePicture(t_webcam_image)
-            completed = check_for_barcode(t_webcam_image, '')
-        self.started = False
-        print "Done with robot loop"
     
     def connect(self):
         '''
         Connect to the Gado.
         
-        If a port is specified in the settings, then try to connect to it
-        Otherwise scan through ports attempting to connect to the Robot
+        The port in the settings is tried first, then every other serial
+        port at once (see gado.discovery). The port it's found on is saved.
         '''
-        settings = import_settings()
-        if 'gado_port' in settings:
-            success = self.robot.connect(self.s.get('gado_port'))
-            if success:
-                return True
-        return _connect(self.robot)
+        if self.robot.connected():
+            return True
+        cached = import_settings().get('gado_port')
+        port, self.connect_seconds = discover(self.robot, cached)
+        if port is None:
+            return False
+        if port != cached:
+            self.s['gado_port'] = port
+            export_settings(gado_port=port)
+        return True
 
     
     def disconnect(self):
@@ -418,60 +623,81 @@ class GadoSystem():
         '''
         return True
     
-    def _capture_webcam(self):
+    def _capture_webcam(self, path):
         '''
         Captures a backside view of the next image in queue
         '''
-        image = None
-        return image
+        # Sometimes it gets left behind, get rid of it
+        try: os.remove(path)
+        except: pass
+        with self.metrics.stage(metrics.SNAPSHOT):
+            self.camera.savePicture(path)
+        return path
+    
+    def _read_barcode(self, image):
+        '''
+        Reads the barcode within image
+        
+        Returns (end of stack, set reference), the set reference being what
+        a set separator sheet carries (see gado.functions.set_barcode)
+        '''
+        frame = getattr(self.camera, 'last_frame', None)
+        with self.metrics.stage(metrics.BARCODE):
+            if self.barcode_decoder and frame is not None and frame.path == image:
+                #The pixels are still in memory, no need to read the file back
+                text = '\n'.join(self.barcode_decoder.decode(*frame.gray()))
+            else:
+                text = self.barcode_reader(image)
+        reference = set_barcode(text)
+        if reference is not None:
+            return False, reference
+        #Any other barcode ends the stack
+        return bool(text.strip()), None
     
     def _check_barcode(self, image):
         '''
-        Checks for a barcode within image
+        Checks for a barcode within image, returns True at the end of the stack
+        
+        Set separator sheets are carried to the out pile on the way and
+        switch selected_set for the artifacts under them
         '''
-        return True
+        completed, reference = self._read_barcode(image)
+        while reference is not None:
+            self._discard_separator()
+            self._switch_set(reference)
+            self._capture_webcam(image)
+            completed, reference = self._read_barcode(image)
+        return completed
+    
+    def _discard_separator(self):
+        self.robot.pickUpObject()
+        self.robot.discard()
     
-    def _scan_image(self):
+    def _switch_set(self, reference):
         '''
-        Instructs the scanner to scan the image
-        This does not transfer the image to the computer yet
+        Makes the set a separator sheet refers to the selected one
         '''
-        pass
+        artifact_set = self.dbi.find_or_add_artifact_set(reference)
+        if artifact_set is None:
+            log.warning('separator sheet without a set: %r', reference)
+            return
+        log.info('separator sheet, switching to artifact set %s (%s)', artifact_set, reference)
+        self.selected_set = artifact_set
+        self.journal.switch_set(artifact_set)
+        add_to_queue(self.q_out, messages.SET_STATUS_TEXT, 'Scanning into %s' % reference)
+    
+    def _scan_image(self, path, artifact=None):
+        '''
+        Instructs the scanner to scan the image and transfer it to path
+        '''
+        # Sometimes it gets left behind :(
+        try: os.remove(path)
+        except: pass
+        with self.metrics.stage(metrics.SCAN_TRANSFER, artifact):
+            return self.scanner.scanImage(path)
     
     def _transfer_image(self):
         pass
 
 
     
-def enumerate_serial_ports():
-    """
-    Uses the Win32 registry to return an
-    iterator of serial (COM) ports
-    existing on this computer.
-    """
-    path = 'HARDWARE\\DEVICEMAP\\SERIALCOMM'
-    try:
-        key = _winreg.OpenKey(_winreg.HKEY_LOCAL_MACHINE, path)
-    except WindowsError:
-        raise IterationError
-
-    for i in itertools.count():
-        try:
-            val = _winreg.EnumValue(key, i)
-            yield str(val[1])
-        except EnvironmentError:
-            break
-
-def _connect(robot, save_settings=True):
-    '''
-    Scan through ports attempting to connect to the robot.
-    If save_settings is True, then save the port information.
-    '''
-    for port in enumerate_serial_ports():
-        print "attempting port %s" % port
-        success = robot.connect(port)
-        if success:
-            if save_settings:
-                export_settings(gado_port=port)
-            return True
-    return False
\ No newline at end of file
@@ -2,6 +2,10 @@ import sys, ttk, Pmw, time, tkMessageBox
 from Tkinter import *
 from gado.functions import *
 import gado.messages as messages
+import gado.rpc as rpc
+import gado.log
+
+log = gado.log.get('ConfigurationWindow')
 
 INPUT_TRAY_LOCATION = 'arm_in_value'
 OUTPUT_TRAY_LOCATION = 'arm_out_value'
@@ -57,9 +61,7 @@ class ConfigurationWindow():
     
     def show(self):
         self.window.deiconify()
-        add_to_queue(self.q_out, messages.GIVE_ME_A_ROBOT)
-        msg = fetch_from_queue(self.q_in)
-        self.robot = msg[1]
+        self.robot = rpc.client(self.q_out, self.q_in).call(messages.GIVE_ME_A_ROBOT).result()
     
     def _create_dialog(self, root):
         dialog = Toplevel(root)
@@ -117,7 +119,7 @@ class ConfigurationWindow():
                     #Left arrow press
                     value = self.robot.move_arm(clockwise=False)
                     self.new_arm_position = value
-                    print "Moved left to %s" % value
+                    log.debug("Moved left to %s", value)
                 elif key == 39:
                     #Right arrow press
                     value = self.robot.move_arm(clockwise=True)
@@ -127,7 +129,7 @@ class ConfigurationWindow():
                     #Up arrow press
                     value = self.robot.move_actuator(up=True)
                     self.new_actuator_position = value
-                    print "Wizard\tactuator move up to %s" % value
+                    log.debug("actuator move up to %s", value)
                 elif key == 40:
                     #Down arrow press
                     value = self.robot.move_actuator(up=False)
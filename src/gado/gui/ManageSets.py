@@ -4,9 +4,13 @@ import tkMessageBox
 import ttk
 import Pmw
 import gado.messages as messages
+import gado.rpc as rpc
 from gado.functions import *
 from threading import Thread
 import datetime
+import gado.log
+
+log = gado.log.get('ManageSets')
 
 class _RefreshHelper(Thread):
     def __init__(self, manager, q_out, q_in, q_gui, new_set=None, delete_set=None):
@@ -19,15 +23,16 @@ class _RefreshHelper(Thread):
         Thread.__init__(self)
     
     def run(self):
-        print 'ManageSets\tStart time: %s' % (datetime.datetime.now())
+        log.debug('Start time: %s', datetime.datetime.now())
         if self.new_set:
             add_to_queue(self.q_out, messages.ADD_ARTIFACT_SET_LIST, self.new_set)
         elif self.delete_set:
             add_to_queue(self.q_out, messages.DELETE_ARTIFACT_SET_LIST, self.delete_set)
         
-        add_to_queue(self.q_out, messages.ARTIFACT_SET_LIST)
-        msg = fetch_from_queue(self.q_in, messages.RETURN, timeout=10)
-        self.manager.add_artifact_sets(msg[1])
+        sets = rpc.client(self.q_out, self.q_in).call(messages.ARTIFACT_SET_LIST).result(timeout=10)
+        if sets is None:
+            return
+        self.manager.add_artifact_sets(sets)
     
     def refresh(self):
         
@@ -126,7 +131,7 @@ class ManageSets():
         name = self.name_textbox.get()
         if not name:
             add_to_queue(self.q_gui, messages.DISPLAY_ERROR, 'Please name your new artifact set.')
-            print 'how do we show an error? the set must be named'
+            log.warning('how do we show an error? the set must be named')
             return
         self._refresh(new_set=dict(name=name, parent=self.selected_set))
     
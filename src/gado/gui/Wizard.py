@@ -6,8 +6,12 @@ from gado.functions import *
 import time
 from threading import Thread
 import gado.messages as messages
+import gado.rpc as rpc
 import Image, ImageTk
 import Pmw
+import gado.log
+
+log = gado.log.get('Wizard')
 
 #Constants
 WINDOW_HEIGHT = 300
@@ -16,31 +20,31 @@ WINDOW_WIDTH = 450
 TEXT_HEIGHT = 10
 TEXT_WIDTH = 50
 
-class WizardQueueListener(Thread):
+class WizardQueueListener():
+    '''
+    Sends a request and calls callback with (messages.RETURN, answer) once
+    it comes, see gado.rpc
+    '''
     def __init__(self, q_in, q_out, message, args, callback):
         self.q_in = q_in
         self.q_out = q_out
         self.message = message
         self.args = args
         self.callback = callback
-        Thread.__init__(self)
-    
-    def run(self):
-        if self.message == messages.WEBCAM_LISTING: track = True
-        else: track = True
-        
-        if track:
-            print 'WizardQueueListener\ttrack=True, message=%s' % self.message
-        add_to_queue(self.q_out, self.message, self.args)
-        if track:
-            print 'WizardQueueListener\tadded message to the queue'
-        if self.message == messages.WEBCAM_LISTING:
-            msg = fetch_from_queue(self.q_in, messages.WEBCAM_LISTING)
-        else:
-            msg = fetch_from_queue(self.q_in)
-        if track:
-            print 'WizardQueueListener\tfetched message from queue', msg
-        self.callback(msg)
+    
+    def start(self):
+        log.debug('message=%s', self.message)
+        future = rpc.client(self.q_out, self.q_in).call(self.message, self.args)
+        future.add_done_callback(self._answered)
+    
+    def _answered(self, future):
+        try:
+            value = future.result()
+        except rpc.RpcError, e:
+            log.warning('%s failed: %s', self.message, e)
+            value = None
+        log.debug('answer to %s: %s', self.message, value)
+        self.callback((messages.RETURN, value))
         
 class ImageSampleViewer(Frame):
     def __init__(self, root, path):
@@ -48,25 +52,25 @@ class ImageSampleViewer(Frame):
         self.root = root
         Frame.__init__(self, self.root)
                 
-        print 'ImageSampleViewer\tOpening image'
+        log.debug('Opening image')
         image = Image.open(path)
-        print 'ImageSampleViewer\tResizing image'
+        log.debug('Resizing image')
         image.thumbnail((500, 500), Image.ANTIALIAS)
         
-        print 'ImageSampleViewer\tPhotoImage(image)'
+        log.debug('PhotoImage(image)')
         image_tk = ImageTk.PhotoImage(image)
-        print 'ImageSampleViewer\tCreating the image\'s label'
+        log.debug('Creating the image\'s label')
         image_label = Label(self, image=image_tk)
-        print 'ImageSampleViewer\tAssiging image_tk to .photo'
+        log.debug('Assiging image_tk to .photo')
         image_label.photo = image_tk
-        print 'ImageSampleViewer\tAdding the label to the grid'
+        log.debug('Adding the label to the grid')
         image_label.grid(row=0, column = 0, sticky=N+S+E+W, padx=10, pady=5)
         
-        print 'ImageSampleViewer\tSetting up window closing protocol'
+        log.debug('Setting up window closing protocol')
         window.protocol("WM_DELETE_WINDOW", self.window.withdraw)
-        print 'ImageSampleViewer\tWithdrawing the window'
+        log.debug('Withdrawing the window')
         window.withdraw()
-        print 'ImageSampleViewer\t__init__ completed'
+        log.debug('__init__ completed')
     
 
 IN_PILE = 'Documents to be Scanned Pile'
@@ -169,7 +173,7 @@ class Wizard():
         idx = self.webcam_dropdown.curselection()[0]
         name = self.webcams[int(idx)][1]
         export_settings(webcam_name=name)
-        print 'Wizard\tI just saved the webcam_name as %s' % name
+        log.info('I just saved the webcam_name as %s', name)
     
     def webcam_options(self, msg):
         opts = msg[1]
@@ -344,7 +348,7 @@ class Wizard():
         dirname = tkFileDialog.askdirectory(parent=self.root,
                                             initialdir=".",
                                             title='Please select a directory')
-        print 'Wizard\tGot a directory name!'
+        log.debug('Got a directory name!')
         self.name_textbox.config(state=NORMAL)
         self.name_textbox.delete(0, 'end')
         self.name_textbox.insert('end', dirname)
@@ -352,20 +356,20 @@ class Wizard():
         export_settings(image_path=dirname)
     
     def nextFrame(self):
-        print 'Wizard\tnextFrame() called'
-        print 'Wizard\tnextFrame() forgetting current frame'
+        log.debug('nextFrame() called')
+        log.debug('nextFrame() forgetting current frame')
         self.currentFrame.grid_forget()
         self.frame_idx += 1
-        print 'Wizard\tnextFrame() next index: %s' % self.frame_idx
+        log.debug('nextFrame() next index: %s', self.frame_idx)
         if self.frame_idx >= len(self.frameList):
-            print 'Wizard\tnextFrame() END OF THE ROAD'
+            log.debug('nextFrame() END OF THE ROAD')
             # We're done with all the frames
             export_settings(wizard_run=1)
             self._quit()
             return
-        print 'Wizard\tnextFrame() is this a keyboard callback?'
+        log.debug('nextFrame() is this a keyboard callback?')
         nextFrame = self.frameList[self.frame_idx]
-        print 'Wizard\tnextFrame() forcing nextFrame to be visible'
+        log.debug('nextFrame() forcing nextFrame to be visible')
         nextFrame.grid(column = 0, row = 0, padx = 10, pady = 5, sticky = N+S+E+W)
         self.currentFrame = nextFrame
     
@@ -389,7 +393,7 @@ class Wizard():
         return 'arm' in self.keyboardCallbacks[self.frame_idx]
     
     def _keyboard_callback(self, event):
-        print 'Wizard\tKeyboard Event!'
+        log.debug('Keyboard Event!')
         t = time.time()
         value = None
         settings_key = self.keyboardCallbacks[self.frame_idx]
@@ -401,19 +405,19 @@ class Wizard():
                     #Left arrow press
                     #add_to_queue(self.q_out, messages.MOVE_LEFT)
                     value = self.robot.move_arm(clockwise=False)
-                    print "Wizard\tarm move left to %s" % value
+                    log.debug("arm move left to %s", value)
                     
                 elif key == 39:
                     #add_to_queue(self.q_out, messages.MOVE_RIGHT)
                     value = self.robot.move_arm(clockwise=True)
                     #Right arrow press
-                    print "Wizard\tarm move right to %s" % value
+                    log.debug("arm move right to %s", value)
             else:
                 if key == 38:
                     #add_to_queue(self.q_out, messages.MOVE_UP)
                     #Up arrow press
                     value = self.robot.move_actuator(up=True)
-                    print "Wizard\tactuator move up to %s" % value
+                    log.debug("actuator move up to %s", value)
                 elif key == 40:
                     #add_to_queue(self.q_out, messages.MOVE_DOWN)
                     #Down arrow press
@@ -421,11 +425,11 @@ class Wizard():
                         value = self.robot.move_actuator(up=False)
                     else:
                         pass
-                    print "Wizard\tactuator move down to %s" % value
+                    log.debug("actuator move down to %s", value)
             if value != None:
-                print 'Wizard\tValue != None'
+                log.debug('Value != None')
                 s = {settings_key : value}
-                print 'Wizard\tsettings:', s
+                log.debug('settings: %s', s)
                 export_settings(**s)
     
     ##############################################################################
@@ -445,10 +449,10 @@ class Wizard():
                 t.start()
     
     def robotCallback(self, msg):
-        print 'Wizard\tgot a robot callback'
+        log.debug('got a robot callback')
         if msg[0] == messages.RETURN:
             if msg[1]:
-                print 'Wizard\tassigned self.robot'
+                log.debug('assigned self.robot')
                 self.robot = msg[1]
     
     def connectToScanner(self):
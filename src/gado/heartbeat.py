@@ -0,0 +1,84 @@
+'''
+Keeping track of whether the robot is still there
+
+Robot.connected() used to send a handshake and block on the answer every
+time it was asked. Once a SerialReader runs there is a steady stream of
+telemetry coming in anyway (it asks for some every
+telemetry_idle_interval seconds), so Heartbeat just watches when the
+reader last heard from the robot:
+
+    alive = the reader runs and heard something in the last timeout seconds
+
+connected() returns that right away. Listeners are called with the new
+state whenever it changes, which is how GadoSystem tells the GUI about a
+lost robot (messages.ROBOT_CONNECTION_CHANGED).
+
+The firmware may not answer while it runs a routine, which can take
+longer than timeout. Robot calls quiet_until() with the routine's
+deadline before it starts one, and the robot isn't lost before then.
+'''
+import time
+from threading import Thread, Event
+import gado.log
+
+log = gado.log.get('Heartbeat')
+
+class Heartbeat(Thread):
+    def __init__(self, reader, listeners=None, interval=0.5, timeout=3.0):
+        Thread.__init__(self, name='Heartbeat')
+        self.daemon = True
+        self.reader = reader
+        self.listeners = listeners if listeners is not None else []
+        self.interval = interval
+        self.timeout = timeout
+
+        # The handshake has just been answered when a heartbeat starts
+        self.alive = True
+        self.started = time.time()
+        # Time up to which the robot may be silent, see quiet_until
+        self.quiet = None
+        self._stopped = Event()
+
+    def last_seen(self):
+        return self.reader.last_seen or self.started
+
+    def quiet_until(self, deadline):
+        '''
+        Lets the robot be silent up to deadline (a time, None to end it)
+        '''
+        self.quiet = deadline
+
+    def check(self):
+        '''
+        Updates alive and tells the listeners if it changed
+        '''
+        now = time.time()
+        quiet = self.quiet
+        alive = self.reader.running() and \
+            (now - self.last_seen() < self.timeout or (quiet is not None and now < quiet))
+        if alive != self.alive:
+            self.alive = alive
+            log.warning('robot %s, last heard from %.1fs ago',
+                        'is back' if alive else 'lost', time.time() - self.last_seen())
+            self._notify(alive)
+        return alive
+
+    def _notify(self, alive):
+        for listener in list(self.listeners):
+            try:
+                listener(alive)
+            except Exception, e:
+                log.warning('listener failed: %s', e)
+
+    def stop(self):
+        '''
+        Stops watching, telling the listeners the robot is gone
+        '''
+        self._stopped.set()
+        if self.alive:
+            self.alive = False
+            self._notify(False)
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.check()
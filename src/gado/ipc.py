@@ -0,0 +1,314 @@
+'''
+The GadoSystem in a child process, talking to the GUI over a pipe
+
+main.py runs the GUI and the GadoSystem as two threads of one interpreter.
+Tk, PIL thumbnailing the pictures in changeScannedImage, the settings'
+JSON and the serial reader all take turns on the one GIL. With
+'logic_process' set to 1 in the settings, main.py runs the GadoSystem in a
+child process instead, the way LogicThread runs it:
+
+    GUI mailboxes <-> LogicProcess threads <-> pipe <-> run_logic threads
+                                                        <-> GadoSystem mailboxes
+
+The (message, arguments[, request id, error]) tuples cross the pipe in a
+compact binary encoding (encode/decode): a tag byte per value, numbers in
+one or eight bytes, strings and containers with a one byte length when it
+fits, and a string that comes up again in a message (the keys of a list of
+dicts) as its number. It encodes the types the messages carry (None, bools, numbers,
+strings, tuples, lists, dicts, datetimes) and raises TypeError for anything
+else. Images never cross it: the messages carry the paths of the image files
+the scanner and the webcam wrote, and the GUI opens them itself.
+
+GIVE_ME_A_ROBOT cannot hand the Robot to another process. It is answered on
+the GUI side with a RobotProxy, which moves the robot with MOVE_* requests.
+
+When the child dies LogicProcess.join() returns, and main.py starts a
+recovered one the same way it does for LogicThread. If the child's mainloop
+returned because of MAIN_ABANDON_SHIP, join() puts MAIN_ABANDON_SHIP back
+on the GUI's queue, where main.py looks for it.
+'''
+import struct, datetime
+from threading import Thread
+from multiprocessing import Process, Pipe
+from gado.functions import fetch_from_queue, requeue
+from gado.mailbox import Mailbox
+import gado.messages as messages
+import gado.rpc as rpc
+import gado.log
+
+log = gado.log.get('ipc')
+
+# Seconds between LogicProcess checks that the child is still alive
+POLL_INTERVAL = 0.5
+# year, month, day, hour, minute, second, microsecond
+_DATETIME = struct.Struct('<HBBBBBI')
+# Tells the child's sender thread that the GadoSystem is done
+_CLOSE = 'ipc close'
+
+#################################################################################
+#####                           ENCODING                                    #####
+#################################################################################
+
+def encode(value):
+    '''
+    value (a message tuple) as a string of bytes
+    '''
+    chunks = []
+    _encode(value, chunks.append, dict())
+    return ''.join(chunks)
+
+def _length(short, long, length):
+    # The tag and the length, one byte of it when it fits
+    if length < 256:
+        return short + chr(length)
+    return long + struct.pack('<I', length)
+
+def _encode(value, write, memo):
+    if value is None:
+        write('N')
+    elif value is True:
+        write('T')
+    elif value is False:
+        write('F')
+    elif isinstance(value, (int, long)):
+        if 0 <= value < 256:
+            write('b' + chr(value))
+        elif -2 ** 63 <= value < 2 ** 63:
+            write('I' + struct.pack('<q', value))
+        else:
+            raise TypeError('%s is too big to send' % value)
+    elif isinstance(value, float):
+        write('D' + struct.pack('<d', value))
+    elif isinstance(value, str):
+        #A string seen before in the message (dict keys mostly) is sent as
+        #its number among the strings
+        seen = memo.get(value)
+        if seen is not None:
+            write(_length('r', 'R', seen))
+            return
+        if len(memo) < 2 ** 32:
+            memo[value] = len(memo)
+        write(_length('s', 'S', len(value)))
+        write(value)
+    elif isinstance(value, unicode):
+        value = value.encode('utf-8')
+        write(_length('u', 'U', len(value)))
+        write(value)
+    elif isinstance(value, (tuple, list)):
+        if isinstance(value, tuple):
+            write(_length('t', '(', len(value)))
+        else:
+            write(_length('l', '[', len(value)))
+        for item in value:
+            _encode(item, write, memo)
+    elif isinstance(value, dict):
+        write(_length('d', '{', len(value)))
+        for key, item in value.iteritems():
+            _encode(key, write, memo)
+            _encode(item, write, memo)
+    elif isinstance(value, datetime.datetime):
+        write('W' + _DATETIME.pack(value.year, value.month, value.day,
+                                   value.hour, value.minute, value.second, value.microsecond))
+    else:
+        raise TypeError('a %s cannot be sent to the other process' % type(value).__name__)
+
+def decode(data):
+    '''
+    The value encode() turned into data
+    '''
+    value, end = _decode(data, 0, [])
+    return value
+
+def _decode(data, i, memo):
+    tag = data[i]
+    i += 1
+    if tag in 'srultd':
+        length = ord(data[i])
+        i += 1
+    elif tag in 'SRU([{':
+        length = struct.unpack_from('<I', data, i)[0]
+        i += 4
+    if tag == 'N':
+        return None, i
+    elif tag == 'T':
+        return True, i
+    elif tag == 'F':
+        return False, i
+    elif tag == 'b':
+        return ord(data[i]), i + 1
+    elif tag == 'I':
+        return struct.unpack_from('<q', data, i)[0], i + 8
+    elif tag == 'D':
+        return struct.unpack_from('<d', data, i)[0], i + 8
+    elif tag in 'sS':
+        value = data[i:i + length]
+        memo.append(value)
+        return value, i + length
+    elif tag in 'rR':
+        return memo[length], i
+    elif tag in 'uU':
+        return data[i:i + length].decode('utf-8'), i + length
+    elif tag in 'tl([':
+        items = []
+        for n in xrange(length):
+            item, i = _decode(data, i, memo)
+            items.append(item)
+        return (tuple(items) if tag in 't(' else items), i
+    elif tag in 'd{':
+        value = dict()
+        for n in xrange(length):
+            key, i = _decode(data, i, memo)
+            value[key], i = _decode(data, i, memo)
+        return value, i
+    elif tag == 'W':
+        return datetime.datetime(*_DATETIME.unpack_from(data, i)), i + _DATETIME.size
+    raise ValueError('unknown tag %r at %s' % (tag, i - 1))
+
+def _encode_message(msg):
+    '''
+    encode(msg), or the error RETURN to a request whose answer can't be
+    sent, None for anything else that can't
+    '''
+    try:
+        return encode(msg)
+    except TypeError, e:
+        log.warning('cannot send %s: %s', msg[0], e)
+        if msg[0] == messages.RETURN and rpc.request_id(msg) is not None:
+            return encode((messages.RETURN, None, rpc.request_id(msg), str(e)))
+        return None
+
+#################################################################################
+#####                           CHILD PROCESS                               #####
+#################################################################################
+
+def run_logic(conn, recovered=False):
+    '''
+    The child process: a GadoSystem with its own mailboxes, fed from conn
+    '''
+    from gado.gado_sys import GadoSystem
+    gado.log.set_process('logic')
+    q_in, q_out = Mailbox('logic_in'), Mailbox('logic_out')
+    receiver = Thread(target=_pipe_to_queue, args=(conn, q_in), name='ipc-receive')
+    receiver.daemon = True
+    sender = Thread(target=_queue_to_pipe, args=(q_out, conn), name='ipc-send')
+    receiver.start()
+    sender.start()
+    try:
+        gado_sys = GadoSystem(q_in, q_out, recovered)
+        gado_sys.load()
+        gado_sys.mainloop()
+    finally:
+        #Whatever the GadoSystem had to say still goes to the GUI
+        q_out.put((_CLOSE, None))
+        sender.join()
+
+def _pipe_to_queue(conn, q):
+    while True:
+        try:
+            data = conn.recv_bytes()
+        except (EOFError, IOError):
+            #The GUI is gone, stop scanning and shut down
+            log.warning('lost the GUI, shutting down')
+            q.put((messages.STOP, None))
+            q.put((messages.MAIN_ABANDON_SHIP, None))
+            return
+        q.put(decode(data))
+
+def _queue_to_pipe(q, conn):
+    while True:
+        msg = fetch_from_queue(q)
+        if msg[0] == _CLOSE:
+            return
+        data = _encode_message(msg)
+        if data is None:
+            continue
+        try:
+            conn.send_bytes(data)
+        except (EOFError, IOError):
+            return
+
+#################################################################################
+#####                           GUI PROCESS                                 #####
+#################################################################################
+
+class RobotProxy():
+    '''
+    What the configuration window and the wizard get for GIVE_ME_A_ROBOT
+    when the Robot is in the other process
+    '''
+    def __init__(self, q_out, q_in):
+        self.q_out = q_out
+        self.q_in = q_in
+
+    def _call(self, message):
+        return rpc.client(self.q_out, self.q_in).call(message).result()
+
+    def move_arm(self, clockwise=True):
+        return self._call(messages.MOVE_RIGHT if clockwise else messages.MOVE_LEFT)
+
+    def move_actuator(self, up=True):
+        return self._call(messages.MOVE_UP if up else messages.MOVE_DOWN)
+
+class LogicProcess():
+    '''
+    Runs a GadoSystem in a child process, main.py uses it like LogicThread
+
+    q_in and q_out are the GUI's mailboxes: the GadoSystem's messages are
+    taken off q_in and sent down the pipe, its answers put on q_out.
+    '''
+    def __init__(self, q_in, q_out, recovered=False):
+        self.q_in = q_in
+        self.q_out = q_out
+        self.conn, child = Pipe()
+        self._child_conn = child
+        self.process = Process(target=run_logic, args=(child, recovered), name='gado-logic')
+        self.process.daemon = True
+        self._sender = Thread(target=self._send, name='ipc-send')
+        self._sender.daemon = True
+        self._receiver = Thread(target=self._receive, name='ipc-receive')
+        self._receiver.daemon = True
+
+    def start(self):
+        log.info('starting the GadoSystem process')
+        self.process.start()
+        #So the receiver sees the pipe close when the child dies
+        self._child_conn.close()
+        self._sender.start()
+        self._receiver.start()
+
+    def join(self):
+        self.process.join()
+        self._sender.join()
+        self._receiver.join()
+        self.conn.close()
+        log.info('the GadoSystem process exited with %s', self.process.exitcode)
+        if self.process.exitcode == 0:
+            #mainloop only returns for MAIN_ABANDON_SHIP
+            self.q_in.put((messages.MAIN_ABANDON_SHIP, None))
+
+    def _send(self):
+        while self.process.is_alive():
+            msg = fetch_from_queue(self.q_in, timeout=POLL_INTERVAL)
+            if msg is None:
+                continue
+            if msg[0] == messages.GIVE_ME_A_ROBOT:
+                rpc.reply(self.q_out, msg, RobotProxy(self.q_in, self.q_out))
+                continue
+            data = _encode_message(msg)
+            if data is None:
+                rpc.reply(self.q_out, msg, error='The request cannot be sent to the GadoSystem')
+                continue
+            try:
+                self.conn.send_bytes(data)
+            except (EOFError, IOError):
+                #The next process gets it
+                requeue(self.q_in, msg)
+                return
+
+    def _receive(self):
+        while True:
+            try:
+                data = self.conn.recv_bytes()
+            except (EOFError, IOError):
+                return
+            self.q_out.put(decode(data))
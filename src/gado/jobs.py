@@ -0,0 +1,185 @@
+'''
+A queue of scan jobs
+
+START used to scan one in pile into the selected artifact set, after which
+somebody had to be there to pick the next set and press START again.
+Several piles can be stacked on the in tray instead, each followed by a
+separator sheet (the end of stack barcode), and a ScanJob queued for each
+of them:
+
+    jobs.enqueue(artifact_set, scanner_dpi=300)
+
+GadoSystem.start runs the queued jobs in order. When the barcode shows up
+and another job is queued, the separator sheet is carried to the out pile
+and the next job starts, with its own settings overrides and its own
+scan_jobs row. Jobs can be reordered or cancelled while they're queued;
+the running one is stopped with STOP like before.
+
+The queue is saved to a file on every change, so it survives the
+LogicThread being restarted. The running job stays RUNNING until it is
+done and START resumes it (see gado.journal); one the journal doesn't
+know about can't be resumed and is marked FAILED.
+'''
+import os, json, time
+from threading import Lock
+import gado.log
+
+log = gado.log.get('jobs')
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+CANCELLED = 'cancelled'
+FAILED = 'failed'
+
+# What is kept of DBInterface.job_summary for every job
+SUMMARY_FIELDS = ('artifacts', 'seconds', 'artifacts_per_minute', 'slept',
+                  'slowest_stage', 'pick_attempts', 'picks', 'pick_success_rate')
+
+class ScanJob():
+    def __init__(self, id, artifact_set, settings=None, state=QUEUED,
+                 db_job=None, added=None, summary=None):
+        self.id = id
+        self.artifact_set = artifact_set
+        # Settings that differ from gado.conf for this job only
+        self.settings = settings or dict()
+        self.state = state
+        # Its row in scan_jobs once it has started
+        self.db_job = db_job
+        self.added = added or time.time()
+        self.summary = summary
+
+    def describe(self):
+        return dict(id=self.id, artifact_set=self.artifact_set,
+                    settings=self.settings, state=self.state,
+                    db_job=self.db_job, added=self.added,
+                    summary=self.summary)
+
+class JobQueue():
+    def __init__(self, path=None):
+        self.path = path
+        self.jobs = []
+        self._lock = Lock()
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            FH = open(self.path)
+            jobs = json.load(FH)
+            FH.close()
+        except ValueError:
+            log.warning('unreadable job queue in %s, starting empty', self.path)
+            return
+        self.jobs = [ScanJob(**dict((str(k), v) for k, v in job.items())) for job in jobs]
+
+    def _save(self):
+        if not self.path:
+            return
+        FH = open(self.path + '.tmp', 'w')
+        json.dump([job.describe() for job in self.jobs], FH)
+        FH.close()
+        # Replaced in one go, a crash leaves either the old or the new queue
+        if os.name == 'nt' and os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(self.path + '.tmp', self.path)
+
+    def _get(self, id):
+        for job in self.jobs:
+            if job.id == id:
+                return job
+        return None
+
+    def enqueue(self, artifact_set, **settings):
+        '''
+        Adds a job to the end of the queue, returns its id
+        '''
+        with self._lock:
+            id = max([job.id for job in self.jobs] + [0]) + 1
+            self.jobs.append(ScanJob(id, artifact_set, settings))
+            self._save()
+        return id
+
+    def reorder(self, id, position):
+        '''
+        Moves a queued job to position among the queued jobs (0 is next)
+        '''
+        with self._lock:
+            job = self._get(id)
+            if job is None or job.state != QUEUED:
+                return False
+            queued = [j for j in self.jobs if j.state == QUEUED and j is not job]
+            position = max(0, min(int(position), len(queued)))
+            queued.insert(position, job)
+            others = [j for j in self.jobs if j.state != QUEUED]
+            self.jobs = others + queued
+            self._save()
+        return True
+
+    def cancel(self, id):
+        '''
+        Takes a queued job off the queue, the running one can't be
+        '''
+        with self._lock:
+            job = self._get(id)
+            if job is None or job.state != QUEUED:
+                return False
+            job.state = CANCELLED
+            self._save()
+        return True
+
+    def pending(self):
+        with self._lock:
+            return [job for job in self.jobs if job.state == QUEUED]
+
+    def running(self):
+        with self._lock:
+            for job in self.jobs:
+                if job.state == RUNNING:
+                    return job
+        return None
+
+    def next(self):
+        '''
+        Marks the next queued job as running and returns it, or None
+        '''
+        with self._lock:
+            for job in self.jobs:
+                if job.state == QUEUED:
+                    job.state = RUNNING
+                    self._save()
+                    return job
+        return None
+
+    def started(self, job, db_job):
+        with self._lock:
+            job.db_job = db_job
+            self._save()
+
+    def requeue(self, job):
+        '''
+        Puts a job that couldn't start back at the front of the queue
+        '''
+        with self._lock:
+            job.state = QUEUED
+            self._save()
+
+    def finish(self, job, summary=None, failed=False):
+        with self._lock:
+            job.state = FAILED if failed else DONE
+            if summary:
+                job.summary = dict((k, summary.get(k)) for k in SUMMARY_FIELDS)
+            self._save()
+
+    def clear_finished(self):
+        '''
+        Forgets the jobs that are done, cancelled or failed
+        '''
+        with self._lock:
+            self.jobs = [job for job in self.jobs if job.state in (QUEUED, RUNNING)]
+            self._save()
+
+    def describe(self):
+        with self._lock:
+            return [job.describe() for job in self.jobs]
@@ -0,0 +1,153 @@
+'''
+A write-ahead journal of the scan loop
+
+When the LogicThread dies, main.py starts a new GadoSystem with
+recovered=True, which knew nothing about the artifact that was on its way
+through the loop: it made a new artifact row for it, left its images at
+temp_scanned_image / temp_webcam_image or left it on the scanner glass.
+
+ScanJournal keeps a line of JSON for every step an artifact completes, in
+the order they happen:
+
+    NEW          its artifact row (and image rows) exist
+    BACK_SAVED   the webcam image is at back_path
+    PICKED       it is on the cup
+    PLACED       it is on the scanner
+    SCANNED      the scan is at temp_scanned_image
+    FRONT_SAVED  the scan is at front_path
+    DROPPED      it is on the out pile
+
+plus a line when a job starts and when a separator sheet switches its
+artifact set. interrupted() reads the journal back and
+returns the job that never finished, with every artifact that didn't
+reach DROPPED and the last step it did complete, so GadoSystem can carry
+on with the step after that (see GadoSystem._finish_artifact).
+
+Lines are written through to the operating system right away, which is
+all a dead thread (or process) needs. They are only fsync'ed every
+sync_interval seconds, so a power cut may lose the last second of steps;
+resuming then repeats a step, and every step can be repeated. Once a job
+has finished cleanly the journal is emptied.
+'''
+import os, json, time
+from threading import Lock
+
+NEW = 'new'
+BACK_SAVED = 'back_saved'
+PICKED = 'picked'
+PLACED = 'placed'
+SCANNED = 'scanned'
+FRONT_SAVED = 'front_saved'
+DROPPED = 'dropped'
+
+STEPS = [NEW, BACK_SAVED, PICKED, PLACED, SCANNED, FRONT_SAVED, DROPPED]
+
+# What the artifact dictionaries of gado.functions.new_artifact carry over
+ARTIFACT_FIELDS = ('artifact_id', 'front_id', 'back_id', 'front_path', 'back_path')
+
+class InterruptedJob():
+    def __init__(self, job, artifact_set):
+        self.job = job
+        self.artifact_set = artifact_set
+        # artifact_id -> artifact dictionary with the last 'step'
+        self.artifacts = dict()
+        self.order = []
+
+    def record(self, entry):
+        artifact = self.artifacts.get(entry['artifact_id'])
+        if artifact is None:
+            artifact = self.artifacts[entry['artifact_id']] = dict(entry)
+            self.order.append(entry['artifact_id'])
+        elif STEPS.index(entry['step']) > STEPS.index(artifact['step']):
+            # Steps are journaled in order, a stray line never takes one back
+            artifact.update(entry)
+
+    def unfinished(self):
+        '''
+        The artifacts that didn't reach the out pile, oldest first
+        '''
+        return [self.artifacts[i] for i in self.order
+                if self.artifacts[i]['step'] != DROPPED]
+
+    def scanned(self):
+        return len([i for i in self.order if self.artifacts[i]['step'] == DROPPED])
+
+class ScanJournal():
+    def __init__(self, path, sync_interval=1.0):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.file = None
+        self.synced = 0
+        self._lock = Lock()
+
+    def _write(self, entry, sync=False):
+        entry['time'] = time.time()
+        with self._lock:
+            if self.file is None:
+                self.file = open(self.path, 'a')
+            self.file.write(json.dumps(entry) + '\n')
+            self.file.flush()
+            if sync or time.time() - self.synced >= self.sync_interval:
+                os.fsync(self.file.fileno())
+                self.synced = time.time()
+
+    def begin_job(self, job, artifact_set):
+        self._write(dict(event='job', job=job, artifact_set=artifact_set), sync=True)
+
+    def switch_set(self, artifact_set):
+        '''
+        The artifacts from here on go into artifact_set
+        '''
+        self._write(dict(event='set', artifact_set=artifact_set), sync=True)
+
+    def record(self, artifact, step):
+        '''
+        artifact finished step, artifact is a new_artifact dictionary
+        '''
+        entry = dict((k, artifact[k]) for k in ARTIFACT_FIELDS if k in artifact)
+        entry.update(event='step', step=step)
+        self._write(entry)
+
+    def finish_job(self, job):
+        '''
+        The job ran to its end, nothing is left to resume
+        '''
+        with self._lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            # Emptied rather than removed, so there's a file to fsync
+            FH = open(self.path, 'w')
+            os.fsync(FH.fileno())
+            FH.close()
+
+    def interrupted(self):
+        '''
+        The InterruptedJob the journal ends in, or None
+        '''
+        try:
+            FH = open(self.path)
+        except IOError:
+            return None
+        job = None
+        for line in FH:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Torn by a power cut
+                continue
+            if entry.get('event') == 'job':
+                job = InterruptedJob(entry['job'], entry['artifact_set'])
+            elif entry.get('event') == 'set' and job is not None:
+                job.artifact_set = entry['artifact_set']
+            elif entry.get('event') == 'step' and job is not None:
+                job.record(entry)
+        FH.close()
+        return job
+
+    def close(self):
+        with self._lock:
+            if self.file is not None:
+                os.fsync(self.file.fileno())
+                self.file.close()
+                self.file = None
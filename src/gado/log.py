@@ -0,0 +1,192 @@
+'''
+Leveled logging that doesn't hold up the thread doing the logging
+
+Everything used to be printed to stdout on the spot: every add_to_queue,
+every message mainloop fetched, every step of the robot. On a Windows
+console each print takes long enough to show up in the scan loop. Now the
+modules log through a logger of their own instead:
+
+    log = gado.log.get('Robot')
+    log.debug('batch %s done after %.2fs', commands, seconds)
+
+A record only gets made when its level is enabled for the module, and it
+is only formatted (arguments and all) on the writer thread, which passes it
+on to the console and a log file that rotates by size. A disabled debug
+line costs a method call and a level check.
+
+configure() takes the settings:
+
+    log_level     level of every module, 'info' by default
+    log_levels    levels of single modules, like {'Robot': 'debug'}
+    log_file      the log file, gado.log in the Gado directory by default,
+                  '' for none
+    log_max_bytes size at which the log file is rotated
+    log_backups   rotated log files kept
+    log_console   0 to only write the file
+
+If the writer falls more than MAX_PENDING records behind, the newest are
+dropped (and counted) rather than making the loggers wait.
+'''
+import sys, os, atexit, logging, logging.handlers
+from collections import deque
+from threading import Thread, Condition
+
+# Records waiting for the writer before new ones are dropped
+MAX_PENDING = 10000
+LEVELS = dict(debug=logging.DEBUG, info=logging.INFO, warning=logging.WARNING,
+              error=logging.ERROR, critical=logging.CRITICAL)
+
+def get(name):
+    '''
+    The logger of a module, name is what its lines start with
+    '''
+    return logging.getLogger('gado.' + name)
+
+def _level(level):
+    if isinstance(level, basestring):
+        return LEVELS.get(level.lower(), logging.INFO)
+    return int(level)
+
+class _Formatter(logging.Formatter):
+    '''
+    Module<tab>message, like the prints were
+    '''
+    def format(self, record):
+        record.module_name = record.name.split('.', 1)[-1]
+        return logging.Formatter.format(self, record)
+
+class AsyncHandler(logging.Handler):
+    '''
+    Queues the records for a writer thread, which hands them to targets
+    '''
+    def __init__(self, targets):
+        logging.Handler.__init__(self)
+        self.targets = targets
+        self.dropped = 0
+        self._pending = deque()
+        # Replaced targets, closed by the writer once it is done with them
+        self._retired = []
+        self._condition = Condition()
+        self._writer = None
+        self._running = True
+
+    def emit(self, record):
+        with self._condition:
+            if len(self._pending) >= MAX_PENDING:
+                self.dropped += 1
+                return
+            self._pending.append(record)
+            if self._writer is None:
+                self._writer = Thread(target=self._write, name='log-writer')
+                self._writer.daemon = True
+                self._writer.start()
+            self._condition.notify()
+
+    def _write(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._retired and self._running:
+                    self._condition.wait()
+                if not self._pending and not self._retired:
+                    return
+                records = list(self._pending)
+                self._pending.clear()
+                dropped, self.dropped = self.dropped, 0
+                targets = list(self.targets)
+                retired, self._retired = self._retired, []
+            if dropped:
+                records.append(logging.makeLogRecord(dict(
+                    name='gado.log', levelno=logging.WARNING, levelname='WARNING',
+                    msg='dropped %s log records, the writer fell behind', args=(dropped,))))
+            for record in records:
+                for target in targets:
+                    if record.levelno >= target.level:
+                        try:
+                            target.handle(record)
+                        except Exception:
+                            pass
+            for target in targets:
+                target.flush()
+            for target in retired:
+                target.close()
+
+    def set_targets(self, targets):
+        with self._condition:
+            if self._writer is None:
+                for target in self.targets:
+                    target.close()
+            else:
+                self._retired.extend(self.targets)
+                self._condition.notify()
+            self.targets = targets
+
+    def close(self):
+        '''
+        Writes out what is pending and stops the writer
+        '''
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+            writer = self._writer
+        if writer is not None:
+            writer.join(5)
+        for target in self.targets:
+            target.close()
+        logging.Handler.close(self)
+
+def _console():
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(_Formatter('%(module_name)s\t%(message)s'))
+    return console
+
+_root = logging.getLogger('gado')
+_root.setLevel(logging.INFO)
+_root.propagate = False
+#Until configure() is called only the console is written to
+_handler = AsyncHandler([_console()])
+_root.addHandler(_handler)
+atexit.register(_handler.close)
+# The modules configure() gave a level of their own
+_configured = set()
+# Which process this is, when it isn't the GUI's
+_process = None
+
+def set_process(name):
+    '''
+    Names the process, so it writes gado-<name>.log next to the GUI's log
+    '''
+    global _process
+    _process = name
+
+def configure(log_level='info', log_levels=None, log_file=None, log_max_bytes=5 * 1024 * 1024,
+              log_backups=3, log_console=1, **kargs):
+    '''
+    Sets the levels and the outputs from the settings, see above
+    '''
+    _root.setLevel(_level(log_level))
+    for name in _configured:
+        get(name).setLevel(logging.NOTSET)
+    _configured.clear()
+    for name, level in (log_levels or {}).items():
+        get(name).setLevel(_level(level))
+        _configured.add(name)
+
+    targets = []
+    if int(log_console):
+        targets.append(_console())
+    if log_file is None:
+        from gado.functions import gadodir
+        log_file = os.path.join(gadodir(), 'gado.log')
+    if log_file and _process:
+        root, ext = os.path.splitext(log_file)
+        log_file = '%s-%s%s' % (root, _process, ext)
+    if log_file:
+        try:
+            rotating = logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=int(log_max_bytes), backupCount=int(log_backups))
+            rotating.setFormatter(_Formatter(
+                '%(asctime)s %(levelname)-7s %(threadName)s %(module_name)s\t%(message)s'))
+            targets.append(rotating)
+        except (IOError, OSError), e:
+            get('log').warning('not logging to %s: %s', log_file, e)
+    _handler.set_targets(targets)
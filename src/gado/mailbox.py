@@ -0,0 +1,117 @@
+'''
+A message queue that can be waited on for one type of message
+
+The GUI and the LogicThread talk over two queues of (message, arguments)
+tuples, and several threads read each of them: GuiListener, the wizard's
+listeners, ManageSets' _RefreshHelper, the dialogs waiting for a RETURN.
+fetch_from_queue used to take whatever came next off a Queue and, when it
+wasn't the message it was waiting for, put it back at the end and try
+again. Every waiting thread spun like that, messages came out in a
+different order than they went in, and the timeout was never looked at.
+
+Mailbox keeps a FIFO per message type instead, and a condition variable
+per type that the threads waiting for that type sleep on:
+
+    mailbox.put((messages.RETURN, value))
+    mailbox.receive(messages.RETURN, timeout=10)    # None after 10s
+    mailbox.receive()                               # the oldest of any type
+    mailbox.receive((messages.DISPLAY_ERROR, messages.DISPLAY_INFO))
+
+It also has the methods of Queue.Queue the code uses (put, get, empty,
+qsize), so it drops in for the two Queues main.py creates. Every put and
+fetch is counted under the mailbox's name in gado.busmetrics.
+'''
+import time
+from collections import deque
+from threading import Lock, Condition
+from Queue import Empty
+from gado.busmetrics import bus
+
+class Mailbox():
+    def __init__(self, name='mailbox'):
+        self.name = name
+        self._bus = bus()
+        self._lock = Lock()
+        # Woken for every message, receive() of any type (or of a tuple
+        # of types) sleeps on it
+        self._any = Condition(self._lock)
+        # message type -> Condition of the threads waiting for that type
+        self._waiting = dict()
+        # message type -> deque of (sequence, time put, message)
+        self._messages = dict()
+        self._sequence = 0
+        self._count = 0
+
+    def put(self, item, block=True, timeout=None):
+        with self._lock:
+            self._sequence += 1
+            self._messages.setdefault(item[0], deque()).append((self._sequence, time.time(), item))
+            self._count += 1
+            self._bus.put(self.name, item[0], self._count)
+            waiting = self._waiting.get(item[0])
+            if waiting is not None:
+                waiting.notify()
+            # They may each want different types, so all of them look
+            self._any.notify_all()
+
+    put_nowait = put
+
+    def _take(self, message):
+        if message is None or isinstance(message, (tuple, list)):
+            # The oldest message of any of the types
+            oldest = None
+            for kind, queue in self._messages.iteritems():
+                if not queue or (message is not None and kind not in message):
+                    continue
+                if oldest is None or queue[0][0] < self._messages[oldest][0][0]:
+                    oldest = kind
+            message = oldest
+        queue = self._messages.get(message)
+        if not queue:
+            return None
+        self._count -= 1
+        sequence, put, item = queue.popleft()
+        self._bus.taken(self.name, message, sequence, put, self._count)
+        return item
+
+    def receive(self, message=None, timeout=None):
+        '''
+        Takes the oldest message of type message (of any type if None, of
+        any of them if a tuple) off the mailbox, waiting for up to timeout
+        seconds (forever if None) for one to come in. Returns None if none
+        did.
+        '''
+        deadline = None if timeout is None else time.time() + timeout
+        with self._lock:
+            if message is None or isinstance(message, (tuple, list)):
+                condition = self._any
+            else:
+                condition = self._waiting.get(message)
+                if condition is None:
+                    condition = self._waiting[message] = Condition(self._lock)
+            while True:
+                item = self._take(message)
+                if item is not None:
+                    return item
+                if deadline is None:
+                    condition.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return None
+                    condition.wait(remaining)
+
+    def get(self, block=True, timeout=None):
+        item = self.receive(None, timeout if block else 0)
+        if item is None:
+            raise Empty()
+        return item
+
+    def get_nowait(self):
+        return self.get(False)
+
+    def qsize(self):
+        return self._count
+
+    def empty(self):
+        return self._count == 0
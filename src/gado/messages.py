@@ -3,6 +3,8 @@ WEIGHTED_ARTIFACT_SET_LIST = 0 # RETURN (list)
 ARTIFACT_SET_LIST = 1 # RETURN (list)
 ADD_ARTIFACT_SET_LIST = 2 # RETURN (id)
 DELETE_ARTIFACT_SET_LIST = 3 # VOID
+JOB_SUMMARY = 3.1 # RETURN (dict), argument is a job id or None for the latest
+BUS_METRICS = 3.2 # RETURN (dict), see gado.busmetrics
 
 # General robot commands
 START = 4   # shouldn't return
@@ -10,8 +12,20 @@ STOP = 5    # No return
 LAST_ARTIFACT = 6 # No return
 RESET = 7   # No return
 
+# Job queue, see gado.jobs
+ENQUEUE_JOB = 4.1 # RETURN (job id), argument is dict(artifact_set=id, settings=dict(...))
+REORDER_JOB = 4.2 # RETURN (boolean), argument is (job id, position among the queued jobs)
+CANCEL_JOB = 4.3 # RETURN (boolean), argument is a job id
+JOB_QUEUE = 4.4 # RETURN ([job dicts]), see ScanJob.describe
+CLEAR_FINISHED_JOBS = 4.5 # VOID
+JOB_MESSAGES = (ENQUEUE_JOB, REORDER_JOB, CANCEL_JOB, JOB_QUEUE, CLEAR_FINISHED_JOBS)
+# Answered while a scan job runs too, see gado.rpc for the others
+WHILE_SCANNING = JOB_MESSAGES + (ARTIFACT_SET_LIST, WEIGHTED_ARTIFACT_SET_LIST, JOB_SUMMARY,
+                                 BUS_METRICS)
+
 # Connection and pictures
 ROBOT_CONNECT = 8 # Return (boolean)
+ROBOT_CONNECTION_CHANGED = 8.1 # VOID, sent to the GUI with True (back) or False (lost)
 
 SCANNER_LISTING = 9.1 # RETURN ([scanner_names])
 SCANNER_PICTURE = 9 # RETURN (path)
@@ -21,6 +35,8 @@ WEBCAM_LISTING = 10.1 # RETURN ([webcam_names])
 WEBCAM_PICTURE = 11 # RETURN (path)
 WEBCAM_CONNECT = 12 # RETURN (boolean)
 
+REFRESH_DEVICES = 12.1 # RETURN (dict(webcams=[(number, name)], scanners=[names])), see gado.devices
+
 # Manual robot controls
 MOVE_RIGHT = 13 # RETURN (degree)
 MOVE_LEFT = 14 # RETURN (degree)
@@ -40,7 +56,7 @@ READY = 24 # VOID
 MAIN_READY = 24.1
 
 # Returning values
-RETURN = 19 # returning useful stuff (like db info)
+RETURN = 19 # returning useful stuff (like db info), (RETURN, value, request id, error) see gado.rpc
 UPDATE = 20 # providing an interface update, "Gado is currently XXXXX"
 
 # GUI Messages
@@ -0,0 +1,84 @@
+'''
+Timing of the scan loop's stages
+
+GadoSystem wraps every stage of a scan job in StageMetrics.stage(), which
+records how long it took and how much of that was spent in sleep(). The
+samples are buffered in memory and written to the stage_metrics table by
+flush(), which is only called from the GadoSystem thread.
+DBInterface.job_summary reads them back. While gado.busmetrics traces, the
+stages go in the trace too.
+'''
+import time
+from threading import Lock, local
+from contextlib import contextmanager
+from gado.busmetrics import bus
+
+# The stages of the scan loop, in the order they happen
+SNAPSHOT = 'snapshot'
+BARCODE = 'barcode'
+DB_INSERT = 'db_insert'
+PICK_UP = 'pick_up'
+PLACE = 'place'
+SCAN_TRANSFER = 'scan_transfer'
+FILE_MOVE = 'file_move'
+DROP = 'drop'
+
+STAGES = [SNAPSHOT, BARCODE, DB_INSERT, PICK_UP, PLACE, SCAN_TRANSFER,
+          FILE_MOVE, DROP]
+
+_local = local()
+
+def sleep(seconds):
+    '''
+    time.sleep that is counted against the stage running on this thread
+    '''
+    _local.slept = getattr(_local, 'slept', 0.0) + seconds
+    time.sleep(seconds)
+
+def slept():
+    '''
+    Seconds this thread has spent in sleep() so far
+    '''
+    return getattr(_local, 'slept', 0.0)
+
+class StageMetrics():
+    def __init__(self):
+        self.job = None
+        self._samples = []
+        self._lock = Lock()
+
+    def start_job(self, job):
+        with self._lock:
+            self.job = job
+            self._samples = []
+
+    def end_job(self, dbi):
+        self.flush(dbi)
+        self.job = None
+
+    @contextmanager
+    def stage(self, name, artifact=None):
+        '''
+        Times the body of the with statement as stage name
+        '''
+        started = time.time()
+        slept_before = slept()
+        try:
+            yield
+        finally:
+            sample = dict(stage=name, artifact=artifact, started=started,
+                          seconds=time.time() - started,
+                          slept=slept() - slept_before)
+            with self._lock:
+                self._samples.append(sample)
+            bus().stage(name, started, sample['seconds'], artifact)
+
+    def flush(self, dbi):
+        '''
+        Writes the buffered samples to the database
+        '''
+        with self._lock:
+            samples, self._samples = self._samples, []
+            job = self.job
+        if job is not None and samples:
+            dbi.add_stage_metrics(job, samples)
@@ -0,0 +1,80 @@
+'''
+How long the robot's arm takes to rotate
+
+A rotation of n degrees is modelled as
+
+    arm_time_overhead + n / arm_degrees_per_s
+
+The settings only give a starting point. Every move the arm reports
+finishing (see Robot._move_arm_and_wait) is added to a window of recent
+moves and the two parameters are refit to them by least squares, so the
+model follows the actual arm (load, wear, supply voltage) instead of the
+numbers someone typed in once.
+'''
+from collections import deque
+from threading import Lock
+
+class MotionModel():
+    def __init__(self, degrees_per_s=180.0/5.0, overhead=0.5, window=50,
+                 timeout_factor=2.0, timeout_margin=1.0):
+        self.degrees_per_s = float(degrees_per_s)
+        self.overhead = float(overhead)
+        # Waiting for the arm gives up after factor * predicted + margin
+        self.timeout_factor = timeout_factor
+        self.timeout_margin = timeout_margin
+        # (degrees, seconds) of recent moves
+        self.moves = deque(maxlen=window)
+        self._lock = Lock()
+
+    def predict(self, rotation):
+        '''
+        Seconds a rotation of rotation degrees should take
+        '''
+        rotation = abs(rotation)
+        if not rotation:
+            return 0.0
+        with self._lock:
+            return self.overhead + rotation / self.degrees_per_s
+
+    def timeout(self, rotation):
+        '''
+        Seconds to wait for a rotation before giving up on it
+        '''
+        return self.timeout_factor * self.predict(rotation) + self.timeout_margin
+
+    def observe(self, rotation, seconds):
+        '''
+        Adds a finished move and refits the model
+        '''
+        rotation = abs(rotation)
+        if not rotation or seconds <= 0:
+            return
+        with self._lock:
+            self.moves.append((float(rotation), float(seconds)))
+            self._fit()
+
+    def _fit(self):
+        n = len(self.moves)
+        if n < 2:
+            return
+        mean_x = sum(x for x, y in self.moves) / n
+        mean_y = sum(y for x, y in self.moves) / n
+        sxx = sum((x - mean_x) ** 2 for x, y in self.moves)
+        if sxx < 1e-9:
+            # Every move was the same size, only the overhead can be told
+            # apart from the speed we already have
+            self.overhead = max(0.0, mean_y - mean_x / self.degrees_per_s)
+            return
+        sxy = sum((x - mean_x) * (y - mean_y) for x, y in self.moves)
+        slope = sxy / sxx
+        if slope <= 0:
+            # Noise, keep what we had
+            return
+        self.degrees_per_s = 1.0 / slope
+        self.overhead = max(0.0, mean_y - slope * mean_x)
+
+    def parameters(self):
+        with self._lock:
+            return dict(arm_degrees_per_s=self.degrees_per_s,
+                        arm_time_overhead=self.overhead,
+                        moves=len(self.moves))
@@ -0,0 +1,284 @@
+'''
+Planning the robot's moves so the arm and the actuator work at once
+
+pickUpObject, scanObject and moveToOut move one axis at a time: rotate
+with the cup all the way up, run the firmware's lower-and-lift routine
+(all the way down and all the way up again), rotate, and so on. But the
+cup only has to be above the clearance height (actuator_clear_value) for
+the arm to swing, and it may already be on its way down to that height
+while the arm is still turning.
+
+TrajectoryPlanner turns the calibration points into a Plan: a list of
+phases, each a set of moves that run at the same time, the phase ending
+when its slowest move does. Times are predicted with the Robot's
+MotionModel for the arm and actuator_strokes_per_s for the actuator:
+
+    pick up  arm -> in pile   | cup -> clearance
+             cup down until it touches, pump on, cup -> clearance
+    place    arm -> scanner
+             cup -> actuator_home_value, pump off
+    drop     cup down until it touches, pump on, cup -> clearance
+             arm -> out pile
+             pump off
+
+cycle() is all three, sequential_cycle() what the Robot does without a
+planner, so their seconds give the predicted saving. Robot runs a plan as
+one frame (see gado.protocol), so the planner is only used with firmware
+that takes frames.
+
+Actuator strokes grow downwards and the sensor reads the other way round
+(ACTUATOR_UPPER_BOUNDS - stroke), like actuator_clear_value. Where the cup
+touches down is learned from telemetry through observe_floor().
+
+    python -m gado.planner [--dry-run] [--cycles N]
+
+prints the predicted cycle times and, with --dry-run, measures both on the
+simulated robot (gado.simulator).
+'''
+from gado.Robot import MOVE_ARM, MOVE_ACTUATOR, MOVE_VACUUM, DROP_ACTUATOR, \
+    LOWER_AND_LIFT, ACTUATOR_UPPER_BOUNDS
+
+# Axes a move can use
+ARM = 'arm'
+ACTUATOR = 'actuator'
+TOUCH = 'touch' # lower the cup until it touches something
+PUMP = 'pump'
+
+class Move():
+    def __init__(self, axis, target, command, seconds, tray=None):
+        self.axis = axis
+        self.target = target
+        self.command = command
+        self.seconds = seconds
+        self.tray = tray
+
+    def __repr__(self):
+        return '%s->%s (%.2fs)' % (self.axis, self.target, self.seconds)
+
+class Phase():
+    '''
+    Moves that run at the same time
+    '''
+    def __init__(self, *moves):
+        self.moves = [m for m in moves if m is not None]
+
+    @property
+    def seconds(self):
+        return max([m.seconds for m in self.moves] + [0.0])
+
+    def commands(self):
+        return [m.command for m in self.moves]
+
+class Plan():
+    def __init__(self, name, phases):
+        self.name = name
+        self.phases = [p for p in phases if p.moves]
+
+    @property
+    def seconds(self):
+        return sum(p.seconds for p in self.phases)
+
+    def __add__(self, other):
+        return Plan('%s+%s' % (self.name, other.name), self.phases + other.phases)
+
+    def batch(self):
+        '''
+        The plan as a framed protocol batch, see gado.protocol
+        '''
+        return [p.commands() for p in self.phases]
+
+    def describe(self):
+        lines = ['%s: %.2fs predicted' % (self.name, self.seconds)]
+        for phase in self.phases:
+            lines.append('  %5.2fs  %s' % (phase.seconds, ' | '.join(repr(m) for m in phase.moves)))
+        return '\n'.join(lines)
+
+class TrajectoryPlanner():
+    def __init__(self, motion, pile_stroke=230, **calibration):
+        self.motion = motion
+        # Where the cup touches down on each tray, until observe_floor knows better
+        self.floors = dict(inpile=int(pile_stroke), outpile=int(pile_stroke))
+        self.update(**calibration)
+
+    def update(self, arm_in_value=0, arm_home_value=0, arm_out_value=0,
+               actuator_up_value=20, actuator_home_value=20,
+               actuator_clear_value=200, actuator_strokes_per_s=120.0, **kwargs):
+        '''
+        Takes new calibration points (the Robot's settings)
+        '''
+        self.arm_in = int(arm_in_value or 0)
+        self.arm_home = int(arm_home_value or 0)
+        self.arm_out = int(arm_out_value or 0)
+        self.up_stroke = int(actuator_up_value or 20)
+        self.home_stroke = int(actuator_home_value or 20)
+        # Highest stroke (lowest cup) at which the arm may still swing
+        self.clear_stroke = ACTUATOR_UPPER_BOUNDS - int(actuator_clear_value or 200)
+        self.strokes_per_s = float(actuator_strokes_per_s or 120.0)
+        self.floors['scanner'] = self.home_stroke
+
+    def observe_floor(self, tray, stroke):
+        self.floors[tray] = int(stroke)
+
+    #################################################################################
+    #####                           MOVES                                       #####
+    #################################################################################
+
+    def _travel(self, frm, to):
+        return abs(to - frm) / self.strokes_per_s
+
+    def arm(self, frm, to):
+        if frm == to:
+            return None
+        return Move(ARM, to, '%s%s' % (to, MOVE_ARM), self.motion.predict(to - frm))
+
+    def actuator(self, frm, to):
+        if frm == to:
+            return None
+        return Move(ACTUATOR, to, '%s%s' % (to, MOVE_ACTUATOR), self._travel(frm, to))
+
+    def touch(self, frm, tray):
+        return Move(TOUCH, self.floors[tray], DROP_ACTUATOR,
+                    self._travel(frm, self.floors[tray]), tray=tray)
+
+    def pump(self, on):
+        return Move(PUMP, bool(on), '%s%s' % (255 if on else 0, MOVE_VACUUM), 0.0)
+
+    def _lower_and_lift(self, tray, frm):
+        '''
+        The firmware's routine, from frm all the way down and back up
+        '''
+        floor = self.floors[tray]
+        return Move(TOUCH, self.up_stroke, LOWER_AND_LIFT,
+                    self._travel(frm, floor) + self._travel(floor, self.up_stroke), tray=tray)
+
+    #################################################################################
+    #####                           PLANS                                       #####
+    #################################################################################
+
+    def pick_up(self, arm_from, actuator_from=None):
+        clear = self.clear_stroke
+        if actuator_from is None:
+            actuator_from = self.up_stroke
+        return Plan('pick_up', [
+            # The cup may come down to clearance while the arm turns
+            Phase(self.arm(arm_from, self.arm_in), self.actuator(actuator_from, clear)),
+            Phase(self.touch(clear, 'inpile')),
+            Phase(self.pump(True)),
+            Phase(self.actuator(self.floors['inpile'], clear)),
+        ])
+
+    def place(self):
+        return Plan('place', [
+            Phase(self.arm(self.arm_in, self.arm_home)),
+            Phase(self.actuator(self.clear_stroke, self.home_stroke)),
+            Phase(self.pump(False)),
+        ])
+
+    def drop(self):
+        clear = self.clear_stroke
+        return Plan('drop', [
+            Phase(self.touch(self.home_stroke, 'scanner')),
+            Phase(self.pump(True)),
+            Phase(self.actuator(self.floors['scanner'], clear)),
+            Phase(self.arm(self.arm_home, self.arm_out)),
+            Phase(self.pump(False)),
+        ])
+
+    def cycle(self, arm_from=None):
+        '''
+        Everything the robot does for one artifact, starting where the
+        last one left off
+        '''
+        if arm_from is None:
+            arm_from = self.arm_out
+        plan = self.pick_up(arm_from, self.clear_stroke) + self.place() + self.drop()
+        plan.name = 'planned cycle'
+        return plan
+
+    def sequential_cycle(self, arm_from=None):
+        '''
+        The same cycle one move at a time, like Robot does without a planner
+        '''
+        if arm_from is None:
+            arm_from = self.arm_out
+        up = self.up_stroke
+        plan = Plan('sequential cycle', [
+            Phase(self.arm(arm_from, self.arm_in)),
+            Phase(self.pump(True)),
+            Phase(self._lower_and_lift('inpile', up)),
+            Phase(self.arm(self.arm_in, self.arm_home)),
+            Phase(self.actuator(up, self.home_stroke)),
+            Phase(self.pump(False)),
+            Phase(self.pump(True)),
+            Phase(self._lower_and_lift('scanner', self.home_stroke)),
+            Phase(self.arm(self.arm_home, self.arm_out)),
+            Phase(self.pump(False)),
+        ])
+        return plan
+
+def dry_run(cycles=3, planned=True, **settings):
+    '''
+    Runs cycles pick up / place / drop cycles on the simulated robot
+
+    Returns the seconds per cycle it measured
+    '''
+    import time
+    from gado.simulator.devices import devices
+    from gado.simulator.session import SIMULATED_LAYOUT
+    s = dict(SIMULATED_LAYOUT)
+    s.update(settings)
+    s.update(sim_artifacts=cycles, sim_robot='firmware', trajectory_planner=int(planned))
+    robot, scanner, webcam = devices(**s)
+    try:
+        started = time.time()
+        for i in range(cycles):
+            robot.pickUpObject()
+            robot.scanObject()
+            robot.moveToOut()
+        seconds = (time.time() - started) / cycles
+        if robot.firmware.out_pile != range(1, cycles + 1):
+            raise Exception('Dry run: artifacts ended up in %s, dropped %s' % (
+                robot.firmware.out_pile, robot.firmware.dropped))
+        return seconds
+    finally:
+        robot.disconnect()
+        robot.firmware.stop()
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+    from gado.motion import MotionModel
+    from gado.functions import import_settings
+    from gado.default_settings import default_settings
+    from gado.simulator.session import SIMULATED_LAYOUT
+
+    parser = OptionParser(usage='%prog [--dry-run] [--cycles N]')
+    parser.add_option('--dry-run', action='store_true',
+                      help='measure both plans on the simulated robot')
+    parser.add_option('--cycles', type='int', default=3)
+    parser.add_option('--time-scale', type='float', default=1.0,
+                      help='sim_time_scale of the dry run [%default]')
+    parser.add_option('--simulated-layout', action='store_true',
+                      help='plan for the simulator\'s layout instead of gado.conf')
+    options, args = parser.parse_args()
+
+    s = default_settings()
+    if options.simulated_layout or options.dry_run:
+        s.update(SIMULATED_LAYOUT)
+    else:
+        s.update(import_settings())
+    motion = MotionModel(float(s['arm_degrees_per_s']), float(s['arm_time_overhead']))
+    planner = TrajectoryPlanner(motion, **s)
+    sequential, planned = planner.sequential_cycle(), planner.cycle()
+    print sequential.describe()
+    print planned.describe()
+    print 'predicted saving: %.2fs per artifact (%.0f%%)' % (
+        sequential.seconds - planned.seconds,
+        100.0 * (1 - planned.seconds / sequential.seconds))
+
+    if options.dry_run:
+        before = dry_run(options.cycles, False, sim_time_scale=options.time_scale)
+        after = dry_run(options.cycles, True, sim_time_scale=options.time_scale)
+        # Clock runs time_scale times faster than the wall clock
+        before, after = before / options.time_scale, after / options.time_scale
+        print 'measured: %.2fs per cycle sequential, %.2fs planned (%.0f%% faster)' % (
+            before, after, 100.0 * (1 - after / before))
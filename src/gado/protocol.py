@@ -0,0 +1,192 @@
+'''
+Sending commands to the robot's firmware
+
+The original firmware takes bare commands, an optional number followed by a
+command character ("95a", "l", ...), and never says whether it got them.
+Firmware that understands frames answers PROTOCOL_QUERY with PROTOCOL_VALUE;
+negotiate() asks and returns the protocol to use:
+
+    LegacyProtocol  - writes the bare commands, nothing is confirmed
+    FramedProtocol  - wraps one or more commands in a frame
+
+A frame is
+
+    #SS:CMD;CMD,CMD;...*CC\n
+
+SS is a sequence number and CC the sum of the bytes between '#' and '*'
+modulo 256, both as two upper case hex digits. The firmware answers with
+frames of the same shape whose payload is a single letter:
+
+    A   the frame arrived intact and is queued
+    N   the checksum was wrong, send it again
+    D   every command in the frame has finished (arm and actuator moves
+        included), the completion notice for a batch
+
+Commands separated by ';' run one after the other, commands separated by
+',' at the same time (the group is done when all of them are).
+Frames are run one after the other. A frame sent again with the same
+sequence number (because the A got lost) is acknowledged again, not run
+twice. Telemetry requests stay bare commands so they are answered while
+a batch runs.
+'''
+import time
+from threading import Lock, Event
+import gado.log
+
+log = gado.log.get('protocol')
+
+PROTOCOL_QUERY = 'q'
+PROTOCOL_VALUE = 'gado-frames/1'
+
+FRAME_START = '#'
+FRAME_END = '\n'
+
+ACK = 'A'
+NACK = 'N'
+DONE = 'D'
+
+ACK_TIMEOUT = 0.25 # seconds to wait for an A before sending again
+RETRIES = 3
+NEGOTIATE_TIMEOUT = 0.5
+
+class ProtocolError(Exception):
+    pass
+
+def checksum(body):
+    return '%02X' % (sum(ord(c) for c in body) % 256)
+
+def encode(seq, payload):
+    body = '%02X:%s' % (seq, payload)
+    return '%s%s*%s%s' % (FRAME_START, body, checksum(body), FRAME_END)
+
+def decode(frame):
+    '''
+    Returns (seq, payload) of a frame, or None if it's damaged
+    '''
+    frame = frame.strip()
+    if not frame.startswith(FRAME_START) or '*' not in frame:
+        return None
+    body, _, cs = frame[1:].rpartition('*')
+    if checksum(body) != cs.upper() or body[2:3] != ':':
+        return None
+    try:
+        return int(body[:2], 16), body[3:]
+    except ValueError:
+        return None
+
+class LegacyProtocol():
+    '''
+    Bare commands, for firmware that doesn't know about frames
+    '''
+    framed = False
+
+    def __init__(self, write):
+        self.write = write
+
+    def send(self, commands, wait=False, timeout=None):
+        '''
+        Writes the commands, returns False as nothing can be confirmed
+        '''
+        for command in commands:
+            self.write(command)
+        return False
+
+    def handle(self, frame):
+        pass
+
+class _Pending():
+    def __init__(self, frame):
+        self.frame = frame
+        self.acked = Event()
+        self.nacked = Event()
+        self.done = Event()
+
+class FramedProtocol():
+    '''
+    Frames with sequence numbers, checksums and acknowledgements
+
+    handle() is fed the frames the SerialReader finds on the line
+    '''
+    framed = True
+
+    def __init__(self, write, ack_timeout=ACK_TIMEOUT, retries=RETRIES):
+        self.write = write
+        self.ack_timeout = ack_timeout
+        self.retries = retries
+        self.resent = 0
+        self._seq = 0
+        self._pending = dict()
+        self._lock = Lock()
+
+    def _next(self, payload):
+        with self._lock:
+            seq = self._seq
+            self._seq = (self._seq + 1) % 256
+            pending = _Pending(encode(seq, payload))
+            self._pending[seq] = pending
+        return seq, pending
+
+    def send(self, commands, wait=False, timeout=None):
+        '''
+        Sends the commands as one frame, a list or tuple among them is a
+        group of commands to run at the same time
+
+        Returns once the firmware has acknowledged it or, with wait, once
+        it reports all of them done. Raises ProtocolError if the frame
+        isn't acknowledged after the retries or isn't done in timeout
+        seconds.
+        '''
+        seq, pending = self._next(';'.join(
+            ','.join(c) if isinstance(c, (list, tuple)) else c for c in commands))
+        try:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    self.resent += 1
+                pending.nacked.clear()
+                self.write(pending.frame)
+                deadline = time.time() + self.ack_timeout
+                while not pending.acked.is_set() and not pending.nacked.is_set():
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    pending.acked.wait(min(remaining, 0.01))
+                if pending.acked.is_set():
+                    break
+            else:
+                raise ProtocolError('Frame %s was not acknowledged: %r' % (seq, pending.frame))
+
+            if wait and not pending.done.wait(timeout):
+                raise ProtocolError('Frame %s did not finish within %ss' % (seq, timeout))
+            return True
+        finally:
+            # Without wait the completion notice is of no interest
+            with self._lock:
+                self._pending.pop(seq, None)
+
+    def handle(self, frame):
+        decoded = decode(frame)
+        if decoded is None:
+            log.warning('damaged frame from the robot: %r', frame)
+            return
+        seq, kind = decoded
+        with self._lock:
+            pending = self._pending.get(seq)
+        if pending is None:
+            return
+        if kind == ACK:
+            pending.acked.set()
+        elif kind == NACK:
+            pending.nacked.set()
+        elif kind == DONE:
+            pending.acked.set()
+            pending.done.set()
+
+def negotiate(write, reader, timeout=NEGOTIATE_TIMEOUT):
+    '''
+    Asks the firmware whether it takes frames and returns the protocol to use
+    '''
+    reader.clear_text()
+    write(PROTOCOL_QUERY)
+    if reader.wait_for_text(PROTOCOL_VALUE, timeout):
+        return FramedProtocol(write)
+    return LegacyProtocol(write)
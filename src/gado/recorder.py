@@ -0,0 +1,265 @@
+'''
+Recording the robot's telemetry and playing it back
+
+RobotData samples only live in the Robot's TelemetryBuffer until newer
+ones push them out. With the telemetry_log setting pointing at a file,
+every sample the SerialReader parses is also appended to that file as a
+fixed-width binary record:
+
+    header   MAGIC, then the struct format of a record
+    record   received (double) and FIELDS (signed shorts, MISSING for None)
+
+That is 22 bytes a sample instead of the ~150 of the JSON, so a whole day
+of scanning fits in a few megabytes. TelemetryLog maps a log into memory
+for analysis without reading it all in:
+
+    log = TelemetryLog('telemetry.bin')
+    len(log), log.duration(), log[-1].arm_pos
+    arm = log.column('arm_pos')
+
+ReplayConnection stands in for the serial line and feeds a log back to a
+Robot at the pace it was recorded, so the waits in lift() and
+_move_arm_and_wait() see the same samples at the same moments they did
+in the recorded session. replay() hooks one up:
+
+    robot = replay('telemetry.bin')
+    robot.pickUpObject()
+    robot.serialConnection.written    # what the Robot sent, and when
+
+    python -m gado.recorder LOG [--replay N] [--speed X]
+
+prints a summary of a log and, with --replay, times N pick up / scan /
+out cycles against it.
+'''
+import os, json, mmap, struct, time
+from array import array
+from threading import Lock
+from gado.RobotData import RobotData
+
+MAGIC = 'GADOTLM1'
+FIELDS = ('arm_pos', 'actuator_pos_d', 'actuator_pos_s', 'pump_level',
+          'light_value', 'last_level', 'pump_current')
+RECORD = struct.Struct('<d%dh' % len(FIELDS))
+HEADER = struct.Struct('<8s16s')
+# Stands in for a field the firmware left out (or sent as null)
+MISSING = -32768
+
+class TelemetryRecorder():
+    '''
+    Appends RobotData samples to a log file
+
+    Written by the SerialReader's thread, so a record costs a struct pack
+    and a buffered write. flush() or close() to get it onto the disk.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.recorded = 0
+        self._lock = Lock()
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(HEADER.pack(MAGIC, RECORD.format))
+
+    def append(self, sample):
+        values = []
+        for name in FIELDS:
+            value = getattr(sample, name)
+            values.append(MISSING if value is None else max(MISSING + 1, min(int(value), 32767)))
+        record = RECORD.pack(sample.received or time.time(), *values)
+        with self._lock:
+            if self.file is None:
+                return
+            self.file.write(record)
+            self.recorded += 1
+
+    def flush(self):
+        with self._lock:
+            if self.file is not None:
+                self.file.flush()
+
+    def close(self):
+        with self._lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+class TelemetryLog():
+    '''
+    A telemetry log mapped into memory, indexed like a list of RobotData
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        if size < HEADER.size:
+            raise ValueError('%s is not a telemetry log' % path)
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, format = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or format.rstrip('\0') != RECORD.format:
+            self.close()
+            raise ValueError('%s is not a telemetry log' % path)
+        # A record the recorder is still writing doesn't count yet
+        self.count = (size - HEADER.size) // RECORD.size
+
+    def __len__(self):
+        return self.count
+
+    def record(self, i):
+        '''
+        The raw (received, arm_pos, ...) tuple of record i
+        '''
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError('telemetry record %s out of range' % i)
+        return RECORD.unpack_from(self.map, HEADER.size + i * RECORD.size)
+
+    def __getitem__(self, i):
+        return self._sample(self.record(i))
+
+    def __iter__(self):
+        for i in xrange(self.count):
+            yield self[i]
+
+    def _sample(self, record):
+        sample = RobotData()
+        sample.received = record[0]
+        for name, value in zip(FIELDS, record[1:]):
+            setattr(sample, name, None if value == MISSING else value)
+        sample.raw = json.dumps(dict((name, getattr(sample, name)) for name in FIELDS))
+        return sample
+
+    def column(self, name):
+        '''
+        One field of every record, as an array ('d' for received, 'h' else)
+        '''
+        index = 0 if name == 'received' else FIELDS.index(name) + 1
+        values = array('d' if index == 0 else 'h')
+        for offset in xrange(HEADER.size, HEADER.size + self.count * RECORD.size, RECORD.size):
+            values.append(RECORD.unpack_from(self.map, offset)[index])
+        return values
+
+    def duration(self):
+        if self.count < 2:
+            return 0.0
+        return self.record(-1)[0] - self.record(0)[0]
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+class ReplayConnection():
+    '''
+    A serial connection that plays a TelemetryLog back
+
+    Samples come out at the offsets they were recorded at (divided by
+    speed), counted from the first read. The handshake is answered, every
+    other write only ends up in written as (seconds since the start,
+    data). Nothing answers the protocol query, so the Robot uses bare
+    commands.
+    '''
+    def __init__(self, log, speed=1.0):
+        from gado.Robot import HANDSHAKE, HANDSHAKE_VALUE
+        self.log = log
+        self.speed = float(speed)
+        self.timeout = 0.05
+        self.written = []
+        self.started = None
+        self.open = True
+        self._handshake = (HANDSHAKE, HANDSHAKE_VALUE)
+        self._next = 0
+        self._pending = ''
+        self._first = log.record(0)[0] if len(log) else 0.0
+
+    def _elapsed(self):
+        if self.started is None:
+            self.started = time.time()
+        return (time.time() - self.started) * self.speed
+
+    def finished(self):
+        return self._next >= len(self.log)
+
+    def _due(self):
+        elapsed = self._elapsed()
+        while self._next < len(self.log):
+            record = self.log.record(self._next)
+            if record[0] - self._first > elapsed:
+                break
+            self._pending += self.log._sample(record).raw
+            self._next += 1
+
+    def inWaiting(self):
+        self._due()
+        return len(self._pending)
+
+    def read(self, size=1):
+        deadline = time.time() + (self.timeout or 0)
+        while True:
+            self._due()
+            if self._pending or not self.open or time.time() >= deadline:
+                break
+            time.sleep(0.005)
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def write(self, data):
+        self.written.append((self._elapsed() / self.speed, data))
+        if data == self._handshake[0]:
+            self._pending += self._handshake[1]
+
+    def flush(self):
+        pass
+
+    def flushInput(self):
+        self._pending = ''
+
+    def isOpen(self):
+        return self.open
+
+    def close(self):
+        self.open = False
+
+def replay(path, robot=None, speed=1.0, **settings):
+    '''
+    Attaches robot (a new Robot with settings if None) to a
+    ReplayConnection playing the log at path, and returns the robot
+    '''
+    if robot is None:
+        from gado.Robot import Robot
+        robot = Robot(**settings)
+    robot.serial_protocol = 'legacy'
+    robot.attach(ReplayConnection(TelemetryLog(path), speed))
+    return robot
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+    from gado.functions import import_settings
+
+    parser = OptionParser(usage='%prog LOG [--replay N] [--speed X]')
+    parser.add_option('--replay', type='int', default=0, metavar='N',
+                      help='time N pick up / scan / out cycles against the log')
+    parser.add_option('--speed', type='float', default=1.0,
+                      help='how much faster than recorded to play it [%default]')
+    options, args = parser.parse_args()
+    if len(args) != 1:
+        parser.error('which log?')
+
+    log = TelemetryLog(args[0])
+    print '%s: %s samples over %.1fs (%.1f/s)' % (
+        args[0], len(log), log.duration(), len(log) / (log.duration() or 1))
+    for name in FIELDS:
+        values = [v for v in log.column(name) if v != MISSING]
+        if values:
+            print '  %-15s %6s .. %-6s' % (name, min(values), max(values))
+
+    if options.replay:
+        robot = replay(args[0], speed=options.speed, **import_settings())
+        for i in range(options.replay):
+            for step in (robot.pickUpObject, robot.scanObject, robot.moveToOut):
+                started = time.time()
+                try:
+                    step()
+                except Exception, e:
+                    print 'cycle %s %s failed: %s' % (i + 1, step.__name__, e)
+                print 'cycle %s %-13s %.2fs' % (i + 1, step.__name__,
+                                               (time.time() - started) * options.speed)
+        robot.disconnect()
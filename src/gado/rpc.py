@@ -0,0 +1,155 @@
+'''
+Requests to the GadoSystem that wait for its answer
+
+The GUI used to send a request like WEIGHTED_ARTIFACT_SET_LIST and then
+take the next RETURN off its queue, whoever it was meant for. With two
+requests out at once (a dialog refreshing while the main window fills its
+dropdown) each could get the other's answer, so every caller had to wait
+for the one before it.
+
+A request sent with call() carries an id as the third item of its tuple,
+and the GadoSystem answers it with a RETURN carrying the same id:
+
+    (messages.ARTIFACT_SET_LIST, None, 7)
+    (messages.RETURN, [(1, 'Letters')], 7, None)
+
+The last item is the error message when the request failed. The client's
+router thread takes the RETURNs off the queue and hands each to the Future
+of its request, so any number of requests can be out at once:
+
+    sets = client(q_out, q_in).call(messages.ARTIFACT_SET_LIST)
+    robot = client(q_out, q_in).call(messages.ROBOT_CONNECT)
+    sets.result(timeout=10)     # None if no answer came within 10s
+
+Requests sent with add_to_queue carry no id and are not answered.
+'''
+import itertools
+from threading import Thread, Lock, Event
+from gado.functions import fetch_from_queue
+import gado.messages as messages
+import gado.log
+
+log = gado.log.get('rpc')
+
+class RpcError(Exception):
+    '''
+    The GadoSystem could not answer a request
+    '''
+    pass
+
+def request_id(msg):
+    '''
+    The id of the request msg, None if it was not sent with call()
+    '''
+    return msg[2] if len(msg) > 2 else None
+
+def reply(q, msg, value=None, error=None):
+    '''
+    Answers the request msg on q, if it was sent with call()
+    '''
+    if request_id(msg) is not None:
+        q.put((messages.RETURN, value, request_id(msg), error))
+
+class Future():
+    '''
+    The answer to one request, once it has come
+    '''
+    def __init__(self, message):
+        self.message = message
+        self.value = None
+        self.error = None
+        self._done = Event()
+        self._lock = Lock()
+        self._callbacks = []
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        '''
+        The answer, waiting up to timeout seconds (forever if None) for it.
+        Returns None if it didn't come, raises RpcError if the request failed.
+        '''
+        if not self._done.wait(timeout):
+            log.warning('no answer to %s within %ss', self.message, timeout)
+            return None
+        if self.error is not None:
+            raise RpcError(self.error)
+        return self.value
+
+    def add_done_callback(self, callback):
+        '''
+        Calls callback with the future once the answer has come, on the
+        router thread (right away if it is already here)
+        '''
+        with self._lock:
+            if not self.done():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _set(self, value, error):
+        with self._lock:
+            self.value = value
+            self.error = error
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception, e:
+                log.warning('callback for %s failed: %s', self.message, e)
+
+class RpcClient():
+    def __init__(self, q_out, q_in):
+        # Requests go out on q_out, the RETURNs come back on q_in
+        self.q_out = q_out
+        self.q_in = q_in
+        self._lock = Lock()
+        self._ids = itertools.count(1)
+        # request id -> Future of the requests not answered yet
+        self._pending = dict()
+        self._router = None
+
+    def call(self, message, arguments=None):
+        '''
+        Sends the request, returns the Future of its answer
+        '''
+        future = Future(message)
+        with self._lock:
+            number = next(self._ids)
+            self._pending[number] = future
+            if self._router is None:
+                self._router = Thread(target=self._route, name='rpc-router')
+                self._router.daemon = True
+                self._router.start()
+        log.debug('request %s: %s %s', number, message, arguments)
+        self.q_out.put((message, arguments, number))
+        return future
+
+    def pending(self):
+        return len(self._pending)
+
+    def _route(self):
+        while True:
+            msg = fetch_from_queue(self.q_in, messages.RETURN)
+            with self._lock:
+                future = self._pending.pop(request_id(msg), None)
+            if future is None:
+                log.warning('nobody is waiting for %s, dropping it', str(msg))
+                continue
+            future._set(msg[1], msg[3] if len(msg) > 3 else None)
+
+_clients = dict()
+_clients_lock = Lock()
+
+def client(q_out, q_in):
+    '''
+    The RpcClient of the queues, one per pair so only one router takes the
+    RETURNs off q_in
+    '''
+    with _clients_lock:
+        key = (id(q_out), id(q_in))
+        if key not in _clients:
+            _clients[key] = RpcClient(q_out, q_in)
+        return _clients[key]
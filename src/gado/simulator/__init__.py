@@ -0,0 +1,25 @@
+'''
+Simulated Gado hardware
+
+Set 'simulated' to 1 in the settings and GadoSystem.load() uses these
+devices instead of the robot, the scanner and the webcam, so the scan
+loop can be run (and timed) on any machine. 'sim_artifacts' sets how many
+artifacts are in the simulated in pile ('5,3' stacks two piles with a
+separator sheet between them).
+
+The parts:
+    firmware - FakeFirmware, the Gado serial protocol on a pty (POSIX only)
+               for the real Robot class to talk to
+    devices  - the in pile, a stand-in scanner and webcam (and a Robot
+               that needs no serial line at all)
+    images   - the PNG files the scanner and webcam "take"
+    clock    - simulated time, sim_time_scale speeds up long runs
+
+    python -m gado.simulator.session [artifacts] [time_scale]
+
+runs one scan job and prints how long it took.
+'''
+from gado.simulator.devices import ArtifactStack, SimulatedRobot, \
+    SimulatedScanner, SimulatedWebcam, devices
+# gado.simulator.firmware needs a pty, import it directly where there is one
+from gado.simulator.clock import Clock
@@ -0,0 +1,20 @@
+import time
+
+class Clock():
+    '''
+    Sleeps for simulated durations, scaled by the sim_time_scale setting
+
+    A scale of 0.1 runs the simulation ten times faster than the hardware.
+    '''
+    def __init__(self, sim_time_scale=1.0, **kwargs):
+        self.scale = float(sim_time_scale)
+    
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds * self.scale)
+    
+    def now(self):
+        '''
+        Simulated seconds since the epoch
+        '''
+        return time.time() / self.scale if self.scale else time.time()
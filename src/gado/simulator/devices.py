@@ -0,0 +1,280 @@
+'''
+Stand-in devices for running the scan loop without any hardware
+
+They take the same calls GadoSystem makes on the real Robot, Scanner and
+Webcam, and sleep for about as long as the real hardware takes. All of
+them share an ArtifactStack, so the robot taking an artifact off the in
+pile is what the webcam sees next.
+
+Durations come from the settings (simulated seconds, see Clock):
+    arm_degrees_per_s, arm_time_overhead  - arm rotation
+    sim_lift_time                         - lower, grab and lift
+    sim_drop_time                         - lowering onto the scanner
+    sim_frame_time                        - one webcam frame
+    sim_barcode_time                      - barcode check
+    sim_scan_time                         - scan pass of the scanner
+    sim_transfer_rate                     - scanner transfer, bytes/s
+Image sizes:
+    scanner_dpi, sim_page_width, sim_page_height (inches)
+    sim_webcam_width, sim_webcam_height (pixels)
+
+With the sim_robot setting at 'firmware' (the default when pyserial is
+installed) the real Robot class talks to a FakeFirmware over a pty,
+otherwise SimulatedRobot stands in for it.
+'''
+from gado.Robot import Robot
+import gado.Robot
+from gado.simulator.clock import Clock
+from gado.Webcam import SETTLE_FRAMES
+from gado.simulator.images import write_png, read_barcode
+
+END_OF_STACK = 'project gado'
+# What the robot holds after picking up a separator sheet
+SEPARATOR = 'separator'
+
+class ArtifactStack():
+    '''
+    The in pile: a number of artifacts with the end of stack sheet under them
+
+    artifacts may also be a list of piles (or a string like '5,3'), stacked
+    with a separator sheet between them. Separators print the end of stack
+    barcode, the way gado.jobs expects them, unless a barcode is given
+    before the pile: '5,gado set:Letters,3'.
+    '''
+    def __init__(self, artifacts=10):
+        if isinstance(artifacts, basestring):
+            artifacts = artifacts.split(',')
+        if not isinstance(artifacts, (list, tuple)):
+            artifacts = [artifacts]
+        # (barcode of the separator on top, artifacts) of each pile
+        self.piles = []
+        barcode = END_OF_STACK
+        for item in artifacts:
+            if isinstance(item, basestring) and not item.strip().isdigit():
+                barcode = str(item.strip())
+                continue
+            self.piles.append((barcode, int(item)))
+            barcode = END_OF_STACK
+        self.remaining = self.piles.pop(0)[1]
+        self.taken = 0
+        self.separators = 0
+
+    def at_end(self):
+        '''
+        Whether the webcam sees a barcode, under the last pile or between two
+        '''
+        return self.remaining <= 0
+
+    def barcode(self):
+        '''
+        The barcode the webcam sees, or None
+        '''
+        if not self.at_end():
+            return None
+        return self.piles[0][0] if self.piles else END_OF_STACK
+
+    def can_take(self):
+        return not self.at_end() or bool(self.piles)
+
+    def take(self):
+        if self.at_end():
+            if not self.piles:
+                raise Exception('Simulator: the robot tried to pick up the end of stack sheet')
+            self.remaining = self.piles.pop(0)[1]
+            self.separators += 1
+            return SEPARATOR
+        self.remaining -= 1
+        self.taken += 1
+        return self.taken
+
+class SimulatedRobot(Robot):
+    '''
+    A Robot without a serial line that sleeps for each motion
+    '''
+    def __init__(self, stack, sim_lift_time=1.5, sim_drop_time=1.0, **kwargs):
+        Robot.__init__(self, **kwargs)
+        self.stack = stack
+        self.clock = Clock(**kwargs)
+        self.lift_time = float(sim_lift_time)
+        self.drop_time = float(sim_drop_time)
+        self.holding = None
+        self.placed = None
+        self.vacuum = False
+
+    def connect(self, port=None):
+        return True
+
+    def connected(self):
+        return True
+
+    def disconnect(self):
+        pass
+
+    def clearSerialBuffers(self):
+        pass
+
+    def returnGadoInfo(self):
+        return ''
+
+    def _moveArm(self, degree):
+        degree = max(0, min(degree, gado.Robot.ARM_UPPER_BOUNDS))
+        self.clock.sleep(self._sleeptime(degree))
+        self.current_arm_value = degree
+        return degree
+
+    def _move_arm_and_wait(self, degree):
+        # _moveArm already takes as long as the move
+        self._moveArm(degree)
+
+    def _moveActuator(self, stroke):
+        self.current_actuator_value = int(max(0, min(stroke, gado.Robot.ACTUATOR_UPPER_BOUNDS)))
+        return self.current_actuator_value
+
+    def _vacuumOn(self, value):
+        self.vacuum = bool(value)
+        if not self.vacuum:
+            self.holding = None
+
+    def lift(self):
+        self._vacuumOn(True)
+        self.clock.sleep(self.lift_time)
+        if self.current_arm_value == self.arm_in_value and self.holding is None:
+            self.holding = self.stack.take()
+
+    def scanObject(self):
+        self._move_arm_and_wait(self.arm_home_value)
+        self._moveActuator(self.actuator_home_value)
+        self.clock.sleep(self.drop_time)
+        # The artifact stays on the glass, the cup lets go of it
+        self.placed = self.holding
+        self._vacuumOn(False)
+        return True
+
+    def moveToOut(self):
+        self.lift()
+        self.holding, self.placed = self.placed, None
+        self._move_arm_and_wait(self.arm_out_value)
+        self._vacuumOn(0)
+        return True
+
+class SimulatedScanner():
+    '''
+    A Scanner whose transfers take sim_scan_time plus the time to move the
+    image over at sim_transfer_rate
+    '''
+    def __init__(self, scanner_dpi=150, sim_page_width=8.5, sim_page_height=11.0,
+                 sim_scan_time=8.0, sim_transfer_rate=8000000, **kwargs):
+        self.clock = Clock(**kwargs)
+        self.scanDpi = int(scanner_dpi)
+        self.width = int(float(sim_page_width) * self.scanDpi)
+        self.height = int(float(sim_page_height) * self.scanDpi)
+        self.scan_time = float(sim_scan_time)
+        self.transfer_rate = float(sim_transfer_rate)
+        self.scans = 0
+
+    def connected(self):
+        return True
+
+    def connectToScanner(self):
+        return True
+
+    def connectToScannerGui(self):
+        return True
+
+    def setDPI(self, dpi):
+        self.scanDpi = int(dpi)
+
+    def scanImage(self, imageName, overwrite=True):
+        raw_bytes = self.width * self.height
+        self.clock.sleep(self.scan_time + raw_bytes / self.transfer_rate)
+        write_png(imageName, self.width, self.height)
+        self.scans += 1
+        return True
+
+class SimulatedWebcam():
+    '''
+    A Webcam looking at the top of the in pile
+
+    The end of stack sheet shows up as a barcode in the picture, which
+    check_for_barcode reads back.
+    '''
+    def __init__(self, stack, sim_webcam_width=640, sim_webcam_height=480,
+                 sim_frame_time=0.07, sim_barcode_time=0.3, webcam_stream=1, **kwargs):
+        self.stack = stack
+        self.streaming = bool(int(webcam_stream))
+        self.clock = Clock(**kwargs)
+        self.width = int(sim_webcam_width)
+        self.height = int(sim_webcam_height)
+        self.frame_time = float(sim_frame_time)
+        self.barcode_time = float(sim_barcode_time)
+        self.device = True
+
+    def options(self, device_name=None, device_number=None):
+        return [(0, 'Simulated webcam')]
+
+    def connect(self, device_name=None, device_number=None):
+        self.device = True
+
+    def refresh(self):
+        pass
+
+    def disconnect(self):
+        self.device = None
+
+    def connected(self):
+        return self.device is not None
+
+    def savePicture(self, path, iterations=15):
+        barcode = self.stack.barcode()
+        if self.streaming:
+            # Like a streaming Webcam, the exposure settles over
+            # SETTLE_FRAMES frames and only the last one is written
+            self.clock.sleep(self.frame_time * SETTLE_FRAMES)
+            write_png(path, self.width, self.height, barcode)
+            return
+        # Like Webcam.savePicture, one file per frame while the exposure settles
+        for i in range(iterations):
+            self.clock.sleep(self.frame_time)
+            write_png(path, self.width, self.height, barcode)
+
+    def read_barcode(self, image_path):
+        '''
+        Same contract as gado.functions.read_barcode
+        '''
+        self.clock.sleep(self.barcode_time)
+        return read_barcode(image_path)
+
+    def check_for_barcode(self, image_path, code=END_OF_STACK):
+        '''
+        Same contract as gado.functions.check_for_barcode
+        '''
+        output = self.read_barcode(image_path)
+        return (len(output) > 0) and (output.find(code) >= 0)
+
+def devices(sim_artifacts=10, sim_robot=None, **settings):
+    '''
+    Returns a (robot, scanner, webcam) tuple sharing one in pile
+    '''
+    stack = ArtifactStack(sim_artifacts)
+    if sim_robot is None:
+        sim_robot = 'firmware' if gado.Robot.serial else 'inprocess'
+
+    if sim_robot == 'firmware':
+        from gado.simulator.firmware import FakeFirmware
+        if not int(settings.get('pump_sealed_current') or 0):
+            #Between the fake firmware's open and sealed currents
+            settings['pump_sealed_current'] = (int(settings.get('sim_pump_current_open', 310)) +
+                                               int(settings.get('sim_pump_current_sealed', 420))) // 2
+        firmware = FakeFirmware(stack, **settings)
+        firmware.start()
+        robot = Robot(**settings)
+        robot.firmware = firmware
+        robot.stack = stack
+        if not robot.connect(firmware.port):
+            raise Exception('Simulator: unable to connect to the fake firmware on %s' % firmware.port)
+    else:
+        robot = SimulatedRobot(stack, **settings)
+
+    return (robot,
+            SimulatedScanner(**settings),
+            SimulatedWebcam(stack, **settings))
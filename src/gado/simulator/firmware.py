@@ -0,0 +1,411 @@
+'''
+A fake Gado firmware behind a pseudo terminal
+
+FakeFirmware opens a pty and answers the serial protocol of gado.Robot on
+it, so the real Robot class (and pyserial) can be pointed at port and
+driven exactly like it drives the Arduino:
+
+    firmware = FakeFirmware(stack)
+    firmware.start()
+    robot = Robot(**settings)
+    robot.connect(firmware.port)
+
+Commands are an optional number followed by a command character:
+    h           handshake, answers HANDSHAKE_VALUE
+    <deg>a      rotate the arm
+    <stroke>s   move the actuator (bigger strokes are lower)
+    <level>v    pump on (non zero) or off
+    d           telemetry, one JSON object as read by RobotData.processJSON
+    p           lower the actuator until the cup touches something
+    l           lower, turn the pump on and lift
+    2           lower, let go of the artifact and lift (place on scanner)
+    3           let go of the artifact (drop on out pile)
+    4           let go, lift and rotate to 0 (reset to home)
+    q           answers PROTOCOL_VALUE, unless sim_framed is 0
+
+Outside of frames commands are handled one at a time, like the sketch's
+loop() does: the routines (p, l, 2 and 4) hold up the commands after them,
+telemetry requests too, until they are done.
+
+And, unless sim_framed is 0, the frames of gado.protocol. The commands in a
+frame run one after the other, each until its motion has finished.
+sim_frame_error_rate is the share of frames that arrive damaged (and are
+answered with N).
+
+The actuator sensor (actuator_pos_s) reads the other way round from the
+stroke, so Robot.lift's "actuator_pos_s > actuator_clear_value" is true
+once the cup is high enough to swing the arm.
+
+Motion timing comes from the settings (simulated seconds, see Clock):
+    arm_degrees_per_s, arm_time_overhead   - arm rotation, unless
+    sim_arm_degrees_per_s, sim_arm_time_overhead
+                                           - give the arm a speed of its
+                                             own (to check the Robot's
+                                             MotionModel learns it)
+    sim_strokes_per_s                      - actuator travel
+    sim_in_stroke, sim_scanner_stroke,
+    sim_out_stroke                         - where the cup touches down
+    sim_pump_current_open/_sealed          - pump current without/with
+                                             an artifact on the cup
+    sim_pick_miss_rate                     - share of picks from the in
+                                             pile that come up empty
+'''
+import os, pty, tty, json, select, random, Queue
+from threading import Thread, Lock
+from gado.Robot import HANDSHAKE, HANDSHAKE_VALUE, MOVE_ARM, MOVE_ACTUATOR, \
+    MOVE_VACUUM, RETURN_CURRENT_SETTINGS, DROP_ACTUATOR, LOWER_AND_LIFT, \
+    PLACE_ON_SCANNER, DROP_ON_OUT_PILE, RESET_TO_HOME, \
+    ACTUATOR_UPPER_BOUNDS, ARM_UPPER_BOUNDS
+from gado.protocol import PROTOCOL_QUERY, PROTOCOL_VALUE, FRAME_START, \
+    FRAME_END, ACK, NACK, DONE, encode, decode
+from gado.simulator.clock import Clock
+
+# Where the firmware's own routines retract the actuator to
+FIRMWARE_UP_STROKE = 20
+
+# How close (in degrees) the arm has to be to a tray to be over it
+TRAY_TOLERANCE = 5
+
+# The commands that run a routine on the firmware
+ROUTINES = (DROP_ACTUATOR, LOWER_AND_LIFT, PLACE_ON_SCANNER, RESET_TO_HOME)
+
+class _Axis():
+    '''
+    One motor, moving at a constant speed after a fixed start up delay
+    '''
+    def __init__(self, clock, position, speed, overhead=0.0):
+        self.clock = clock
+        self.speed = float(speed)
+        self.overhead = float(overhead)
+        self.start = self.target = float(position)
+        self.started = self.arrives = clock.now()
+
+    def position(self):
+        now = self.clock.now()
+        if now >= self.arrives:
+            return self.target
+        if now <= self.started:
+            return self.start
+        travelled = (now - self.started) * self.speed
+        if self.target < self.start:
+            travelled = -travelled
+        return self.start + travelled
+
+    def move(self, target):
+        position = self.position()
+        self.start = position
+        self.target = float(target)
+        self.started = self.clock.now() + (self.overhead if target != position else 0)
+        self.arrives = self.started + abs(self.target - position) / self.speed
+
+    def remaining(self):
+        return max(0.0, self.arrives - self.clock.now())
+
+class FakeFirmware(Thread):
+    def __init__(self, stack, arm_in_value=0, arm_home_value=0, arm_out_value=0,
+                 arm_degrees_per_s=36.0, arm_time_overhead=0.5,
+                 sim_arm_degrees_per_s=None, sim_arm_time_overhead=None,
+                 sim_strokes_per_s=120.0, sim_in_stroke=210,
+                 sim_scanner_stroke=180, sim_out_stroke=230,
+                 sim_pump_current_open=310, sim_pump_current_sealed=420,
+                 sim_light_value=512, sim_framed=1, sim_frame_error_rate=0.0,
+                 sim_pick_miss_rate=0.0, **kwargs):
+        Thread.__init__(self, name='FakeFirmware')
+        self.daemon = True
+        self.stack = stack
+        self.clock = Clock(**kwargs)
+
+        if sim_arm_degrees_per_s is not None:
+            arm_degrees_per_s = sim_arm_degrees_per_s
+        if sim_arm_time_overhead is not None:
+            arm_time_overhead = sim_arm_time_overhead
+        self.arm = _Axis(self.clock, 0, arm_degrees_per_s, arm_time_overhead)
+        self.actuator = _Axis(self.clock, FIRMWARE_UP_STROKE, sim_strokes_per_s)
+        self.pump_level = 0
+        self.last_level = 0
+        self.pump_current_open = int(sim_pump_current_open)
+        self.pump_current_sealed = int(sim_pump_current_sealed)
+        self.light_value = int(sim_light_value)
+        self.pick_miss_rate = float(sim_pick_miss_rate)
+        self.missed_picks = 0
+
+        # tray name, arm position, stroke at which the cup touches down
+        self.trays = [('in', int(arm_in_value or 0), int(sim_in_stroke)),
+                      ('scanner', int(arm_home_value or 0), int(sim_scanner_stroke)),
+                      ('out', int(arm_out_value or 0), int(sim_out_stroke))]
+
+        # Where the artifacts are
+        self.holding = None
+        self.on_scanner = None
+        self.out_pile = []
+        self.dropped = []
+
+        self.framed = bool(int(sim_framed))
+        self.frame_error_rate = float(sim_frame_error_rate)
+        self.frames = 0
+        self.damaged_frames = 0
+        # Sequence number and answers of the last frame, to answer a resent
+        # frame again without running it twice
+        self._last_frame = None
+        self._batches = Queue.Queue()
+
+        self.commands = 0
+        self._running = False
+        self._routine = None
+        self._lock = Lock()
+        self._write_lock = Lock()
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+
+    def stop(self):
+        self._running = False
+
+    def run(self):
+        self._running = True
+        batches = Thread(target=self._run_batches, name='FakeFirmware-batches')
+        batches.daemon = True
+        batches.start()
+        argument = ''
+        frame = None
+        while self._running:
+            ready, _, _ = select.select([self.master], [], [], 0.1)
+            if not ready:
+                continue
+            try:
+                data = os.read(self.master, 1024)
+            except OSError:
+                break
+            for c in data:
+                if frame is not None:
+                    frame += c
+                    if c == FRAME_END:
+                        self._frame(frame)
+                        frame = None
+                    continue
+                if c == FRAME_START and self.framed:
+                    frame = c
+                    continue
+                if c.isdigit() or c == '-':
+                    argument += c
+                    continue
+                self.commands += 1
+                self._command(c, int(argument) if argument.strip('-') else None,
+                              wait=c in ROUTINES)
+                argument = ''
+        self._batches.put(None)
+        os.close(self.master)
+        os.close(self.slave)
+
+    def _write(self, data):
+        with self._write_lock:
+            try:
+                os.write(self.master, data)
+            except OSError:
+                # stop() closed the pty under a running routine
+                if self._running:
+                    raise
+
+    #################################################################################
+    #####                           FRAMES                                      #####
+    #################################################################################
+
+    def _frame(self, frame):
+        self.frames += 1
+        decoded = decode(frame)
+        if decoded is None or random.random() < self.frame_error_rate:
+            self.damaged_frames += 1
+            try:
+                self._write(encode(int(frame[1:3], 16), NACK))
+            except ValueError:
+                pass # Not even the sequence number made it, the sender will time out
+            return
+        seq, payload = decoded
+        last = self._last_frame
+        if last is not None and last['seq'] == seq:
+            # The ack got lost, say it again
+            self._write(encode(seq, DONE if last['done'] else ACK))
+            return
+        self._last_frame = dict(seq=seq, done=False)
+        self._write(encode(seq, ACK))
+        self._batches.put((self._last_frame, payload))
+
+    def _run_batches(self):
+        while True:
+            item = self._batches.get()
+            if item is None:
+                return
+            state, payload = item
+            for group in payload.split(';'):
+                self._run_group(group.split(','))
+            state['done'] = True
+            self._write(encode(state['seq'], DONE))
+
+    def _run_group(self, commands):
+        '''
+        Runs commands at the same time, returns when all have finished
+        '''
+        routines = []
+        for command in commands:
+            argument = command[:-1]
+            argument = int(argument) if argument.strip('-') else None
+            self.commands += 1
+            if len(commands) == 1:
+                self._command(command[-1:], argument, wait=True)
+                return
+            self._command(command[-1:], argument)
+            if self._routine is not None and self._routine.is_alive():
+                routines.append(self._routine)
+        for routine in routines:
+            routine.join()
+        self.clock.sleep(max(self.arm.remaining(), self.actuator.remaining()))
+
+    #################################################################################
+    #####                           COMMANDS                                    #####
+    #################################################################################
+
+    def _command(self, c, argument, wait=False):
+        '''
+        Runs a command, with wait until it has finished
+        '''
+        if c == HANDSHAKE:
+            self._write(HANDSHAKE_VALUE)
+        elif c == PROTOCOL_QUERY and self.framed:
+            self._write(PROTOCOL_VALUE)
+        elif c == RETURN_CURRENT_SETTINGS:
+            self._write(json.dumps(self.telemetry()))
+        elif c == MOVE_ARM and argument is not None:
+            self.arm.move(max(0, min(argument, ARM_UPPER_BOUNDS)))
+            if wait:
+                self._wait(self.arm)
+        elif c == MOVE_ACTUATOR and argument is not None:
+            self._move_actuator(argument)
+            if wait:
+                self._wait(self.actuator)
+        elif c == MOVE_VACUUM:
+            self._pump(argument or 0)
+        elif c == DROP_ACTUATOR:
+            self._run_routine(self._lower, wait)
+        elif c == LOWER_AND_LIFT:
+            self._run_routine(self._lower_and_lift, wait)
+        elif c == PLACE_ON_SCANNER:
+            self._run_routine(self._place, wait)
+        elif c == DROP_ON_OUT_PILE:
+            self._pump(0)
+        elif c == RESET_TO_HOME:
+            self._run_routine(self._reset, wait)
+        # Anything else is ignored, like the real firmware does
+
+    def telemetry(self):
+        stroke = int(round(self.actuator.position()))
+        return dict(arm_pos=int(round(self.arm.position())),
+                    actuator_pos_d=int(self.actuator.target),
+                    actuator_pos_s=ACTUATOR_UPPER_BOUNDS - stroke,
+                    pump_level=self.pump_level,
+                    light_value=self.light_value,
+                    last_level=self.last_level,
+                    pump_current=self._pump_current())
+
+    def _pump_current(self):
+        if not self.pump_level:
+            return 0
+        current = self.pump_current_open if self.holding is None else self.pump_current_sealed
+        return current + random.randint(-5, 5)
+
+    #################################################################################
+    #####                           PHYSICS                                     #####
+    #################################################################################
+
+    def _tray(self):
+        '''
+        Returns (name, touch down stroke) of the tray under the arm
+        '''
+        arm = self.arm.position()
+        for name, position, stroke in self.trays:
+            if abs(arm - position) <= TRAY_TOLERANCE:
+                return name, stroke
+        return None, ACTUATOR_UPPER_BOUNDS
+
+    def _move_actuator(self, stroke):
+        # The cup stops when it hits something
+        name, floor = self._tray()
+        self.actuator.move(max(0, min(stroke, floor, ACTUATOR_UPPER_BOUNDS)))
+
+    def _pump(self, level):
+        with self._lock:
+            self.last_level = self.pump_level
+            self.pump_level = 255 if level else 0
+            if self.pump_level:
+                self._grab()
+            else:
+                self._release()
+
+    def _touching(self):
+        name, floor = self._tray()
+        return name is not None and self.actuator.position() >= floor - 1
+
+    def _grab(self):
+        if self.holding is not None or not self._touching():
+            return
+        name, floor = self._tray()
+        if name == 'in' and self.stack.can_take():
+            if random.random() < self.pick_miss_rate:
+                self.missed_picks += 1
+                return
+            self.holding = self.stack.take()
+        elif name == 'scanner' and self.on_scanner is not None:
+            self.holding, self.on_scanner = self.on_scanner, None
+
+    def _release(self):
+        if self.holding is None:
+            return
+        name, floor = self._tray()
+        if name == 'scanner' and self.on_scanner is None:
+            self.on_scanner = self.holding
+        elif name == 'out':
+            self.out_pile.append(self.holding)
+        else:
+            self.dropped.append(self.holding)
+        self.holding = None
+
+    #################################################################################
+    #####                           ROUTINES                                    #####
+    #################################################################################
+
+    def _run_routine(self, routine, wait=False):
+        if wait:
+            # A command on its own, outside a frame or alone in its group
+            routine()
+            return
+        # The other routines of a frame run next to each other
+        t = Thread(target=routine, name='FakeFirmware-routine')
+        t.daemon = True
+        self._routine = t
+        t.start()
+
+    def _wait(self, axis):
+        self.clock.sleep(axis.remaining())
+
+    def _lower(self):
+        self._move_actuator(ACTUATOR_UPPER_BOUNDS)
+        self._wait(self.actuator)
+
+    def _lift(self):
+        self.actuator.move(FIRMWARE_UP_STROKE)
+        self._wait(self.actuator)
+
+    def _lower_and_lift(self):
+        self._lower()
+        self._pump(255)
+        self._lift()
+
+    def _place(self):
+        self._lower()
+        self._pump(0)
+        self._lift()
+
+    def _reset(self):
+        self._pump(0)
+        self._lift()
+        self.arm.move(0)
+        self._wait(self.arm)
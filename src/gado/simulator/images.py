@@ -0,0 +1,70 @@
+'''
+Minimal image files for the simulated scanner and webcam
+
+The images are 8 bit grayscale PNGs written with nothing but zlib, so the
+simulator doesn't need PIL. WIA hands the real scanner images over as PNG
+too (see WIA_IMG_FORMAT_PNG in gado.Scanner), whatever the file is named.
+
+A barcode "printed" on a simulated sheet is stored in a tEXt chunk, which
+read_barcode() gives back.
+'''
+import struct, zlib
+
+PNG_SIGNATURE = '\x89PNG\r\n\x1a\n'
+BARCODE_KEYWORD = 'Barcode'
+
+def _chunk(kind, data):
+    crc = zlib.crc32(kind + data) & 0xffffffff
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', crc)
+
+def png_bytes(width, height, barcode=None):
+    '''
+    Returns the bytes of a width x height grayscale PNG with a gradient
+    '''
+    width = max(1, int(width))
+    height = max(1, int(height))
+    # Every row starts with filter type 0
+    rows = [chr(0) + chr(y % 256) * width for y in range(min(height, 256))]
+    raw = ''.join(rows[y % len(rows)] for y in range(height))
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)
+    data = PNG_SIGNATURE + _chunk('IHDR', header)
+    if barcode:
+        data += _chunk('tEXt', '%s\0%s' % (BARCODE_KEYWORD, barcode))
+    data += _chunk('IDAT', zlib.compress(raw, 1))
+    data += _chunk('IEND', '')
+    return data
+
+def write_png(path, width, height, barcode=None):
+    data = png_bytes(width, height, barcode)
+    FH = open(path, 'wb')
+    FH.write(data)
+    FH.close()
+    return len(data)
+
+def read_barcode(path):
+    '''
+    Returns the barcode text of a simulated image, or '' if there is none
+    '''
+    try:
+        FH = open(path, 'rb')
+        data = FH.read()
+        FH.close()
+    except IOError:
+        return ''
+    if not data.startswith(PNG_SIGNATURE):
+        return ''
+
+    pos = len(PNG_SIGNATURE)
+    while pos + 8 <= len(data):
+        length, kind = struct.unpack('>I4s', data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        if kind == 'tEXt':
+            keyword, _, text = body.partition('\0')
+            if keyword == BARCODE_KEYWORD:
+                return text
+        elif kind == 'IDAT':
+            # The text chunk always comes before the image data
+            return ''
+        pos += length + 12
+    return ''
@@ -0,0 +1,72 @@
+'''
+Runs complete scan jobs against the simulated devices
+
+Everything (settings, database, images) goes into a scratch directory,
+GADO_HOME is pointed at it for the length of the run so the real gado.conf
+is never touched.
+
+    python -m gado.simulator.session [artifacts] [time_scale]
+'''
+import os, sys, time, tempfile, shutil
+from Queue import Queue
+from gado.functions import export_settings
+from gado.default_settings import default_settings
+
+# Roughly where the trays sit on a real Gado
+SIMULATED_LAYOUT = dict(arm_in_value=10, arm_home_value=95, arm_out_value=180,
+                        actuator_up_value=20, actuator_home_value=180,
+                        actuator_clear_value=200)
+
+def run_scan(artifacts=10, workdir=None, prepare=None, **settings):
+    '''
+    Scans a simulated in pile of artifacts with GadoSystem.start
+
+    prepare, if given, is called with the loaded GadoSystem right before
+    the scan starts. Returns a dict with the number of artifacts and the
+    seconds it took
+    '''
+    from gado.gado_sys import GadoSystem
+
+    cleanup = workdir is None
+    if cleanup:
+        workdir = tempfile.mkdtemp(prefix='gado-sim-')
+    old_home = os.environ.get('GADO_HOME')
+    os.environ['GADO_HOME'] = workdir
+    try:
+        s = default_settings()
+        s.update(SIMULATED_LAYOUT)
+        s.update(wizard_run=1, simulated=1, sim_artifacts=artifacts)
+        s.update(settings)
+        export_settings(**s)
+
+        gado_sys = GadoSystem(Queue(), Queue())
+        gado_sys.load()
+        gado_sys.selected_set = gado_sys.dbi.add_artifact_set('simulation', None)
+        if prepare:
+            prepare(gado_sys)
+
+        started = time.time()
+        try:
+            gado_sys.start()
+        finally:
+            elapsed = time.time() - started
+            # Stop the serial reader (and the fake firmware) before the pty goes
+            gado_sys.robot.disconnect()
+            if getattr(gado_sys.robot, 'firmware', None):
+                gado_sys.robot.firmware.stop()
+                gado_sys.robot.firmware.join(1)
+        return dict(artifacts=gado_sys.robot.stack.taken, seconds=elapsed)
+    finally:
+        if old_home is None:
+            del os.environ['GADO_HOME']
+        else:
+            os.environ['GADO_HOME'] = old_home
+        if cleanup:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    artifacts = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    scale = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+    run = run_scan(artifacts, sim_time_scale=scale)
+    print '%4d artifacts in %7.2fs (%.1f artifacts/minute)' % (
+        run['artifacts'], run['seconds'], 60.0 * run['artifacts'] / run['seconds'])
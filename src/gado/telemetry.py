@@ -0,0 +1,262 @@
+'''
+Background reading of the robot's serial line
+
+Without this, every question to the firmware is write 'd', sleep, read
+and hope the answer is complete. SerialReader owns the reading side of the
+serial connection instead: it keeps asking the firmware for telemetry,
+parses every JSON answer into a RobotData and puts it in a TelemetryBuffer,
+a fixed-size ring of the latest samples. Anything on the line that isn't
+telemetry (like the handshake answer) is kept as text, except for
+protocol frames (see gado.protocol), which are handed to on_frame.
+
+Callers then wait for a condition on the samples, for example
+
+    robot.telemetry.wait_for(lambda d: d.actuator_pos_s > clear, timeout=5)
+
+which returns as soon as a matching sample comes in.
+
+While somebody is waiting, telemetry is requested again as soon as the
+previous answer is in (at most every busy_interval seconds); otherwise only
+every telemetry_idle_interval seconds.
+'''
+import time
+from collections import deque
+from threading import Thread, Condition
+from gado.RobotData import RobotData
+from gado.protocol import FRAME_START, FRAME_END
+import gado.log
+
+log = gado.log.get('telemetry')
+
+# Seconds after which an unanswered telemetry request is sent again
+ANSWER_TIMEOUT = 0.5
+
+class TelemetryBuffer():
+    '''
+    The latest size RobotData samples, oldest first
+
+    Every sample gets a sequence number as it comes in. Samples are told
+    apart by it rather than by their received time: the clock only moves
+    every 15ms on Windows and one read often holds several samples.
+    '''
+    def __init__(self, size=256):
+        self.samples = deque(maxlen=size)
+        self.sequence = 0
+        self.condition = Condition()
+        self.waiters = 0
+        # Gets every sample too when telemetry_log is set, see gado.recorder
+        self.recorder = None
+
+    def append(self, sample):
+        with self.condition:
+            self.sequence += 1
+            sample.sequence = self.sequence
+            self.samples.append(sample)
+            self.condition.notify_all()
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.append(sample)
+
+    def latest(self):
+        with self.condition:
+            return self.samples[-1] if self.samples else None
+
+    def snapshot(self):
+        with self.condition:
+            return list(self.samples)
+
+    def sequence_before(self, after=None):
+        '''
+        The sequence number of the last sample that came in before after
+
+        after is a sample, a time (samples received at that time count as
+        after it, the clock may not have moved) or None for now.
+        '''
+        with self.condition:
+            if after is None:
+                return self.sequence
+            if isinstance(after, RobotData):
+                return after.sequence
+            before = [sample.sequence for sample in self.samples if sample.received < after]
+            if before:
+                return before[-1]
+            #Every sample in the buffer is at or after it
+            return self.samples[0].sequence - 1 if self.samples else self.sequence
+
+    def wait_for(self, predicate, timeout=None, after=None):
+        '''
+        Waits for a sample that satisfies predicate and returns it
+
+        Only samples that came in after after count, a sample or a time
+        (default: now, see sequence_before). Returns None on timeout.
+        '''
+        deadline = None if timeout is None else time.time() + timeout
+        with self.condition:
+            self.waiters += 1
+            try:
+                checked = self.sequence_before(after)
+                while True:
+                    for sample in self.samples:
+                        if sample.sequence > checked:
+                            checked = sample.sequence
+                            if predicate(sample):
+                                return sample
+                    if deadline is None:
+                        self.condition.wait()
+                    else:
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            return None
+                        self.condition.wait(remaining)
+            finally:
+                self.waiters -= 1
+
+class SerialReader(Thread):
+    '''
+    Reads the robot's serial connection until stop() is called
+
+    request is called (from this thread) whenever new telemetry should be
+    asked for, normally Robot._requestTelemetry.
+    '''
+    def __init__(self, connection, buffer, request, idle_interval=1.0,
+                 busy_interval=0.01):
+        Thread.__init__(self, name='SerialReader')
+        self.daemon = True
+        self.connection = connection
+        self.buffer = buffer
+        self.request = request
+        self.idle_interval = idle_interval
+        self.busy_interval = busy_interval
+
+        self.text = ''
+        self.text_condition = Condition()
+        self.last_seen = None
+        self.error = None
+        # Called with every protocol frame that comes in
+        self.on_frame = None
+        self.parser = TelemetryParser(buffer, self._frame, self._text)
+
+        self._running = False
+        self._requested = 0
+
+    def start(self):
+        # Set here rather than in run() so wait_for_text works right away
+        self._running = True
+        Thread.start(self)
+
+    def stop(self):
+        self._running = False
+
+    def running(self):
+        return self._running and self.is_alive()
+
+    def wait_for_text(self, value, timeout):
+        '''
+        Waits for value to show up on the line (outside of telemetry)
+        and consumes everything up to and including it
+        '''
+        deadline = time.time() + timeout
+        with self.text_condition:
+            while value not in self.text:
+                remaining = deadline - time.time()
+                if remaining <= 0 or not self._running:
+                    return False
+                self.text_condition.wait(remaining)
+            self.text = self.text[self.text.index(value) + len(value):]
+            return True
+
+    def clear_text(self):
+        with self.text_condition:
+            self.text = ''
+
+    def run(self):
+        try:
+            while self._running:
+                self._maybe_request()
+                data = self.connection.read(self.connection.inWaiting() or 1)
+                if data:
+                    self.last_seen = time.time()
+                    self._feed(data)
+        except Exception, e:
+            # The port went away, whoever waits will time out
+            log.warning('stopped reading: %s', e)
+            self.error = e
+        self._running = False
+        with self.text_condition:
+            self.text_condition.notify_all()
+
+    def _maybe_request(self):
+        now = time.time()
+        if self.buffer.waiters:
+            latest = self.buffer.latest()
+            answered = latest is not None and latest.received >= self._requested
+            if answered or now - self._requested > ANSWER_TIMEOUT:
+                wait = self._requested + self.busy_interval - now
+                if wait > 0:
+                    time.sleep(wait)
+                self._request()
+        elif now - self._requested > self.idle_interval:
+            self._request()
+
+    def _request(self):
+        self._requested = time.time()
+        self.request()
+
+    def _feed(self, data):
+        self.parser.feed(data)
+
+    def _frame(self, frame):
+        if self.on_frame is not None:
+            self.on_frame(frame)
+
+    def _text(self, text):
+        with self.text_condition:
+            self.text += text
+            self.text_condition.notify_all()
+
+class TelemetryParser():
+    '''
+    Splits the stream coming from the robot into JSON telemetry, frames and
+    plain text
+
+    Samples go into buffer, frames to on_frame and text to on_text.
+    '''
+    def __init__(self, buffer, on_frame=None, on_text=None):
+        self.buffer = buffer
+        self.on_frame = on_frame
+        self.on_text = on_text
+        self._pending = ''
+
+    def feed(self, data):
+        self._pending += data
+        text = ''
+        while self._pending:
+            starts = [i for i in (self._pending.find('{'), self._pending.find(FRAME_START)) if i >= 0]
+            if not starts:
+                text += self._pending
+                self._pending = ''
+                break
+            start = min(starts)
+            text += self._pending[:start]
+            framed = self._pending[start] == FRAME_START
+            end = self._pending.find(FRAME_END if framed else '}', start)
+            if end < 0:
+                # Wait for the rest of it
+                self._pending = self._pending[start:]
+                break
+            blob = self._pending[start:end + 1]
+            self._pending = self._pending[end + 1:]
+            if framed:
+                if self.on_frame is not None:
+                    self.on_frame(blob)
+                continue
+            sample = RobotData()
+            try:
+                sample.processJSON(blob)
+            except (ValueError, KeyError):
+                log.warning('unreadable telemetry: %s', blob)
+                continue
+            self.buffer.append(sample)
+        text = text.strip('\r\n')
+        if text and self.on_text is not None:
+            self.on_text(text)
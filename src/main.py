@@ -17,28 +17,33 @@ from gado.GadoGui import GadoGui
 from gado.gado_sys import GadoSystem
 from Tkinter import *
 from threading import Thread, Lock
-from Queue import Queue
-from gado.functions import fetch_from_queue
+from multiprocessing import freeze_support
+from gado.mailbox import Mailbox
+from gado.ipc import LogicProcess
+from gado.functions import fetch_from_queue, import_settings
 from gado.gui.SplashScreen import SplashScreen
 import gado.messages as messages
+import gado.log
 import PIL.Image
 import ImageTk
 import ttk
 import sys
 import time
+
+log = gado.log.get('main')
     
 class GuiThread(Thread):
     def __init__(self, q_in, q_out):
         self.q_in = q_in
         self.q_out = q_out
-        print "GuiThread\tcreating the gui"
+        log.debug("creating the gui")
         self.gui = GadoGui(q_in, q_out)
         Thread.__init__(self)
         
     def run(self):
-        print "GuiThread\tloading GUI elements"
+        log.debug("loading GUI elements")
         self.gui.load()
-        print "GuiThread\tcalling finished tk.mainloop"
+        log.debug("finished tk.mainloop")
         #self.gui.mainloop()
         sys.exit()
 
@@ -46,25 +51,34 @@ class LogicThread(Thread):
     def __init__(self, q_in, q_out, recovered=False):
         self.q_in = q_in
         self.q_out = q_out
-        print "LogicThread\tintializing GadoSystem"
+        log.debug("intializing GadoSystem")
         self.gado_sys = GadoSystem(q_in, q_out, recovered)
-        print "LogicThread\tcompleted intializing GadoSystem"
+        log.debug("completed intializing GadoSystem")
         Thread.__init__(self)
     
     def run(self):
-        print "LogicThread\tcalling main loop on gado_sys"
+        log.debug("calling main loop on gado_sys")
         self.gado_sys.load()
         self.gado_sys.mainloop()
-        print "LogicThread\tfinished main loop on gado_sys"
+        log.info("finished main loop on gado_sys")
         
 if __name__ == '__main__':
-    print "Initializing Gado Robot Management Interface"
+    freeze_support()
+    settings = import_settings()
+    gado.log.configure(**settings)
+    log.info("Initializing Gado Robot Management Interface")
+    
+    q_gui_to_sys = Mailbox('gui_to_sys')
+    q_sys_to_gui = Mailbox('sys_to_gui')
     
-    q_gui_to_sys = Queue()
-    q_sys_to_gui = Queue()
+    #The GadoSystem in a process of its own, see gado.ipc
+    if int(settings.get('logic_process', 0)):
+        Logic = LogicProcess
+    else:
+        Logic = LogicThread
     
     t1 = GuiThread(q_sys_to_gui, q_gui_to_sys)
-    t2 = LogicThread(q_gui_to_sys, q_sys_to_gui)
+    t2 = Logic(q_gui_to_sys, q_sys_to_gui)
     
     t1.start()
     t2.start()
@@ -72,17 +86,17 @@ if __name__ == '__main__':
     while True:
         t2.join()
         
-        print 'main\tThread 2 Joined'
+        log.info('Thread 2 Joined')
         if not q_gui_to_sys.empty():
             msg = fetch_from_queue(q_gui_to_sys)
             if msg[0] == messages.MAIN_ABANDON_SHIP:
                 sys.exit()
-        print 'main\tThread 2 Recovering'
-        t2 = LogicThread(q_gui_to_sys, q_sys_to_gui, True)
+        log.warning('Thread 2 Recovering')
+        t2 = Logic(q_gui_to_sys, q_sys_to_gui, True)
         t2.start()
     
     t1.join()
-    print 'main\tThread 1 Joined'
+    log.info('Thread 1 Joined')
     sys.exit()
     #print 'main\tfetching MAIN_ABANDON_SHIP'
     #msg = fetch_from_queue(q, messages.MAIN_ABANDON_SHIP)
@@ -0,0 +1,152 @@
+import socket, threading, time, unittest
+import gado.eventloop as eventloop
+from gado.eventloop import EventLoop, Future, Return, CancelledError, gather
+
+class FutureTest(unittest.TestCase):
+    def test_result_and_callbacks(self):
+        future = Future()
+        seen = []
+        future.add_done_callback(seen.append)
+        future.set_result(3)
+        #Only the first outcome counts
+        future.set_result(4)
+        future.cancel()
+        self.assertEqual(future.result(), 3)
+        self.assertEqual(seen, [future])
+        later = []
+        future.add_done_callback(later.append)
+        self.assertEqual(later, [future])
+
+    def test_exception(self):
+        future = Future()
+        future.set_exception(ValueError('broken'))
+        self.assertTrue(isinstance(future.exception(), ValueError))
+        self.assertRaises(ValueError, future.result)
+
+    def test_cancel(self):
+        future = Future()
+        future.cancel()
+        self.assertRaises(CancelledError, future.result)
+
+    def test_result_times_out(self):
+        self.assertRaises(Exception, Future().result, 0.01)
+
+    def test_gather(self):
+        futures = [Future(), Future()]
+        gathered = gather(futures)
+        futures[1].set_result('b')
+        self.assertFalse(gathered.done())
+        futures[0].set_result('a')
+        self.assertEqual(gathered.result(), ['a', 'b'])
+        self.assertEqual(gather([]).result(), [])
+
+    def test_gather_fails_with_the_first_failure(self):
+        futures = [Future(), Future()]
+        gathered = gather(futures)
+        futures[0].set_exception(KeyError('k'))
+        self.assertRaises(KeyError, gathered.result)
+
+class EventLoopTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = EventLoop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_timers_run_in_order_and_can_be_cancelled(self):
+        ran = []
+        self.loop.call_later(0.02, ran.append, 'second')
+        self.loop.call_later(0.01, ran.append, 'first')
+        cancelled = self.loop.call_later(0.005, ran.append, 'cancelled')
+        self.loop.cancel_timer(cancelled)
+        self.loop.run_until_complete(self.loop.sleep(0.03))
+        self.assertEqual(ran, ['first', 'second'])
+
+    def test_coroutines(self):
+        loop = self.loop
+        def child(value):
+            yield loop.sleep(0.01)
+            raise Return(value * 2)
+        def parent():
+            a = yield loop.spawn(child(1))
+            b, c = yield [loop.spawn(child(2)), loop.sleep(0.01, 'slept')]
+            raise Return((a, b, c))
+        self.assertEqual(loop.run_until_complete(parent()), (2, 4, 'slept'))
+
+    def test_coroutine_exceptions_reach_the_caller(self):
+        loop = self.loop
+        def failing():
+            yield loop.sleep(0)
+            raise ValueError('in the coroutine')
+        def catching():
+            try:
+                yield loop.spawn(failing())
+            except ValueError, e:
+                raise Return(str(e))
+        self.assertEqual(loop.run_until_complete(catching()), 'in the coroutine')
+
+    def test_call_blocking_resolves_on_the_loop(self):
+        results = []
+        future = self.loop.call_blocking(lambda: threading.current_thread().name)
+        future.add_done_callback(lambda f: results.append(threading.current_thread()))
+        name = self.loop.run_until_complete(future)
+        self.assertTrue(name.startswith('blocking-'))
+        self.assertEqual(results, [threading.current_thread()])
+        failed = self.loop.call_blocking(lambda: {}['missing'])
+        self.assertRaises(KeyError, self.loop.run_until_complete, failed)
+
+    def test_another_thread_wakes_the_loop_up(self):
+        ran = []
+        def later():
+            time.sleep(0.05)
+            self.loop.call_soon_threadsafe(ran.append, 'woken')
+        threading.Thread(target=later).start()
+        started = time.time()
+        #Without the wakeup this would wait out max_wait
+        while not ran and time.time() - started < 5:
+            self.loop.run_once(max_wait=5.0)
+        self.assertEqual(ran, ['woken'])
+        self.assertTrue(time.time() - started < 1.0)
+
+    def test_many_wakeups_do_not_block_the_caller(self):
+        ran = []
+        for i in range(100000):
+            self.loop.call_soon_threadsafe(ran.append, i)
+        self.loop.run_once(max_wait=0)
+        self.assertEqual(len(ran), 100000)
+        #The wakeup socket is empty again
+        self.loop.run_once(max_wait=0)
+
+    def test_readers(self):
+        a, b = eventloop._socketpair()
+        try:
+            read = []
+            self.loop.add_reader(a, lambda: read.append(a.recv(10)))
+            b.send('ping')
+            self.loop.run_once(max_wait=1.0)
+            self.assertEqual(read, ['ping'])
+            self.loop.remove_reader(a)
+            b.send('pong')
+            self.loop.run_once(max_wait=0)
+            self.assertEqual(read, ['ping'])
+        finally:
+            a.close()
+            b.close()
+
+    def test_loopback_socketpair(self):
+        #The fallback for Windows, where there is no socket.socketpair
+        socketpair = socket.socketpair
+        del socket.socketpair
+        try:
+            reader, writer = eventloop._socketpair()
+        finally:
+            socket.socketpair = socketpair
+        try:
+            writer.send('x')
+            self.assertEqual(reader.recv(1), 'x')
+        finally:
+            reader.close()
+            writer.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import datetime, unittest
+import gado.messages as messages
+from gado.ipc import encode, decode
+
+class EncodingTest(unittest.TestCase):
+    def round_trip(self, value):
+        decoded = decode(encode(value))
+        self.assertEqual(decoded, value)
+        if not isinstance(value, (int, long)):
+            self.assertEqual(type(decoded), type(value))
+        return decoded
+
+    def test_values(self):
+        for value in (None, True, False, 0, 255, 256, -1, 2 ** 63 - 1, -2 ** 63, 1.5, -0.0,
+                      '', 'path/to/image.jpg', u'', u'Caf\xe9', (), [], {},
+                      datetime.datetime(2012, 3, 4, 5, 6, 7, 890123)):
+            self.round_trip(value)
+
+    def test_bools_stay_bools(self):
+        self.assertTrue(decode(encode(True)) is True)
+        self.assertTrue(decode(encode(1)) is not True)
+        self.assertEqual(encode([True, 1]), 'l\x02Tb\x01')
+
+    def test_small_numbers_take_one_byte(self):
+        self.assertEqual(len(encode(255)), 2)
+        self.assertEqual(len(encode(256)), 9)
+        self.assertEqual(len(encode(-1)), 9)
+
+    def test_messages(self):
+        self.round_trip((messages.RETURN, [(1, 'Letters'), (2, u'Caf\xe9')], 7, None))
+        self.round_trip((messages.ENQUEUE_JOB, dict(artifact_set=3, settings=dict(scanner_dpi=600))))
+        self.round_trip((messages.JOB_SUMMARY, None, 2 ** 40, 'an error'))
+
+    def test_lengths_up_to_255_take_one_byte(self):
+        for tag, value in (('s', 'x' * 255), ('u', u'x' * 255), ('l', [None] * 255),
+                           ('t', (None,) * 255), ('d', dict((i, None) for i in range(255)))):
+            data = encode(value)
+            self.assertEqual(data[:2], tag + '\xff')
+            self.round_trip(value)
+
+    def test_longer_lengths_take_four_bytes(self):
+        for tag, value in (('S', 'x' * 256), ('U', u'x' * 70000), ('[', [None] * 256),
+                           ('(', (None,) * 70000), ('{', dict((i, None) for i in range(256)))):
+            data = encode(value)
+            self.assertEqual(data[0], tag)
+            self.assertEqual(data[1:5], '\x00\x01\x00\x00' if len(value) == 256 else '\x70\x11\x01\x00')
+            self.round_trip(value)
+
+    def test_repeated_strings_are_sent_once(self):
+        rows = [dict(id=i, name='set %s' % i, parent=None) for i in range(3)]
+        data = encode(rows)
+        self.assertEqual(data.count('parent'), 1)
+        self.assertEqual(data.count('name'), 1)
+        self.assertEqual(decode(data), rows)
+        #Strings are only numbered within one message
+        self.assertEqual(decode(encode(('a', 'a'))), ('a', 'a'))
+        self.assertEqual(encode(('a', 'b', 'a', 'b')), 't\x04s\x01as\x01br\x00r\x01')
+
+    def test_back_references_past_255(self):
+        strings = ['key %s' % i for i in range(300)]
+        value = (strings, list(reversed(strings)))
+        data = encode(value)
+        #The first 256 are numbered in a byte, the rest need four
+        self.assertTrue('r\x00' in data)
+        self.assertTrue('R' + '\x2b\x01\x00\x00' in data)
+        self.assertEqual(decode(data), value)
+
+    def test_unicode_is_not_numbered(self):
+        value = [u'Caf\xe9', u'Caf\xe9', 'Caf\xc3\xa9']
+        self.assertEqual(decode(encode(value)), value)
+
+    def test_what_cannot_be_sent(self):
+        self.assertRaises(TypeError, encode, object())
+        self.assertRaises(TypeError, encode, (messages.GIVE_ME_A_ROBOT, set([1])))
+        self.assertRaises(TypeError, encode, 2 ** 63)
+        self.assertRaises(ValueError, decode, '?')
+
+if __name__ == '__main__':
+    unittest.main()
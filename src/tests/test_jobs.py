@@ -0,0 +1,108 @@
+import os, shutil, tempfile, unittest
+from gado.jobs import JobQueue, QUEUED, RUNNING, DONE, FAILED, SUMMARY_FIELDS
+
+class JobQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'jobs.json')
+        self.jobs = JobQueue(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def ids(self, jobs):
+        return [job.id for job in jobs]
+
+    def test_runs_jobs_in_order(self):
+        first = self.jobs.enqueue(1)
+        second = self.jobs.enqueue(2, scanner_dpi=300)
+        self.assertEqual((first, second), (1, 2))
+        job = self.jobs.next()
+        self.assertEqual((job.id, job.state), (first, RUNNING))
+        self.assertEqual(self.jobs.running(), job)
+        self.jobs.finish(job)
+        job = self.jobs.next()
+        self.assertEqual((job.id, job.settings), (second, dict(scanner_dpi=300)))
+        self.jobs.finish(job, failed=True)
+        self.assertEqual(self.jobs.next(), None)
+        self.assertEqual([j['state'] for j in self.jobs.describe()], [DONE, FAILED])
+
+    def test_reorder(self):
+        for artifact_set in (1, 2, 3):
+            self.jobs.enqueue(artifact_set)
+        self.assertTrue(self.jobs.reorder(3, 0))
+        self.assertEqual(self.ids(self.jobs.pending()), [3, 1, 2])
+        self.assertTrue(self.jobs.reorder(3, 99))
+        self.assertEqual(self.ids(self.jobs.pending()), [1, 2, 3])
+        running = self.jobs.next()
+        #Only queued jobs move
+        self.assertFalse(self.jobs.reorder(running.id, 1))
+        self.assertFalse(self.jobs.reorder(42, 0))
+        self.assertEqual(self.ids(self.jobs.pending()), [2, 3])
+
+    def test_cancel(self):
+        self.jobs.enqueue(1)
+        self.jobs.enqueue(2)
+        running = self.jobs.next()
+        self.assertFalse(self.jobs.cancel(running.id))
+        self.assertTrue(self.jobs.cancel(2))
+        self.assertFalse(self.jobs.cancel(2))
+        self.assertEqual(self.jobs.pending(), [])
+
+    def test_requeue_puts_a_job_back_in_front(self):
+        self.jobs.enqueue(1)
+        self.jobs.enqueue(2)
+        job = self.jobs.next()
+        self.jobs.requeue(job)
+        self.assertEqual(self.ids(self.jobs.pending()), [1, 2])
+        self.assertEqual(self.jobs.running(), None)
+
+    def test_keeps_the_summary_fields(self):
+        self.jobs.enqueue(1)
+        job = self.jobs.next()
+        summary = dict((field, 1) for field in SUMMARY_FIELDS)
+        summary['stages'] = ['not kept']
+        self.jobs.finish(job, summary)
+        self.assertEqual(sorted(job.summary), sorted(SUMMARY_FIELDS))
+
+    def test_clear_finished(self):
+        for artifact_set in (1, 2, 3, 4):
+            self.jobs.enqueue(artifact_set)
+        self.jobs.cancel(4)
+        self.jobs.finish(self.jobs.next())
+        self.jobs.next()
+        self.jobs.clear_finished()
+        self.assertEqual([(j['id'], j['state']) for j in self.jobs.describe()],
+                         [(2, RUNNING), (3, QUEUED)])
+        #Ids are not given out again while a job has them
+        self.assertEqual(self.jobs.enqueue(5), 4)
+
+    def test_survives_a_restart(self):
+        self.jobs.enqueue(1, scanner_dpi=600)
+        self.jobs.enqueue(2)
+        self.jobs.enqueue(3)
+        self.jobs.reorder(3, 0)
+        job = self.jobs.next()
+        self.jobs.started(job, 17)
+        self.jobs.cancel(2)
+        again = JobQueue(self.path)
+        self.assertEqual(again.describe(), self.jobs.describe())
+        running = again.running()
+        self.assertEqual((running.id, running.db_job), (3, 17))
+        self.assertEqual(again.pending()[0].settings, dict(scanner_dpi=600))
+        self.assertEqual(again.enqueue(4), 4)
+        #Written in one go, nothing is left over
+        self.assertEqual(os.listdir(self.dir), ['jobs.json'])
+
+    def test_unreadable_queue_starts_empty(self):
+        with open(self.path, 'w') as f:
+            f.write('[{"id": 1, "artif')
+        self.assertEqual(JobQueue(self.path).describe(), [])
+
+    def test_without_a_file(self):
+        jobs = JobQueue()
+        jobs.enqueue(1)
+        self.assertEqual(jobs.next().state, RUNNING)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import os, json, shutil, tempfile, unittest
+from Queue import Queue
+import gado.journal as journal
+from gado.journal import ScanJournal, STEPS, NEW, PICKED, SCANNED, FRONT_SAVED, DROPPED
+
+def artifact(i):
+    return dict(artifact_id=i, front_id=10 * i, back_id=10 * i + 1,
+                front_path='front%s.tiff' % i, back_path='back%s.jpg' % i, other='not journaled')
+
+class ScanJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.journal = ScanJournal(os.path.join(self.dir, 'journal'))
+
+    def tearDown(self):
+        self.journal.close()
+        shutil.rmtree(self.dir)
+
+    def test_nothing_to_resume(self):
+        self.assertEqual(self.journal.interrupted(), None)
+
+    def test_interrupted_job(self):
+        self.journal.begin_job(7, 1)
+        for i, last in ((1, DROPPED), (2, SCANNED), (3, NEW)):
+            for step in STEPS[:STEPS.index(last) + 1]:
+                self.journal.record(artifact(i), step)
+        self.journal.switch_set(2)
+        job = self.journal.interrupted()
+        self.assertEqual((job.job, job.artifact_set), (7, 2))
+        self.assertEqual(job.scanned(), 1)
+        unfinished = job.unfinished()
+        self.assertEqual([(a['artifact_id'], a['step']) for a in unfinished], [(2, SCANNED), (3, NEW)])
+        self.assertEqual(unfinished[0]['front_path'], 'front2.tiff')
+        self.assertFalse('other' in unfinished[0])
+
+    def test_a_stray_line_never_takes_a_step_back(self):
+        self.journal.begin_job(1, 1)
+        self.journal.record(artifact(1), FRONT_SAVED)
+        self.journal.record(artifact(1), PICKED)
+        self.assertEqual(self.journal.interrupted().unfinished()[0]['step'], FRONT_SAVED)
+
+    def test_torn_lines_are_skipped(self):
+        self.journal.begin_job(1, 1)
+        self.journal.record(artifact(1), PICKED)
+        self.journal.close()
+        with open(self.journal.path, 'a') as f:
+            f.write('{"event": "step", "artifact_id": 1, "st')
+        self.assertEqual(self.journal.interrupted().unfinished()[0]['step'], PICKED)
+
+    def test_only_the_last_job_counts(self):
+        self.journal.begin_job(1, 1)
+        self.journal.record(artifact(1), PICKED)
+        self.journal.begin_job(2, 1)
+        job = self.journal.interrupted()
+        self.assertEqual(job.job, 2)
+        self.assertEqual(job.unfinished(), [])
+
+    def test_finished_jobs_are_forgotten(self):
+        self.journal.begin_job(1, 1)
+        self.journal.record(artifact(1), PICKED)
+        self.journal.finish_job(1)
+        self.assertEqual(os.path.getsize(self.journal.path), 0)
+        self.assertEqual(self.journal.interrupted(), None)
+        #And it can be written to again
+        self.journal.begin_job(2, 1)
+        self.assertEqual(self.journal.interrupted().job, 2)
+
+class ScanLoopOrderTest(unittest.TestCase):
+    '''
+    Runs the simulator and checks every artifact's steps were journaled in order
+    '''
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.home = os.environ.get('GADO_HOME')
+        os.environ['GADO_HOME'] = self.dir
+
+    def tearDown(self):
+        if self.home is None:
+            del os.environ['GADO_HOME']
+        else:
+            os.environ['GADO_HOME'] = self.home
+        shutil.rmtree(self.dir)
+
+    def test_steps_are_journaled_in_order(self):
+        from gado.functions import export_settings
+        from gado.default_settings import default_settings
+        from gado.simulator.session import SIMULATED_LAYOUT
+        from gado.gado_sys import GadoSystem
+        settings = default_settings()
+        settings.update(SIMULATED_LAYOUT)
+        settings.update(wizard_run=1, simulated=1, sim_artifacts=4, sim_time_scale=0.02)
+        export_settings(**settings)
+        gado_sys = GadoSystem(Queue(), Queue())
+        gado_sys.load()
+        try:
+            gado_sys.selected_set = gado_sys.dbi.add_artifact_set('sim', None)
+            steps = dict()
+            record = gado_sys.journal.record
+            def recording(artifact, step):
+                steps.setdefault(artifact['artifact_id'], []).append(step)
+                record(artifact, step)
+            gado_sys.journal.record = recording
+            gado_sys.start()
+        finally:
+            gado_sys.journal.close()
+            # Stop the serial reader (and the fake firmware) before the pty goes
+            gado_sys.robot.disconnect()
+            if getattr(gado_sys.robot, 'firmware', None):
+                gado_sys.robot.firmware.stop()
+                gado_sys.robot.firmware.join(1)
+        self.assertEqual(len(steps), 4)
+        for artifact_id, done in steps.items():
+            self.assertEqual(done, STEPS, 'artifact %s: %s' % (artifact_id, done))
+
+if __name__ == '__main__':
+    unittest.main()
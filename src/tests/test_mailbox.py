@@ -0,0 +1,78 @@
+import threading, time, unittest
+from Queue import Empty
+from gado.mailbox import Mailbox
+from gado.functions import fetch_from_queue
+
+A, B, C = 1, 2, 3
+
+class MailboxTest(unittest.TestCase):
+    def setUp(self):
+        self.mailbox = Mailbox('test')
+
+    def test_typed_receive_leaves_the_others(self):
+        for item in ((A, 1), (B, 2), (A, 3)):
+            self.mailbox.put(item)
+        self.assertEqual(self.mailbox.receive(B), (B, 2))
+        self.assertEqual(self.mailbox.receive(B, timeout=0), None)
+        self.assertEqual(self.mailbox.qsize(), 2)
+        #In the order they came in
+        self.assertEqual(self.mailbox.receive(), (A, 1))
+        self.assertEqual(self.mailbox.receive(A), (A, 3))
+        self.assertTrue(self.mailbox.empty())
+
+    def test_receive_of_several_types_takes_the_oldest(self):
+        for item in ((C, 1), (B, 2), (A, 3), (B, 4)):
+            self.mailbox.put(item)
+        self.assertEqual(self.mailbox.receive((A, B)), (B, 2))
+        self.assertEqual(self.mailbox.receive([A, B]), (A, 3))
+        self.assertEqual(self.mailbox.receive((A, B)), (B, 4))
+        self.assertEqual(self.mailbox.receive((A, B), timeout=0), None)
+        self.assertEqual(self.mailbox.receive(), (C, 1))
+
+    def test_receive_times_out(self):
+        started = time.time()
+        self.assertEqual(self.mailbox.receive(A, timeout=0.05), None)
+        self.assertTrue(time.time() - started >= 0.05)
+        self.assertRaises(Empty, self.mailbox.get, True, 0.01)
+        self.assertRaises(Empty, self.mailbox.get_nowait)
+
+    def test_waiters_get_their_own_types(self):
+        received = dict()
+        def wait_for(kind):
+            received[kind] = self.mailbox.receive(kind, timeout=5)
+        def wait_for_any_of(kinds):
+            received[kinds] = self.mailbox.receive(kinds, timeout=5)
+        threads = [threading.Thread(target=wait_for, args=(A,)),
+                   threading.Thread(target=wait_for, args=(B,)),
+                   threading.Thread(target=wait_for_any_of, args=((C,),))]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        for item in ((C, 'c'), (B, 'b'), (A, 'a')):
+            self.mailbox.put(item)
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(received, {A: (A, 'a'), B: (B, 'b'), (C,): (C, 'c')})
+        self.assertTrue(self.mailbox.empty())
+
+    def test_a_waiter_is_not_woken_by_other_types(self):
+        received = []
+        thread = threading.Thread(target=lambda: received.append(self.mailbox.receive(A, timeout=5)))
+        thread.start()
+        self.mailbox.put((B, 'b'))
+        time.sleep(0.05)
+        self.assertEqual(received, [])
+        self.mailbox.put((A, 'a'))
+        thread.join(5)
+        self.assertEqual(received, [(A, 'a')])
+        self.assertEqual(self.mailbox.get(), (B, 'b'))
+
+    def test_fetch_from_queue(self):
+        self.mailbox.put((A, 1))
+        self.mailbox.put((B, 2))
+        self.assertEqual(fetch_from_queue(self.mailbox, (B, C)), (B, 2))
+        self.assertEqual(fetch_from_queue(self.mailbox, B, timeout=0), None)
+        self.assertEqual(fetch_from_queue(self.mailbox), (A, 1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import os, json, shutil, tempfile, time, unittest
+from gado.RobotData import RobotData
+from gado.recorder import TelemetryRecorder, TelemetryLog, ReplayConnection, \
+    HEADER, RECORD, MISSING
+from gado.Robot import HANDSHAKE, HANDSHAKE_VALUE
+
+def sample(received, arm_pos=90, pump_current=None):
+    d = RobotData()
+    d.received = received
+    d.arm_pos = arm_pos
+    d.actuator_pos_d = 10
+    d.actuator_pos_s = 20
+    d.pump_level = 1
+    d.light_value = 300
+    d.last_level = 0
+    d.pump_current = pump_current
+    return d
+
+class RecorderTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'telemetry.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def record(self, samples):
+        recorder = TelemetryRecorder(self.path)
+        for s in samples:
+            recorder.append(s)
+        recorder.close()
+        return recorder
+
+    def test_round_trip(self):
+        recorder = self.record([sample(100.0, 90, 400), sample(100.5, 45)])
+        self.assertEqual(recorder.recorded, 2)
+        log = TelemetryLog(self.path)
+        try:
+            self.assertEqual(len(log), 2)
+            self.assertEqual(log[0].received, 100.0)
+            self.assertEqual(log[0].pump_current, 400)
+            self.assertEqual(log[-1].arm_pos, 45)
+            #None comes back as None, not MISSING
+            self.assertEqual(log[1].pump_current, None)
+            self.assertEqual(json.loads(log[1].raw)['pump_current'], None)
+            self.assertEqual(list(log.column('arm_pos')), [90, 45])
+            self.assertEqual(list(log.column('received')), [100.0, 100.5])
+            self.assertAlmostEqual(log.duration(), 0.5)
+            self.assertRaises(IndexError, log.record, 2)
+        finally:
+            log.close()
+
+    def test_out_of_range_values_are_clamped(self):
+        self.record([sample(1.0, 100000), sample(2.0, -100000)])
+        log = TelemetryLog(self.path)
+        try:
+            self.assertEqual(log[0].arm_pos, 32767)
+            self.assertEqual(log[1].arm_pos, MISSING + 1)
+        finally:
+            log.close()
+
+    def test_appends_to_an_existing_log(self):
+        self.record([sample(1.0)])
+        self.record([sample(2.0)])
+        self.assertEqual(os.path.getsize(self.path), HEADER.size + 2 * RECORD.size)
+        log = TelemetryLog(self.path)
+        try:
+            self.assertEqual(len(log), 2)
+        finally:
+            log.close()
+
+    def test_a_record_being_written_is_not_counted(self):
+        self.record([sample(1.0)])
+        with open(self.path, 'ab') as f:
+            f.write('\0' * (RECORD.size - 1))
+        log = TelemetryLog(self.path)
+        try:
+            self.assertEqual(len(log), 1)
+        finally:
+            log.close()
+
+    def test_rejects_other_files(self):
+        with open(self.path, 'wb') as f:
+            f.write('not a telemetry log at all')
+        self.assertRaises(ValueError, TelemetryLog, self.path)
+        with open(self.path, 'wb') as f:
+            f.write('short')
+        self.assertRaises(ValueError, TelemetryLog, self.path)
+
+class ReplayConnectionTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'telemetry.bin')
+        recorder = TelemetryRecorder(self.path)
+        for i in range(3):
+            recorder.append(sample(1000.0 + i, 10 * i))
+        recorder.close()
+        self.log = TelemetryLog(self.path)
+
+    def tearDown(self):
+        self.log.close()
+        shutil.rmtree(self.dir)
+
+    def test_plays_samples_at_their_pace(self):
+        connection = ReplayConnection(self.log, speed=20.0)
+        #The first sample is due right away, the last one after 0.1s
+        first = connection.read(1000)
+        self.assertEqual(json.loads(first)['arm_pos'], 0)
+        self.assertFalse(connection.finished())
+        time.sleep(0.15)
+        rest = connection.read(1000)
+        self.assertEqual(rest.count('arm_pos'), 2)
+        self.assertTrue(connection.finished())
+
+    def test_answers_the_handshake_and_records_writes(self):
+        connection = ReplayConnection(self.log, speed=1000.0)
+        connection.flushInput()
+        connection.write(HANDSHAKE)
+        connection.write('a90')
+        self.assertEqual(connection.read(len(HANDSHAKE_VALUE)), HANDSHAKE_VALUE)
+        self.assertEqual([data for seconds, data in connection.written], [HANDSHAKE, 'a90'])
+
+if __name__ == '__main__':
+    unittest.main()
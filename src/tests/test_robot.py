@@ -0,0 +1,92 @@
+import time, unittest
+import gado.Robot
+from gado.heartbeat import Heartbeat
+from gado.Robot import Robot, _Lifted
+from gado.RobotData import RobotData
+from gado.simulator.devices import ArtifactStack
+from gado.simulator.session import SIMULATED_LAYOUT
+
+def sample(sequence, actuator_pos_s):
+    d = RobotData()
+    d.sequence = sequence
+    d.actuator_pos_s = actuator_pos_s
+    return d
+
+class LiftedTest(unittest.TestCase):
+    def test_resting_sample_before_the_routine(self):
+        #The cup rests above clear, an answer to an earlier request isn't the lift
+        lifted = _Lifted(200, fresh=5)
+        self.assertFalse(lifted(sample(5, 235)))
+        self.assertTrue(lifted(sample(6, 235)))
+
+    def test_lowered_then_lifted(self):
+        lifted = _Lifted(200, fresh=10)
+        self.assertFalse(lifted(sample(3, 235)))
+        self.assertFalse(lifted(sample(4, 60)))
+        self.assertTrue(lifted.lowered)
+        self.assertTrue(lifted(sample(5, 235)))
+
+class _SilentReader():
+    def __init__(self, silent_for):
+        self.last_seen = time.time() - silent_for
+
+    def running(self):
+        return True
+
+class HeartbeatTest(unittest.TestCase):
+    def test_silent_routine_is_not_lost(self):
+        changes = []
+        heartbeat = Heartbeat(_SilentReader(5), [changes.append], timeout=3.0)
+        heartbeat.quiet_until(time.time() + 10)
+        heartbeat.check()
+        self.assertTrue(heartbeat.alive)
+        #Still silent once the routine is over
+        heartbeat.quiet_until(None)
+        heartbeat.check()
+        self.assertFalse(heartbeat.alive)
+        self.assertEqual(changes, [False])
+
+    def test_silent_past_the_deadline_is_lost(self):
+        heartbeat = Heartbeat(_SilentReader(5), timeout=3.0)
+        heartbeat.quiet_until(time.time() - 1)
+        heartbeat.check()
+        self.assertFalse(heartbeat.alive)
+
+class SettingsTest(unittest.TestCase):
+    def test_idle_interval_below_heartbeat_timeout(self):
+        robot = Robot(telemetry_idle_interval=5.0, heartbeat_timeout=3.0)
+        self.assertEqual(robot.telemetry_idle_interval, 1.5)
+        robot = Robot(telemetry_idle_interval=1.0, heartbeat_timeout=3.0)
+        self.assertEqual(robot.telemetry_idle_interval, 1.0)
+
+@unittest.skipIf(gado.Robot.serial is None, 'needs pyserial')
+class FirmwareLiftTest(unittest.TestCase):
+    '''
+    Lifts with the real Robot on the fake firmware over the legacy protocol
+    '''
+    def setUp(self):
+        from gado.simulator.firmware import FakeFirmware
+        settings = dict(SIMULATED_LAYOUT, sim_time_scale=0.2,
+                        serial_protocol='legacy', pump_sealed_current=0)
+        self.firmware = FakeFirmware(ArtifactStack(3), **settings)
+        self.firmware.start()
+        self.robot = Robot(**settings)
+        self.assertTrue(self.robot.connect(self.firmware.port))
+
+    def tearDown(self):
+        self.robot.disconnect()
+        self.firmware.stop()
+        self.firmware.join(1)
+
+    def test_lift_returns_with_the_artifact(self):
+        self.robot._move_arm_and_wait(self.robot.arm_in_value)
+        self.robot.lift()
+        self.assertNotEqual(self.firmware.holding, None)
+
+    def test_pick_up_without_the_pump_check(self):
+        self.robot.pickUpObject()
+        self.assertNotEqual(self.firmware.holding, None)
+        self.assertEqual(self.robot.pick_stats, dict(attempts=1, picked=1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import os, shutil, tempfile, threading, time, unittest
+import gado.messages as messages
+from gado import rpc
+from gado.rpc import RpcClient, RpcError
+from gado.mailbox import Mailbox
+from gado.functions import fetch_from_queue
+from gado.busmetrics import bus
+
+class RpcClientTest(unittest.TestCase):
+    def setUp(self):
+        self.requests = Mailbox('requests')
+        self.answers = Mailbox('answers')
+        self.client = RpcClient(self.requests, self.answers)
+
+    def take_requests(self, count):
+        return [fetch_from_queue(self.requests, timeout=5) for i in range(count)]
+
+    def test_answers_go_to_their_requests(self):
+        futures = [self.client.call(messages.ARTIFACT_SET_LIST, i) for i in range(3)]
+        requests = self.take_requests(3)
+        self.assertEqual(len(set(rpc.request_id(msg) for msg in requests)), 3)
+        #Answered the other way around
+        for msg in reversed(requests):
+            rpc.reply(self.answers, msg, msg[1] * 10)
+        self.assertEqual([f.result(timeout=5) for f in futures], [0, 10, 20])
+        self.assertEqual(self.client.pending(), 0)
+
+    def test_errors(self):
+        future = self.client.call(messages.ROBOT_CONNECT)
+        rpc.reply(self.answers, self.take_requests(1)[0], error='no robot')
+        self.assertRaises(RpcError, future.result, 5)
+
+    def test_no_answer(self):
+        future = self.client.call(messages.ROBOT_CONNECT)
+        self.assertEqual(future.result(timeout=0.01), None)
+        self.assertFalse(future.done())
+        self.assertEqual(self.client.pending(), 1)
+
+    def test_callbacks(self):
+        future = self.client.call(messages.JOB_QUEUE)
+        answered = threading.Event()
+        seen = []
+        def callback(f):
+            seen.append(f.value)
+            answered.set()
+        future.add_done_callback(callback)
+        rpc.reply(self.answers, self.take_requests(1)[0], ['job'])
+        self.assertTrue(answered.wait(5))
+        #Once it is done it is called right away
+        future.add_done_callback(lambda f: seen.append('again'))
+        self.assertEqual(seen, [['job'], 'again'])
+
+    def test_answers_nobody_waits_for_are_dropped(self):
+        self.answers.put((messages.RETURN, 'stray', 999, None))
+        future = self.client.call(messages.JOB_QUEUE)
+        rpc.reply(self.answers, self.take_requests(1)[0], 'mine')
+        self.assertEqual(future.result(timeout=5), 'mine')
+
+    def test_only_requests_sent_with_call_are_answered(self):
+        rpc.reply(self.answers, (messages.STOP, None))
+        self.assertTrue(self.answers.empty())
+
+    def test_one_client_per_pair_of_queues(self):
+        self.assertTrue(rpc.client(self.requests, self.answers) is rpc.client(self.requests, self.answers))
+        self.assertFalse(rpc.client(self.requests, self.answers) is rpc.client(self.answers, self.requests))
+
+class MainloopTest(unittest.TestCase):
+    '''
+    The GadoSystem answering requests over Mailboxes, like main.py sets it up
+    '''
+    def setUp(self):
+        from gado.functions import export_settings
+        from gado.default_settings import default_settings
+        from gado.gado_sys import GadoSystem
+        self.dir = tempfile.mkdtemp()
+        self.home = os.environ.get('GADO_HOME')
+        os.environ['GADO_HOME'] = self.dir
+        settings = default_settings()
+        settings.update(wizard_run=1, simulated=1)
+        export_settings(**settings)
+        self.q_in, self.q_out = Mailbox('mainloop_test_in'), Mailbox('mainloop_test_out')
+        bus().reset()
+        self.gado_sys = GadoSystem(self.q_in, self.q_out)
+        self.thread = threading.Thread(target=self.gado_sys.mainloop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.q_in.put((messages.MAIN_ABANDON_SHIP, None))
+        self.thread.join(5)
+        if self.home is None:
+            del os.environ['GADO_HOME']
+        else:
+            os.environ['GADO_HOME'] = self.home
+        shutil.rmtree(self.dir)
+
+    def test_answers_requests(self):
+        client = RpcClient(self.q_in, self.q_out)
+        added = client.call(messages.ADD_ARTIFACT_SET_LIST, dict(name='Letters', parent=None))
+        set_id = added.result(timeout=5)
+        sets = client.call(messages.ARTIFACT_SET_LIST).result(timeout=5)
+        self.assertEqual(sets, [(None, 'No parent'), (set_id, 'Letters')])
+
+    def test_leaves_messages_it_does_not_handle(self):
+        self.q_in.put((messages.DISPLAY_ERROR, 'for somebody else'))
+        answer = RpcClient(self.q_in, self.q_out).call(messages.JOB_QUEUE)
+        self.assertEqual(answer.result(timeout=5), [])
+        time.sleep(0.05)
+        #Never taken off and put back
+        self.assertEqual(bus().snapshot()['queues'][self.q_in.name]['requeued'], 0)
+        self.assertEqual(self.q_in.receive(messages.DISPLAY_ERROR, timeout=0),
+                         (messages.DISPLAY_ERROR, 'for somebody else'))
+
+if __name__ == '__main__':
+    unittest.main()